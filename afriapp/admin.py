@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.utils import timezone
+
 from .models import *
 
 
@@ -12,10 +14,33 @@ admin.site.register(Wishlist)
 admin.site.register(Review)
 
 admin.site.register(Payment)
-admin.site.register(PaymentInfo)
 admin.site.register(Customer)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(ArchivedOrder)
+admin.site.register(ArchivedOrderItem)
 # admin.site.register(OrderItem)
 admin.site.register(Category)
+admin.site.register(Newsletter)
+admin.site.register(NewsletterCampaign)
+
+
+@admin.register(OutboundMessage)
+class OutboundMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'channel', 'to_number', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'channel')
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected messages')
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status=OutboundMessage.SENT).update(
+            status=OutboundMessage.QUEUED, attempts=0, next_attempt_at=timezone.now(), claimed_by='', locked_until=None
+        )
+        self.message_user(request, f'{updated} message(s) requeued.')
+
 
+@admin.register(PaymentInfo)
+class PaymentInfoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'basket_no', 'amount', 'paid_order', 'reconcile_issue', 'created_at')
+    list_filter = ('paid_order', 'reconcile_issue')
+    search_fields = ('basket_no', 'email', 'stripe_payment_intent_id')
@@ -1,5 +1,9 @@
+from itertools import chain
+
 from django.shortcuts import render, redirect
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse
 from django.contrib import messages
 from .models import *
 from django.shortcuts import render, redirect, get_object_or_404
@@ -7,20 +11,26 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views import View
 from django.utils.decorators import method_decorator
 from .forms import *
+from .db_router import replica_reads
+from .profiling import get_profile_store
 
 # Admin Dashboard
 
 @method_decorator(login_required, name='dispatch')
+@method_decorator(replica_reads, name='get')
 class AdminDashboardView(View):
     def get(self, request):
         # Get the total count of customers, orders, and products
         total_customers = Customer.objects.count()
-        total_orders = Order.objects.count()
+        total_orders = get_total_orders()
         total_products = Product.objects.count()
         
-        # Get orders that are pending or completed
+        # Get orders that are pending or completed (finished orders may have been archived)
         pending_orders = Order.objects.filter(status='pending').count()
-        completed_orders = Order.objects.filter(status='completed').count()
+        completed_orders = (
+            Order.objects.filter(status='completed').count()
+            + ArchivedOrder.objects.filter(status='completed').count()
+        )
         
         context = {
             'total_customers': total_customers,
@@ -41,7 +51,11 @@ def admin_manage_products(request):
 # View Orders
 @login_required
 def admin_view_orders(request):
-    orders = Order.objects.all()
+    # Live orders, then the finished ones moved to the archive by archive_orders
+    orders = list(chain(
+        Order.objects.select_related('customer__user').order_by('-created_at'),
+        ArchivedOrder.objects.select_related('customer__user').order_by('-created_at'),
+    ))
     return render(request, 'admininterface/admin_view_orders.html', {'orders': orders})
 
 # Manage Customers
@@ -77,7 +91,7 @@ def get_total_users():
     return User.objects.count()
 
 def get_total_orders():
-    return Order.objects.count()
+    return Order.objects.count() + ArchivedOrder.objects.count()
 
 def get_total_products():
     return Product.objects.count()
@@ -171,3 +185,17 @@ def admin_delete_category(request, category_id):
         return redirect('admin_manage_categories')  # Redirect to manage categories page
 
     return render(request, 'admininterface/admin_confirm_delete.html', {'category': category})
+
+
+# Download the aggregated request profile (collapsed stacks, feed to flamegraph.pl / speedscope)
+@staff_member_required
+def admin_download_profile(request):
+    store = get_profile_store()
+    if request.method == 'POST':
+        store.clear()
+        messages.success(request, 'Request profile cleared.')
+        return redirect('admin_download_profile')
+
+    response = HttpResponse(store.render(), content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="requests.collapsed"'
+    return response
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class AfriappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'afriapp'
+
+    def ready(self):
+        from . import autocomplete, catalog_counts, customers, popularity, search_cache
+        autocomplete.connect_signals()
+        catalog_counts.connect_signals()
+        customers.connect_signals()
+        popularity.connect_signals()
+        search_cache.connect_signals()
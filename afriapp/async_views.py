@@ -0,0 +1,110 @@
+"""
+Async variants of the I/O-bound JSON endpoints (typeahead search, infinite
+scroll, stock checks and the cart drawer), routed in place of the sync views
+when the site runs under ASGI (SERVER_MODE=asgi). They share query building
+and serialisation with their counterparts in views.py and use the async ORM
+API, so a worker can hold many of these requests open while the database
+answers.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import HttpResponseNotAllowed, JsonResponse
+
+from .models import Product
+from .pricing import price_cart
+from .views import (
+    cached_search_results,
+    cart_item_result,
+    cart_items_payload,
+    load_more_page,
+    load_more_queryset,
+    load_more_result,
+    open_cart_items,
+    parse_stock_lines,
+    stock_availability,
+    stock_batch_payload,
+    stock_lines_availability,
+    stock_products,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def _authenticated_user(request):
+    """Resolve the lazy request.user (a session + user query) off the event loop."""
+    return await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+
+
+async def api_search_products(request):
+    """Async version of views.api_search_products."""
+    search_term = request.GET.get("search", "")
+
+    # Skip search if term is too short
+    if len(search_term) < 2:
+        return JsonResponse({"products": []})
+
+    category_id = request.GET.get("category", None)
+    # The cache lookup (and, on a miss, the query) runs off the event loop
+    results = await sync_to_async(cached_search_results)(search_term, category_id)
+    return JsonResponse({"products": results})
+
+
+async def load_more_products(request):
+    """Async version of views.load_more_products."""
+    # A search resolves its (cached, possibly typo-tolerant) match ids off the event loop
+    products_query, page, per_page, offset = await sync_to_async(load_more_queryset)(request.GET)
+    total_count = await products_query.acount()
+    products = load_more_page(products_query, offset, per_page)
+
+    return JsonResponse({
+        'products': [load_more_result(product) async for product in products],
+        'has_more': (offset + per_page) < total_count,
+        'total_count': total_count,
+        'current_page': page,
+    })
+
+
+async def check_stock_availability(request, product_id):
+    """Async version of views.check_stock_availability (login required)."""
+    if await _authenticated_user(request) is None:
+        return redirect_to_login(request.get_full_path())
+    try:
+        product = await Product.objects.aget(id=product_id)
+        payload, status = stock_availability(product, request.GET.get('quantity', 1))
+        return JsonResponse(payload, status=status)
+    except Product.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Product not found'}, status=404)
+    except Exception as e:
+        logger.error(f"check_stock_availability error: {e}")
+        return JsonResponse({'success': False, 'error': 'Error checking stock'}, status=500)
+
+
+async def check_stock_batch(request):
+    """Async version of views.check_stock_batch (login required, POST only)."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    if await _authenticated_user(request) is None:
+        return redirect_to_login(request.get_full_path())
+    try:
+        lines = parse_stock_lines(stock_batch_payload(request.body))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    products = {product.id: product async for product in stock_products(lines)}
+    return JsonResponse(stock_lines_availability(lines, products))
+
+
+async def get_cart_items(request):
+    """Async version of views.get_cart_items (login required)."""
+    user = await _authenticated_user(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    try:
+        rows = [ci async for ci in open_cart_items(user).select_related('product')]
+        pricing = price_cart(rows)
+        items = [cart_item_result(ci, line) for ci, line in zip(rows, pricing.lines)]
+        return JsonResponse(cart_items_payload(items, pricing))
+    except Exception as e:
+        logger.error(f"get_cart_items error: {e}")
+        return JsonResponse({'success': False, 'message': 'Failed to retrieve cart items.'}, status=500)
@@ -0,0 +1,346 @@
+"""
+Typeahead index for the search box.
+
+Product and category names are normalised (lower case, accents and
+punctuation stripped) and every word-start suffix of a name becomes a key
+in one sorted array, so "pepper soup spice" is found by "pep", "soup s" or
+"spi". A lookup is a `bisect` to the first key with the typed prefix and a
+short forward scan; results are ranked by popularity (units sold for
+products, available products for categories). Ranked results for prefixes
+of up to three letters, whose scans are the longest, are memoised.
+
+The same entries feed a trigram index (afriapp/fuzzy.py) over product
+names and their search aliases, used by `fuzzy_product_ids()` when an exact
+search finds too little because the shopper misspelt a name.
+
+The index lives in each worker's memory. It is kept current incrementally
+by Product / Category signals and shared between workers through a JSON
+snapshot at AUTOCOMPLETE_SNAPSHOT_PATH: whoever changes the catalog
+rewrites the snapshot, and every worker reloads it when its mtime moves.
+Rewrites hold an exclusive lock on "<snapshot>.lock" from reload to
+replace, so two workers changing the catalog at once cannot drop each
+other's change.
+`python manage.py build_autocomplete_index` rebuilds it from scratch.
+"""
+import fcntl
+import json
+import logging
+import os
+import threading
+import unicodedata
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.urls import reverse
+
+from .fuzzy import TrigramIndex
+from .models import Category, OrderItem, Product
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 2
+MEMO_PREFIX_LENGTH = 3
+MAX_SUGGESTIONS = 20
+
+
+def normalize(text):
+    """Lower-case `text`, strip accents and reduce punctuation to single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c if c.isalnum() else ' ' for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+
+def _terms(label):
+    words = normalize(label).split()
+    return {' '.join(words[i:]) for i in range(len(words))}
+
+
+def _entry_terms(entry):
+    terms = _terms(entry['label'])
+    for alias in entry.get('aliases', ()):
+        terms |= _terms(alias)
+    return terms
+
+
+def _entry_words(entry):
+    return normalize(' '.join([entry['label'], *entry.get('aliases', ())])).split()
+
+
+def split_aliases(value):
+    return [alias.strip() for alias in (value or '').split(',') if alias.strip()]
+
+
+class PrefixIndex:
+    """
+    Sorted (term, ref) keys over suggestion entries. `ref` is "product:<id>"
+    or "category:<id>"; entries map a ref to {type, id, label, url, score}
+    and, for products, `aliases`. Product words are also trigram-indexed.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = {}
+        self.keys = []
+        self.fuzzy = TrigramIndex()
+        self._memo = {}
+        for entry in entries:
+            ref = self.ref(entry['type'], entry['id'])
+            self.entries[ref] = entry
+            if entry['type'] == 'product':
+                self.fuzzy.add(ref, _entry_words(entry))
+        self.keys = sorted(
+            (term, ref) for ref, entry in self.entries.items() for term in _entry_terms(entry)
+        )
+
+    @staticmethod
+    def ref(kind, pk):
+        return f'{kind}:{pk}'
+
+    def add(self, entry):
+        """Insert or replace one entry, keeping the keys sorted."""
+        ref = self.ref(entry['type'], entry['id'])
+        self.remove(entry['type'], entry['id'])
+        self.entries[ref] = entry
+        for term in _entry_terms(entry):
+            key = (term, ref)
+            self.keys.insert(bisect_left(self.keys, key), key)
+        if entry['type'] == 'product':
+            self.fuzzy.add(ref, _entry_words(entry))
+        self._memo.clear()
+
+    def remove(self, kind, pk):
+        ref = self.ref(kind, pk)
+        entry = self.entries.pop(ref, None)
+        if entry is None:
+            return
+        for term in _entry_terms(entry):
+            i = bisect_left(self.keys, (term, ref))
+            if i < len(self.keys) and self.keys[i] == (term, ref):
+                del self.keys[i]
+        self.fuzzy.remove(ref)
+        self._memo.clear()
+
+    def _rank(self, refs):
+        return sorted(refs, key=lambda ref: (-self.entries[ref]['score'], len(self.entries[ref]['label']), ref))
+
+    def _matches(self, prefix):
+        refs = set()
+        i = bisect_left(self.keys, (prefix,))
+        while i < len(self.keys) and self.keys[i][0].startswith(prefix):
+            refs.add(self.keys[i][1])
+            i += 1
+        return refs
+
+    def search(self, text, limit=8):
+        """Up to `limit` entries whose name has a word starting with `text`, most popular first."""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        if len(prefix) <= MEMO_PREFIX_LENGTH:
+            ranked = self._memo.get(prefix)
+            if ranked is None:
+                ranked = self._memo[prefix] = self._rank(self._matches(prefix))[:MAX_SUGGESTIONS]
+        else:
+            ranked = self._rank(self._matches(prefix))
+        return [self.entries[ref] for ref in ranked[:limit]]
+
+    def to_snapshot(self):
+        return {'version': SNAPSHOT_VERSION, 'entries': list(self.entries.values())}
+
+    @classmethod
+    def from_snapshot(cls, data):
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported autocomplete snapshot version {data.get('version')}")
+        return cls(data['entries'])
+
+
+def product_entry(product_id, name, score, aliases=''):
+    return {
+        'type': 'product', 'id': product_id, 'label': name, 'aliases': split_aliases(aliases),
+        'url': reverse('product', args=[product_id]), 'score': score,
+    }
+
+
+def category_entry(category_id, name, score):
+    return {
+        'type': 'category', 'id': category_id, 'label': name,
+        'url': f"{reverse('shop')}?category_id={category_id}", 'score': score,
+    }
+
+
+def build_index():
+    """Build the index from the database: one query for products, one for categories."""
+    products = (
+        Product.objects.filter(available=True)
+        .annotate(sold=Coalesce(Sum('orderitem__quantity'), 0))
+        .values_list('id', 'name', 'rating', 'sold', 'search_aliases')
+        .order_by()
+    )
+    categories = Category.objects.values_list('id', 'name', 'available_product_count')
+    # Units sold rank products; the rating only breaks ties
+    entries = [
+        product_entry(pk, name, sold + float(rating) / 10, aliases)
+        for pk, name, rating, sold, aliases in products
+    ]
+    entries += [category_entry(pk, name, n) for pk, name, n in categories]
+    return PrefixIndex(entries)
+
+
+def _snapshot_path():
+    return getattr(settings, 'AUTOCOMPLETE_SNAPSHOT_PATH', '') or None
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def snapshot_mtime():
+    """Modification time (ns) of the shared snapshot, None before it is first written; it moves on every catalog change."""
+    path = _snapshot_path()
+    return _mtime(path) if path else None
+
+
+def write_snapshot(index, path=None):
+    """Atomically replace the snapshot file other workers load."""
+    path = path or _snapshot_path()
+    if not path:
+        return None
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(tmp, 'w') as f:
+            json.dump(index.to_snapshot(), f, separators=(',', ':'))
+        os.replace(tmp, path)
+    except OSError as e:
+        # Workers fall back to their own in-memory index
+        logger.warning("Could not write autocomplete snapshot %s: %s", path, e)
+        return None
+    return _mtime(path)
+
+
+_lock = threading.RLock()
+_state = {'index': None, 'mtime': None}
+
+
+def get_index():
+    """This worker's index, reloaded when another worker has written a newer snapshot."""
+    path = _snapshot_path()
+    mtime = _mtime(path) if path else None
+    if _state['index'] is not None and mtime == _state['mtime']:
+        return _state['index']
+    with _lock:
+        if _state['index'] is not None and mtime == _state['mtime']:
+            return _state['index']
+        index = None
+        if mtime is not None:
+            try:
+                with open(path) as f:
+                    index = PrefixIndex.from_snapshot(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable autocomplete snapshot %s: %s", path, e)
+        if index is None:
+            index = build_index()
+            mtime = write_snapshot(index)
+        _state.update(index=index, mtime=mtime)
+        return index
+
+
+@contextmanager
+def _snapshot_lock(path):
+    """Exclusive cross-process lock for a read-modify-write of the snapshot at `path`."""
+    if not path:
+        yield
+        return
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        f = open(f'{path}.lock', 'a')
+    except OSError as e:
+        logger.warning("Could not lock autocomplete snapshot %s: %s", path, e)
+        yield
+        return
+    with f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def reset():
+    """Forget this worker's index (the next lookup reloads it)."""
+    with _lock:
+        _state.update(index=None, mtime=None)
+
+
+def suggest(text, limit=8):
+    """Autocomplete suggestions for `text` as JSON-ready dicts."""
+    return [
+        {'type': entry['type'], 'id': entry['id'], 'label': entry['label'], 'url': entry['url']}
+        for entry in get_index().search(text, limit)
+    ]
+
+
+def fuzzy_product_ids(text, limit=12, min_similarity=0.3):
+    """Ids of products whose names or aliases are trigram-similar to `text`, best match first."""
+    index = get_index()
+    return [index.entries[ref]['id'] for ref, _ in index.fuzzy.search(normalize(text).split(), limit, min_similarity)]
+
+
+def _apply(change):
+    """Apply one catalog change to the loaded index and publish the snapshot."""
+    path = _snapshot_path()
+    with _lock, _snapshot_lock(path):
+        if _state['index'] is None:
+            # Not loaded here: a stale snapshot must not be picked up by anyone
+            if path and _mtime(path) is not None:
+                os.remove(path)
+            return
+        index = get_index()  # pick up other workers' changes first
+        change(index)
+        _state['mtime'] = write_snapshot(index)
+
+
+def _product_saved(sender, instance, **kwargs):
+    def change(index):
+        if not instance.available:
+            index.remove('product', instance.pk)
+            return
+        current = index.entries.get(index.ref('product', instance.pk))
+        if current is not None:
+            score = current['score']
+        else:
+            sold = OrderItem.objects.filter(product_id=instance.pk).aggregate(n=Sum('quantity'))['n'] or 0
+            score = sold + float(instance.rating or 0) / 10
+        index.add(product_entry(instance.pk, instance.name, score, instance.search_aliases))
+    transaction.on_commit(lambda: _apply(change))
+
+
+def _product_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: _apply(lambda index: index.remove('product', pk)))
+
+
+def _category_saved(sender, instance, **kwargs):
+    def change(index):
+        current = index.entries.get(index.ref('category', instance.pk))
+        index.add(category_entry(instance.pk, instance.name, current['score'] if current else 0))
+    transaction.on_commit(lambda: _apply(change))
+
+
+def _category_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: _apply(lambda index: index.remove('category', pk)))
+
+
+def connect_signals():
+    post_save.connect(_product_saved, sender=Product, dispatch_uid='autocomplete_product_saved')
+    post_delete.connect(_product_deleted, sender=Product, dispatch_uid='autocomplete_product_deleted')
+    post_save.connect(_category_saved, sender=Category, dispatch_uid='autocomplete_category_saved')
+    post_delete.connect(_category_deleted, sender=Category, dispatch_uid='autocomplete_category_deleted')
@@ -0,0 +1,240 @@
+"""
+Micro-benchmarks for the storefront's hot paths.
+
+Each benchmark calls a view (or the context processor) directly through a
+RequestFactory request, so the numbers describe the function itself rather
+than the middleware stack (the load-test harness covers that). Every result
+carries ops/sec, the number of queries per call and the peak Python memory
+allocated by one call, and a run can be saved as a baseline and compared
+against later runs.
+"""
+import json
+import time
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from . import search_cache, views
+from .context_processors import context_processor
+from .instrumentation import record_queries
+from .models import PaymentInfo, Product, ShopCart
+
+SCALES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1M': 1_000_000}
+
+
+def parse_scale(value):
+    """Accept a named scale (`1k`, `100k`, `1M`) or a plain product count."""
+    if value in SCALES:
+        return value, SCALES[value]
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f"Unknown scale '{value}'. Use one of {', '.join(SCALES)} or a product count")
+    return value, count
+
+
+class BenchmarkFixture:
+    """A seeded shopper with a cart, plus helpers to build requests on their behalf."""
+
+    def __init__(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.order_by('pk').first()
+        self.product_ids = list(Product.objects.filter(available=True).order_by('pk').values_list('id', flat=True)[:50])
+        self.session = SessionStore()
+        self.session.create()
+        for product_id in self.product_ids[:5]:
+            ShopCart.objects.create(user=self.user, product_id=product_id, quantity=2)
+        self.cart_item = ShopCart.objects.filter(user=self.user).order_by('pk').first()
+
+    def request(self, method, path, data=None, **extra):
+        request = getattr(self.factory, method)(path, data or {}, **extra)
+        request.user = self.user
+        request.session = self.session
+        request._messages = FallbackStorage(request)
+        return request
+
+    def webhook_event(self):
+        """Create an unpaid payment for the shopper's cart and return the matching Stripe event body."""
+        ShopCart.objects.get_or_create(user=self.user, product_id=self.product_ids[0], paid_order=False,
+                                       defaults={'quantity': 1})
+        payment = PaymentInfo.objects.create(
+            user=self.user, amount=Decimal('25.00'), basket_no=uuid.uuid4().hex, first_name='Bench',
+            last_name='Mark', email=self.user.email, phone='5550100', address='1 Market Street',
+            city='San Diego', state='CA', postal_code='92101', country='US',
+        )
+        return json.dumps({
+            'id': f'evt_{uuid.uuid4().hex[:24]}',
+            'object': 'event',
+            'type': 'checkout.session.completed',
+            'data': {'object': {
+                'id': f'cs_test_{uuid.uuid4().hex[:24]}',
+                'object': 'checkout.session',
+                'payment_intent': f'pi_{uuid.uuid4().hex[:24]}',
+                'metadata': {'payment_id': str(payment.id), 'basket_no': payment.basket_no},
+            }},
+        })
+
+
+def _render(response):
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+def _bench_context_processor(fx):
+    return None, lambda _: context_processor(fx.request('get', '/'))
+
+
+def _bench_api_search(fx):
+    url = reverse('api_search_products')
+    # Measures a cache miss: a repeat search is served from the search cache without queries
+    return search_cache.bump_catalog_version, lambda _: views.api_search_products(fx.request('get', url, {'search': 'rice'}))
+
+
+def _bench_load_more(fx):
+    url = reverse('load_more_products')
+    return None, lambda _: views.load_more_products(fx.request('get', url, {'page': 3}))
+
+
+def _bench_shop(fx):
+    view = views.ShopView.as_view()
+    url = reverse('shop')
+    return None, lambda _: _render(view(fx.request('get', url)))
+
+
+def _bench_cart(fx):
+    view = views.CartView.as_view()
+    url = reverse('cart')
+    return None, lambda _: _render(view(fx.request('get', url)))
+
+
+def _bench_add_to_cart(fx):
+    product_id = fx.product_ids[-1]
+    url = reverse('add_to_cart', args=[product_id])
+    return None, lambda _: views.add_to_cart(
+        fx.request('post', url, {'quantity': 1}, HTTP_X_REQUESTED_WITH='XMLHttpRequest'), product_id=product_id
+    )
+
+
+def _bench_increase_quantity(fx):
+    url = reverse('increase_quantity', args=[fx.cart_item.id])
+    return None, lambda _: views.increase_quantity(fx.request('post', url), fx.cart_item.id)
+
+
+def _bench_decrease_quantity(fx):
+    url = reverse('decrease_quantity', args=[fx.cart_item.id])
+    return None, lambda _: views.decrease_quantity(fx.request('post', url), fx.cart_item.id)
+
+
+def _bench_remove_from_cart(fx):
+    def setup():
+        return ShopCart.objects.create(user=fx.user, product_id=fx.product_ids[-2], quantity=1).id
+
+    def run(item_id):
+        request = fx.request('post', reverse('remove_from_cart', args=[item_id]), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        return views.remove_from_cart(request, item_id)
+
+    return setup, run
+
+
+def _bench_stripe_webhook(fx):
+    url = reverse('stripe_webhook')
+
+    def run(payload):
+        request = fx.factory.post(url, payload, content_type='application/json')
+        return views.stripe_webhook(request)
+
+    return fx.webhook_event, run
+
+
+BENCHMARKS = {
+    'context_processor': _bench_context_processor,
+    'api_search_products': _bench_api_search,
+    'load_more_products': _bench_load_more,
+    'shop_view': _bench_shop,
+    'cart_view': _bench_cart,
+    'add_to_cart': _bench_add_to_cart,
+    'increase_quantity': _bench_increase_quantity,
+    'decrease_quantity': _bench_decrease_quantity,
+    'remove_from_cart': _bench_remove_from_cart,
+    'stripe_webhook': _bench_stripe_webhook,
+}
+
+
+def measure(setup, run, min_time=1.0, max_ops=1000):
+    """
+    Time `run` until `min_time` seconds or `max_ops` calls have elapsed.
+    `setup` (optional) prepares each call's argument and is excluded from timing.
+    Query count and peak memory are taken from one extra call each.
+    """
+    prepare = setup or (lambda: None)
+    run(prepare())  # warm caches, templates and connections
+
+    arg = prepare()
+    with record_queries() as stats:
+        run(arg)
+
+    arg = prepare()
+    tracemalloc.start()
+    try:
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    while not timings or (len(timings) < max_ops and sum(timings) < min_time):
+        arg = prepare()
+        start = time.perf_counter()
+        run(arg)
+        timings.append(time.perf_counter() - start)
+
+    total = sum(timings)
+    return {
+        'ops': len(timings),
+        'ops_per_sec': round(len(timings) / total, 2) if total else 0.0,
+        'mean_ms': round(total / len(timings) * 1000, 3),
+        'queries': stats.count,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(names=None, min_time=1.0, max_ops=1000):
+    """Run the selected benchmarks (all by default) against the current database."""
+    fixture = BenchmarkFixture()
+    results = {}
+    # Receipt emails go to the locmem outbox and webhooks skip signature checks
+    with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', STRIPE_WEBHOOK_SECRET=''):
+        for name in names or BENCHMARKS:
+            setup, run = BENCHMARKS[name](fixture)
+            results[name] = measure(setup, run, min_time=min_time, max_ops=max_ops)
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare a run against a saved baseline (both {scale: {benchmark: stats}}).
+    Returns human-readable regressions: throughput dropping or peak memory growing
+    by more than `threshold`, or any increase in the number of queries.
+    """
+    regressions = []
+    for scale, benchmarks in results.items():
+        for name, stats in benchmarks.items():
+            before = baseline.get(scale, {}).get(name)
+            if not before:
+                continue
+            if stats['ops_per_sec'] < before['ops_per_sec'] * (1 - threshold):
+                regressions.append(
+                    f"{scale} {name}: {stats['ops_per_sec']} ops/s (baseline {before['ops_per_sec']})"
+                )
+            if stats['queries'] > before['queries']:
+                regressions.append(f"{scale} {name}: {stats['queries']} queries (baseline {before['queries']})")
+            if stats['peak_kib'] > before['peak_kib'] * (1 + threshold):
+                regressions.append(f"{scale} {name}: {stats['peak_kib']} KiB peak (baseline {before['peak_kib']})")
+    return regressions
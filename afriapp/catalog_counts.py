@@ -0,0 +1,122 @@
+"""
+Denormalized available-product counts on Category and Service.
+
+Navigation and service pages read `available_product_count` instead of
+counting products per request. The counters move inside the transaction that
+creates, deletes, re-categorises or (un)lists a product: Product.save() is
+atomic and model/queryset/cascade deletes already are, and the signals
+below adjust both counters with F() updates in that same transaction. Moving
+a category to another service moves its count between the two services in
+Category.save()'s transaction the same way.
+Bulk `.update()` and `bulk_create()` bypass the signals; the
+`reconcile_product_counts` command recounts everything and repairs any drift.
+"""
+import json
+import logging
+import time
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_save, pre_delete, pre_save
+
+from .models import Category, Product, Service
+
+logger = logging.getLogger('afriapp.maintenance')
+
+
+def _listing(category_id, available):
+    """The category a product counts towards, or None."""
+    return category_id if available and category_id else None
+
+
+def adjust(category_id, delta):
+    """Add `delta` to a category's counter and its service's (never below zero)."""
+    Category.objects.filter(pk=category_id).update(
+        available_product_count=Greatest(F('available_product_count') + delta, 0)
+    )
+    Service.objects.filter(services__id=category_id).update(
+        available_product_count=Greatest(F('available_product_count') + delta, 0)
+    )
+
+
+def _product_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._counted_in = None
+        return
+    previous = Product.objects.filter(pk=instance.pk).values_list('category_id', 'available').first()
+    instance._counted_in = _listing(*previous) if previous else None
+
+
+def _product_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_counted_in', None)
+    after = _listing(instance.category_id, instance.available)
+    if before != after:
+        if before:
+            adjust(before, -1)
+        if after:
+            adjust(after, 1)
+    instance._counted_in = after
+
+
+def _product_deleting(sender, instance, **kwargs):
+    # pre_delete: inside the delete's transaction, before any row goes. Product.category
+    # is nullable, so a cascading category delete may remove the category first.
+    category_id = _listing(instance.category_id, instance.available)
+    if category_id:
+        adjust(category_id, -1)
+
+
+def _category_pre_save(sender, instance, raw=False, **kwargs):
+    instance._counted_service = None
+    if raw or instance._state.adding:
+        return
+    instance._counted_service = Category.objects.filter(pk=instance.pk).values_list('service_id', flat=True).first()
+
+
+def _category_saved(sender, instance, raw=False, **kwargs):
+    before = getattr(instance, '_counted_service', None)
+    if raw or before is None or before == instance.service_id:
+        return
+    # The stored counter, not the instance's copy, which may be stale
+    count = Category.objects.filter(pk=instance.pk).values_list('available_product_count', flat=True).first() or 0
+    if count:
+        Service.objects.filter(pk=before).update(
+            available_product_count=Greatest(F('available_product_count') - count, 0)
+        )
+        Service.objects.filter(pk=instance.service_id).update(
+            available_product_count=F('available_product_count') + count
+        )
+    instance._counted_service = instance.service_id
+
+
+def reconcile_counts():
+    """
+    Recount available products per category and service and fix the rows that
+    disagree. Returns metrics, also logged as one JSON line on `afriapp.maintenance`.
+    """
+    start = time.perf_counter()
+    fixed = {}
+    with transaction.atomic():
+        for model, lookup in ((Category, 'products'), (Service, 'services__products')):
+            rows = list(
+                model.objects.annotate(actual=Count(lookup, filter=Q(**{f'{lookup}__available': True})))
+                .exclude(available_product_count=F('actual'))
+                .values_list('pk', 'actual')
+            )
+            for pk, actual in rows:
+                model.objects.filter(pk=pk).update(available_product_count=actual)
+            fixed[model._meta.model_name] = len(rows)
+    metrics = {**fixed, 'seconds': round(time.perf_counter() - start, 3)}
+    logger.info(json.dumps({'job': 'reconcile_product_counts', **metrics}, sort_keys=True))
+    return metrics
+
+
+def connect_signals():
+    pre_save.connect(_product_pre_save, sender=Product, dispatch_uid='catalog_counts_product_pre_save')
+    post_save.connect(_product_saved, sender=Product, dispatch_uid='catalog_counts_product_saved')
+    pre_delete.connect(_product_deleting, sender=Product, dispatch_uid='catalog_counts_product_deleting')
+    pre_save.connect(_category_pre_save, sender=Category, dispatch_uid='catalog_counts_category_pre_save')
+    post_save.connect(_category_saved, sender=Category, dispatch_uid='catalog_counts_category_saved')
@@ -0,0 +1,314 @@
+"""
+Stripe Checkout Session creation.
+
+Clicking pay again for an unchanged basket should not open a second Stripe
+session. Each attempt is keyed by a fingerprint of the basket (lines, unit
+prices, shipping, total) and the billing details, and `open_checkout()`
+returns the PaymentInfo of an unexpired session with the same fingerprint
+instead of creating one, so a duplicate click costs one indexed query.
+
+New sessions are created with an idempotency key derived from their
+PaymentInfo, so retrying after a timeout returns the session Stripe may
+already have opened. Calls time out after STRIPE_TIMEOUT_SECONDS, and a
+per-worker circuit breaker fails fast for STRIPE_BREAKER_RESET_SECONDS once
+STRIPE_BREAKER_FAILURES calls in a row have timed out or failed on Stripe's
+side, instead of holding every shopper's request on a Stripe outage.
+
+The gateway is chosen with STRIPE_CHECKOUT_GATEWAY: StripeGateway in
+production, LocalStripeGateway (an in-memory stand-in) for local runs and
+tests. The `reconcile_stripe` job lists sessions through the same gateway.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+from functools import lru_cache
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from django.utils.module_loading import import_string
+
+from .models import PaymentInfo
+
+logger = logging.getLogger(__name__)
+
+# Sessions are opened for just under Stripe's 24 hour maximum...
+SESSION_LIFETIME = timedelta(hours=23)
+# ...and handed out again only while the shopper still has time to pay
+REUSE_MARGIN = timedelta(minutes=5)
+# Stripe rejects an expires_at less than 30 minutes away
+MIN_STRIPE_LIFETIME = timedelta(minutes=31)
+# How long one click may hold the lock, and how long a duplicate waits for it
+LOCK_SECONDS = 15
+WAIT_SECONDS = 5
+POLL_SECONDS = 0.1
+
+
+class GatewayUnavailable(Exception):
+    """Stripe timed out or failed on its side, or the circuit breaker is open."""
+
+
+class StripeGateway:
+    """Creates and lists Checkout Sessions through the Stripe API with a strict timeout."""
+
+    def __init__(self):
+        import stripe
+
+        stripe.default_http_client = stripe.RequestsClient(timeout=getattr(settings, 'STRIPE_TIMEOUT_SECONDS', 10))
+
+    @property
+    def configured(self):
+        key = getattr(settings, 'STRIPE_SECRET_KEY', None)
+        return bool(key) and 'your_key_here' not in str(key)
+
+    def create_session(self, params, idempotency_key):
+        import stripe
+
+        try:
+            return stripe.checkout.Session.create(
+                **params, api_key=settings.STRIPE_SECRET_KEY, idempotency_key=idempotency_key,
+            )
+        except (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError) as e:
+            # Timeouts, network errors, throttling and 5xx: worth retrying later
+            raise GatewayUnavailable(str(e)) from e
+
+    def list_sessions(self, created_gte, created_lt):
+        """Every Checkout Session created in [created_gte, created_lt), newest first, paged 100 at a time."""
+        import stripe
+
+        try:
+            sessions = stripe.checkout.Session.list(
+                created={'gte': int(created_gte.timestamp()), 'lt': int(created_lt.timestamp())},
+                limit=100, api_key=settings.STRIPE_SECRET_KEY,
+            )
+            yield from sessions.auto_paging_iter()
+        except (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError) as e:
+            raise GatewayUnavailable(str(e)) from e
+
+
+class LocalStripeGateway:
+    """
+    In-memory stand-in for Stripe. Like Stripe it returns the same session for
+    a repeated idempotency key and rejects the key with different parameters;
+    its checkout URL is the success URL, so a local checkout completes at once.
+    Set `outage` to simulate Stripe being down, and `complete()` or `expire()`
+    a session to simulate the shopper paying or walking away.
+    """
+    configured = True
+    sessions = {}
+    outage = False
+
+    def create_session(self, params, idempotency_key):
+        if LocalStripeGateway.outage:
+            raise GatewayUnavailable('Local Stripe outage')
+        seen = LocalStripeGateway.sessions.get(idempotency_key)
+        if seen is not None:
+            if seen.params != params:
+                raise ValueError('Keys for idempotent requests can only be used with the same parameters')
+            return seen
+        session_id = f'cs_local_{uuid.uuid4().hex[:24]}'
+        session = SimpleNamespace(
+            id=session_id, url=params['success_url'].replace('{CHECKOUT_SESSION_ID}', session_id), params=params,
+            created=int(time.time()), status='open', payment_status='unpaid', payment_intent=None,
+            metadata=params['metadata'],
+            amount_total=sum(item['price_data']['unit_amount'] * item['quantity'] for item in params['line_items']),
+        )
+        LocalStripeGateway.sessions[idempotency_key] = session
+        return session
+
+    def list_sessions(self, created_gte, created_lt):
+        if LocalStripeGateway.outage:
+            raise GatewayUnavailable('Local Stripe outage')
+        window = range(int(created_gte.timestamp()), int(created_lt.timestamp()))
+        sessions = [session for session in LocalStripeGateway.sessions.values() if session.created in window]
+        yield from sorted(sessions, key=lambda session: session.created, reverse=True)
+
+    @staticmethod
+    def _find(session_id):
+        return next(session for session in LocalStripeGateway.sessions.values() if session.id == session_id)
+
+    @classmethod
+    def complete(cls, session_id):
+        session = cls._find(session_id)
+        session.status, session.payment_status = 'complete', 'paid'
+        session.payment_intent = f'pi_local_{uuid.uuid4().hex[:24]}'
+        return session
+
+    @classmethod
+    def expire(cls, session_id):
+        session = cls._find(session_id)
+        session.status = 'expired'
+        return session
+
+
+@lru_cache(maxsize=None)
+def _gateway(path):
+    return import_string(path)()
+
+
+def get_gateway():
+    """The configured gateway, one instance (and HTTP client) per worker."""
+    return _gateway(getattr(settings, 'STRIPE_CHECKOUT_GATEWAY', 'afriapp.checkout_sessions.StripeGateway'))
+
+
+class CircuitBreaker:
+    """
+    Per-worker breaker for gateway calls: opens after STRIPE_BREAKER_FAILURES
+    consecutive GatewayUnavailable errors, rejects calls while open, and after
+    STRIPE_BREAKER_RESET_SECONDS lets one trial call through to close it again.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def _admit(self):
+        with self.lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if self.trial or waited < getattr(settings, 'STRIPE_BREAKER_RESET_SECONDS', 30):
+                raise GatewayUnavailable('Stripe circuit breaker is open')
+            self.trial = True
+
+    def call(self, fn, *args, **kwargs):
+        self._admit()
+        try:
+            result = fn(*args, **kwargs)
+        except GatewayUnavailable:
+            with self.lock:
+                self.failures += 1
+                self.trial = False
+                if self.opened_at is not None or self.failures >= getattr(settings, 'STRIPE_BREAKER_FAILURES', 5):
+                    if self.opened_at is None:
+                        logger.warning("Stripe circuit breaker opened after %s failures", self.failures)
+                    self.opened_at = time.monotonic()
+            raise
+        except Exception:
+            # Stripe answered (a 4xx is our problem, not an outage)
+            self._succeeded()
+            raise
+        self._succeeded()
+        return result
+
+    def _succeeded(self):
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info("Stripe circuit breaker closed")
+            self.reset()
+
+
+breaker = CircuitBreaker()
+
+
+def fingerprint(user_id, pricing, details, basket_no, base_url):
+    """Hex digest of everything the session is created from: basket, prices, billing details."""
+    lines = [(line.product_id, line.quantity, line.unit_cents) for line in pricing.lines]
+    payload = [user_id, basket_no, base_url, lines, pricing.shipping_cents, pricing.total_cents, sorted(details.items())]
+    return hashlib.sha256(json.dumps(payload, default=str).encode()).hexdigest()
+
+
+def _session_params(payment, pricing, base_url):
+    return {
+        'payment_method_types': ['card'],
+        'line_items': pricing.stripe_line_items(),
+        'metadata': {'payment_id': str(payment.id), 'basket_no': payment.basket_no},
+        'mode': 'payment',
+        # Stripe fills in the session id, so the success page finds this exact attempt
+        'success_url': f'{base_url}/successpayment/?session_id={{CHECKOUT_SESSION_ID}}',
+        'cancel_url': f'{base_url}/cancelpayment/',
+        # Prefills the Stripe Checkout form
+        'customer_email': payment.email or None,
+        'expires_at': int(payment.checkout_expires_at.timestamp()),
+    }
+
+
+def reusable_payment(user, checkout_fingerprint, now=None):
+    """
+    The latest unpaid attempt with this fingerprint that is still usable: its
+    session has time left, or it has no session yet and one can still be
+    created for it with the same parameters (and so the same idempotency key).
+    """
+    now = now or timezone.now()
+    payment = (
+        PaymentInfo.objects
+        .filter(user=user, checkout_fingerprint=checkout_fingerprint, paid_order=False, checkout_expires_at__gt=now + REUSE_MARGIN)
+        .order_by('-checkout_expires_at')
+        .first()
+    )
+    if payment and not payment.checkout_url and payment.checkout_expires_at <= now + MIN_STRIPE_LIFETIME:
+        return None
+    return payment
+
+
+def _wait_for_session(user, checkout_fingerprint):
+    deadline = time.monotonic() + WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(POLL_SECONDS)
+        payment = reusable_payment(user, checkout_fingerprint)
+        if payment and payment.checkout_url:
+            return payment
+    return None
+
+
+def open_checkout(user, pricing, details, basket_no, base_url):
+    """
+    The PaymentInfo whose `checkout_url` the shopper should be sent to: the
+    open session for this exact basket and billing details if there is one,
+    else a new attempt with a new Stripe session. Raises GatewayUnavailable
+    when Stripe cannot be reached.
+    """
+    checkout_fingerprint = fingerprint(user.pk, pricing, details, basket_no, base_url)
+    payment = reusable_payment(user, checkout_fingerprint)
+    if payment and payment.checkout_url:
+        return payment
+
+    lock_key = f'checkout:{checkout_fingerprint}:lock'
+    if not cache.add(lock_key, 1, LOCK_SECONDS):
+        # A duplicate click is opening this session: send both to it
+        payment = _wait_for_session(user, checkout_fingerprint)
+        if payment:
+            return payment
+        # Carry on; the idempotency key still keeps Stripe to one session
+        lock_key = None
+
+    try:
+        payment = reusable_payment(user, checkout_fingerprint)
+        if payment is None:
+            payment = PaymentInfo.objects.create(
+                user=user,
+                amount=pricing.total,
+                shipping_cost=pricing.shipping,
+                basket_no=basket_no,
+                pay_code=get_random_string(12),
+                transaction_id=get_random_string(20),
+                payment_method='credit_card',
+                created_at=timezone.now(),
+                checkout_fingerprint=checkout_fingerprint,
+                checkout_expires_at=timezone.now() + SESSION_LIFETIME,
+                **details,
+            )
+        if not payment.checkout_url:
+            session = breaker.call(
+                get_gateway().create_session,
+                _session_params(payment, pricing, base_url),
+                idempotency_key=f'checkout-session-{payment.pk}-{checkout_fingerprint[:16]}',
+            )
+            payment.stripe_payment_intent_id = session.id
+            payment.checkout_url = session.url
+            payment.save(update_fields=['stripe_payment_intent_id', 'checkout_url'])
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
+    return payment
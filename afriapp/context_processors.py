@@ -1,21 +1,13 @@
 from .models import *
+from .pricing import price_cart
 
 
 def context_processor(request):
-    from decimal import Decimal
-    from django.db.models import Sum, F
-
     services = Service.objects.all()
-    cart_count = 0  # Default to 0
-    cart = None
-    subtotal = 0
-    vat = 0
-    total = 0
 
     # Check if user is authenticated
     if request.user.is_authenticated:
         cart = ShopCart.objects.filter(user=request.user, paid_order=False, quantity__gt=0)
-        cart_count = cart.aggregate(total_items=Sum('quantity'))['total_items'] or 0
     # For guest users, use session key
     else:
         # Get or create session key
@@ -24,7 +16,6 @@ def context_processor(request):
 
         session_key = request.session.session_key
         cart = ShopCart.objects.filter(session_key=session_key, user=None, paid_order=False, quantity__gt=0)
-        cart_count = cart.aggregate(total_items=Sum('quantity'))['total_items'] or 0
 
         # Check if we have a guest email in the session
         guest_email = request.session.get('guest_email')
@@ -32,23 +23,15 @@ def context_processor(request):
             # Store it for easy access in templates
             request.session['has_guest_email'] = True
 
+    # One query for the lines; count and summary come from the shared pricing engine
+    cart = cart.select_related('product')
+    pricing = price_cart(cart)
+    cart_count = pricing.item_count
+    subtotal, vat, total = pricing.subtotal, pricing.vat, pricing.total
+
     # Store cart count in session for easy access
     request.session['cart_count'] = cart_count
 
-    # Calculate cart summary if there are items
-    if cart_count > 0:
-        # Calculate subtotal
-        subtotal = sum(item.calculate_total_price() for item in cart)
-
-        # Calculate VAT and total
-        vat = Decimal('0.075') * Decimal(str(subtotal))
-        total = subtotal + vat
-
-        # Convert to float for template display
-        subtotal = float(subtotal)
-        vat = float(vat)
-        total = float(total)
-
     context = {
         'services': services,
         'cart': cart,
@@ -0,0 +1,59 @@
+"""
+Customer profile lookup.
+
+Views, templates and the Stripe webhook all need the signed-in shopper's
+Customer row. `get_customer(request)` resolves it once per request and keeps
+it on the request, so checkout and the order it creates share one lookup;
+CustomerMiddleware exposes the same value lazily as `request.customer` on
+sync requests. That is a proxy, so compare it by truthiness, never with
+`is None`; code that needs the Customer or None calls get_customer().
+
+With CUSTOMER_CACHE_SECONDS > 0 the profile is also kept in the Django cache
+per user, so repeat requests skip the query altogether; saving or deleting a
+Customer drops its entry. Users without a profile are cached too (as a
+marker), so they are not looked up again on every page either.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .models import Customer
+
+# Cached for users that have no Customer row (the cache cannot hold None)
+NO_PROFILE = 0
+
+
+def cache_key(user_id):
+    return f'customer:{user_id}'
+
+
+def customer_for_user(user):
+    """The Customer linked to `user`, or None for anonymous users and users without a profile."""
+    if user is None or not user.is_authenticated:
+        return None
+    timeout = getattr(settings, 'CUSTOMER_CACHE_SECONDS', 0)
+    if timeout:
+        customer = cache.get(cache_key(user.pk))
+        if customer is not None:
+            return customer or None
+    customer = Customer.objects.filter(user_id=user.pk).first()
+    if timeout:
+        cache.set(cache_key(user.pk), customer or NO_PROFILE, timeout)
+    return customer
+
+
+def get_customer(request):
+    """The request user's Customer, looked up at most once per request."""
+    if not hasattr(request, '_cached_customer'):
+        request._cached_customer = customer_for_user(getattr(request, 'user', None))
+    return request._cached_customer
+
+
+def _customer_changed(sender, instance, **kwargs):
+    if instance.user_id:
+        cache.delete(cache_key(instance.user_id))
+
+
+def connect_signals():
+    post_save.connect(_customer_changed, sender=Customer, dispatch_uid='customers_customer_saved')
+    post_delete.connect(_customer_changed, sender=Customer, dispatch_uid='customers_customer_deleted')
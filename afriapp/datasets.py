@@ -0,0 +1,452 @@
+"""
+Synthetic dataset generator for scale testing.
+
+`DatasetGenerator(scale=N)` bulk-inserts N "units" of realistic data: each unit
+is roughly 200 customers, 1,000 products, 100 open carts, 600 orders and 400
+reviews, plus shipments for dispatched orders and (when agro_linker is
+installed) its farmers, listings, bids, offers, thrift groups and loans.
+
+Everything is drawn from one seeded random generator so the same scale and
+seed reproduce the same data. Distributions follow what a storefront sees in
+practice rather than uniform noise: product popularity is Zipf-like, prices
+are log-normal, order volume grows towards the present, ratings skew high,
+and most orders reach `delivered`.
+"""
+import math
+import random
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog_counts import reconcile_counts
+from .models import Category, Customer, Order, OrderItem, Product, Review, Service, ShopCart
+from .pricing import VAT_RATE
+
+UNIT = {
+    'customers': 200,
+    'products': 1000,
+    'carts': 100,
+    'orders': 600,
+    'reviews': 400,
+    'farmers': 50,
+    'agro_products': 200,
+    'bids': 400,
+    'offers': 200,
+    'thrift_groups': 5,
+    'loans': 20,
+}
+
+CATALOG = {
+    'Groceries': ['Grains & Flours', 'Oils', 'Spices', 'Beans & Legumes', 'Snacks', 'Dried Fish', 'Beverages'],
+    'Restaurant': ['Soups', 'Rice Dishes', 'Grills', 'Small Chops', 'Desserts'],
+    'Beauty': ['Shea Butter', 'Black Soap', 'Hair Care'],
+}
+PRODUCT_WORDS = [
+    'Ofada Rice', 'Palm Oil', 'Plantain Chips', 'Egusi', 'Ogbono', 'Garri', 'Yam Flour', 'Pepper Soup Spice',
+    'Honey Beans', 'Suya Spice', 'Stockfish', 'Crayfish', 'Fufu Flour', 'Chin Chin', 'Zobo Leaves', 'Iru',
+    'Jollof Rice', 'Puff Puff', 'Moi Moi', 'Kilishi', 'Shea Butter', 'Black Soap', 'Kuli Kuli', 'Dawadawa',
+]
+SIZES = ['250g', '500g', '1kg', '2kg', '5kg', '1L', '2L', 'Family Pack', 'Single']
+CITIES = [
+    ('Houston', 'TX'), ('Atlanta', 'GA'), ('Dallas', 'TX'), ('New York', 'NY'), ('Newark', 'NJ'),
+    ('Washington', 'DC'), ('Chicago', 'IL'), ('Los Angeles', 'CA'), ('San Diego', 'CA'), ('Baltimore', 'MD'),
+]
+FIRST_NAMES = ['Ada', 'Chinedu', 'Ngozi', 'Tunde', 'Amaka', 'Kemi', 'Emeka', 'Funmi', 'Yaw', 'Ama', 'Kofi', 'Zainab']
+LAST_NAMES = ['Okafor', 'Adeyemi', 'Mensah', 'Balogun', 'Eze', 'Okonkwo', 'Boateng', 'Bello', 'Nwosu', 'Owusu']
+
+ORDER_STATUSES = ['delivered', 'shipped', 'processing', 'pending', 'cancelled', 'refunded']
+ORDER_STATUS_WEIGHTS = [62, 10, 9, 9, 7, 3]
+RATING_WEIGHTS = [4, 5, 12, 31, 48]  # 1..5 stars
+HISTORY_DAYS = 730
+DATASET_PASSWORD = 'dataset-password'
+
+
+class DatasetGenerator:
+    """Generate `scale` units of data in batches of `batch_size` rows."""
+
+    def __init__(self, scale=1, seed=0, batch_size=2000, stdout=None):
+        self.scale = scale
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.now = timezone.now()
+        # Runs with the same seed append new rows instead of colliding on unique fields
+        self.tag = f'ds{seed}x{Customer.objects.filter(email__startswith=f"ds{seed}x").count()}'
+        self.counts = {}
+
+    def count(self, name):
+        return UNIT[name] * self.scale
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def bulk_create(self, model, objs):
+        created = []
+        for start in range(0, len(objs), self.batch_size):
+            created.extend(model.objects.bulk_create(objs[start:start + self.batch_size]))
+        label = model._meta.label
+        self.counts[label] = self.counts.get(label, 0) + len(created)
+        return created
+
+    def backdate(self, model, objs, field):
+        """bulk_create stamps auto_now_add fields with now; rewrite them with the generated dates."""
+        model.objects.bulk_update(objs, [field], batch_size=self.batch_size)
+
+    def uuid(self, kind, n):
+        """Deterministic UUID that is still unique across runs (it includes the run tag)."""
+        return uuid.uuid5(uuid.NAMESPACE_OID, f'{self.tag}:{kind}:{n}')
+
+    def past_datetime(self, skew=1.6):
+        """A moment within the history window, skewed towards the present (growing volume)."""
+        days = HISTORY_DAYS * (self.rng.random() ** skew)
+        return self.now - timedelta(days=days, seconds=self.rng.randint(0, 86399))
+
+    def price(self, median=12.0, sigma=0.7):
+        value = max(0.99, min(median * 40, self.rng.lognormvariate(math.log(median), sigma)))
+        return Decimal(str(round(value, 2)))
+
+    def generate(self):
+        with transaction.atomic():
+            users, customers = self.generate_customers()
+            products = self.generate_catalog()
+            weights = self.popularity_weights(len(products))
+            self.generate_carts(users, customers, products, weights)
+            orders = self.generate_orders(customers, products, weights)
+            self.generate_reviews(customers, orders)
+            self.generate_shipments(orders)
+        if apps.is_installed('agro_linker'):
+            with transaction.atomic():
+                self.generate_agro()
+        else:
+            self.log('agro_linker is not installed; skipping farmer and thrift data.')
+        return self.counts
+
+    def popularity_weights(self, n):
+        """Cumulative Zipf weights so a few products take most of the orders and reviews."""
+        cumulative, total = [], 0.0
+        for rank in range(1, n + 1):
+            total += 1 / rank ** 1.07
+            cumulative.append(total)
+        return cumulative
+
+    def pick_products(self, products, weights, k):
+        return self.rng.choices(products, cum_weights=weights, k=k)
+
+    def generate_customers(self):
+        n = self.count('customers')
+        self.log(f'Customers: {n}')
+        template = User(username='template')
+        template.set_password(DATASET_PASSWORD)
+
+        profiles = []
+        for i in range(n):
+            city, state = self.rng.choice(CITIES)
+            profiles.append({
+                'email': f'{self.tag}-{i}@example.com',
+                'first_name': self.rng.choice(FIRST_NAMES),
+                'last_name': self.rng.choice(LAST_NAMES),
+                'city': city,
+                'state': state,
+                'joined': self.past_datetime(skew=1.2),
+                'guest': self.rng.random() < 0.2,
+            })
+
+        registered = [p for p in profiles if not p['guest']]
+        users = self.bulk_create(User, [
+            User(username=p['email'], email=p['email'], first_name=p['first_name'], last_name=p['last_name'],
+                 password=template.password, date_joined=p['joined'])
+            for p in registered
+        ])
+        user_by_email = {u.email: u for u in users}
+        customers = self.bulk_create(Customer, [
+            Customer(
+                user=user_by_email.get(p['email']), email=p['email'], first_name=p['first_name'],
+                last_name=p['last_name'], phone_number=f'555{self.rng.randint(1000000, 9999999)}',
+                address=f'{self.rng.randint(1, 9999)} Market Street', city=p['city'], state=p['state'],
+                postal_code=f'{self.rng.randint(10000, 99999)}', country='US', date_joined=p['joined'],
+                is_guest=p['guest'],
+            )
+            for p in profiles
+        ])
+        return users, customers
+
+    def generate_catalog(self):
+        categories = []
+        for service_name, category_names in CATALOG.items():
+            service, _ = Service.objects.get_or_create(slug=f'dataset-{service_name.lower()}', defaults={'name': service_name})
+            for name in category_names:
+                category, _ = Category.objects.get_or_create(
+                    slug=f'{service.slug}-{name.lower().replace(" & ", "-").replace(" ", "-")}',
+                    defaults={'name': name, 'service': service},
+                )
+                categories.append(category)
+
+        n = self.count('products')
+        self.log(f'Products: {n}')
+        products = []
+        for i in range(n):
+            price = self.price()
+            on_sale = self.rng.random() < 0.15
+            word = self.rng.choice(PRODUCT_WORDS)
+            products.append(Product(
+                category=self.rng.choice(categories),
+                name=f'{word} {self.rng.choice(SIZES)}',
+                slug=f'{self.tag}-product-{i}',
+                price=price,
+                sale_price=(price * Decimal(self.rng.choice(['0.9', '0.8', '0.75', '0.6']))).quantize(Decimal('0.01')) if on_sale else None,
+                description=f'{word} sourced from West African producers.',
+                featured=self.rng.random() < 0.05,
+                latest=self.rng.random() < 0.08,
+                available=self.rng.random() < 0.95,
+                stock_quantity=0 if self.rng.random() < 0.07 else int(self.rng.paretovariate(1.2) * 10),
+                date_created=self.past_datetime(skew=1.0),
+                rating=Decimal(str(round(self.rng.triangular(2.5, 5.0, 4.4), 1))),
+            ))
+        products = self.bulk_create(Product, products)
+        # bulk_create skips the category/service counter bookkeeping
+        reconcile_counts()
+        return products
+
+    def generate_carts(self, users, customers, products, weights):
+        n = self.count('carts')
+        if not users:
+            return
+        self.log(f'Open carts: {n}')
+        rows = []
+        for shopper in self.rng.sample(users, min(n, len(users))):
+            for product in set(self.pick_products(products, weights, self.rng.randint(1, 6))):
+                rows.append(ShopCart(user=shopper, product=product, quantity=self.rng.choice([1, 1, 1, 2, 2, 3, 4])))
+        for _ in range(max(0, n - len(users))):
+            # Guest carts keyed by session
+            session_key = uuid.UUID(int=self.rng.getrandbits(128)).hex
+            for product in set(self.pick_products(products, weights, self.rng.randint(1, 4))):
+                rows.append(ShopCart(session_key=session_key, product=product, quantity=self.rng.randint(1, 3)))
+        self.bulk_create(ShopCart, rows)
+
+    def generate_orders(self, customers, products, weights):
+        n = self.count('orders')
+        self.log(f'Orders: {n}')
+        # Repeat buyers dominate: a Pareto draw per customer sets how often they order
+        buyer_weights = [self.rng.paretovariate(1.5) for _ in customers]
+        orders, lines = [], []
+        for i, buyer in enumerate(self.rng.choices(customers, weights=buyer_weights, k=n)):
+            created = self.past_datetime()
+            status = self.rng.choices(ORDER_STATUSES, weights=ORDER_STATUS_WEIGHTS)[0]
+            items = []
+            for product in set(self.pick_products(products, weights, 1 + int(self.rng.expovariate(0.45)))):
+                price = product.sale_price or product.price
+                items.append((product, self.rng.choices([1, 2, 3, 4], weights=[60, 25, 10, 5])[0], price))
+            subtotal = sum(price * qty for _, qty, price in items)
+            shipping = Decimal('0.00') if subtotal >= 75 else Decimal('9.99')
+            tax = (subtotal * VAT_RATE).quantize(Decimal('0.01'))
+            paid = status not in ('pending', 'cancelled')
+            order = Order(
+                order_no=self.uuid('order', i),
+                customer=buyer, subtotal=subtotal, shipping_cost=shipping, tax=tax, total=subtotal + shipping + tax,
+                is_paid=paid, paid_at=created + timedelta(minutes=2) if paid else None, status=status,
+                shipping_address=buyer.address, shipping_city=buyer.city, shipping_state=buyer.state,
+                shipping_country=buyer.country, shipping_postal_code=buyer.postal_code,
+            )
+            order.generated_at = created
+            orders.append(order)
+            lines.append(items)
+
+        orders = self.bulk_create(Order, orders)
+        for order in orders:
+            order.created_at = order.generated_at
+        self.backdate(Order, orders, 'created_at')
+        self.bulk_create(OrderItem, [
+            OrderItem(order=order, product=product, quantity=qty, price=price)
+            for order, items in zip(orders, lines) for product, qty, price in items
+        ])
+        for order, items in zip(orders, lines):
+            order.generated_products = [product for product, _, _ in items]
+        return orders
+
+    def generate_reviews(self, customers, orders):
+        n = self.count('reviews')
+        paid = [o for o in orders if o.is_paid]
+        if not paid:
+            return
+        self.log(f'Reviews: {n}')
+        reviews, seen = [], set()
+        for order in self.rng.choices(paid, k=n):
+            product = self.rng.choice(order.generated_products)
+            if (order.customer_id, product.pk) in seen:
+                continue
+            seen.add((order.customer_id, product.pk))
+            rating = self.rng.choices([1, 2, 3, 4, 5], weights=RATING_WEIGHTS)[0]
+            review = Review(
+                user_id=order.customer.user_id, customer=order.customer, product=product, rating=rating,
+                title=['Disappointed', 'Not great', 'Okay', 'Good value', 'Excellent'][rating - 1],
+                comment=f'{product.name} arrived {"quickly" if rating > 3 else "late"}.',
+                # Every generated review follows a paid order; save() would derive the same flag
+                is_verified_purchase=True, is_approved=self.rng.random() < 0.9,
+            )
+            review.generated_at = order.generated_at + timedelta(days=self.rng.randint(3, 30))
+            reviews.append(review)
+        reviews = self.bulk_create(Review, reviews)
+        for review in reviews:
+            review.created_at = min(review.generated_at, self.now)
+        self.backdate(Review, reviews, 'created_at')
+
+    def generate_shipments(self, orders):
+        if not apps.is_installed('logistics'):
+            return
+        DeliveryPartner = apps.get_model('logistics', 'DeliveryPartner')
+        DeliveryZone = apps.get_model('logistics', 'DeliveryZone')
+        Shipment = apps.get_model('logistics', 'Shipment')
+        ShipmentUpdate = apps.get_model('logistics', 'ShipmentUpdate')
+
+        partners = [
+            DeliveryPartner.objects.get_or_create(name=name, defaults={
+                'contact_person': 'Dispatch', 'phone': '5550100', 'email': f'{name.lower()}@example.com'})[0]
+            for name in ('UPS', 'FedEx', 'DHL')
+        ]
+        zones = [
+            DeliveryZone.objects.get_or_create(name=name, defaults={'base_fee': fee})[0]
+            for name, fee in (('Local', Decimal('4.99')), ('Regional', Decimal('9.99')), ('National', Decimal('14.99')))
+        ]
+
+        dispatched = [o for o in orders if o.status in ('shipped', 'delivered', 'refunded')]
+        self.log(f'Shipments: {len(dispatched)}')
+        shipments = []
+        for order in dispatched:
+            eta = order.generated_at + timedelta(days=self.rng.randint(2, 7))
+            delivered = order.status != 'shipped'
+            shipments.append(Shipment(
+                order=order, tracking_number=f'{self.tag}-{order.order_no.hex[:12]}',
+                delivery_partner=self.rng.choice(partners), delivery_zone=self.rng.choice(zones),
+                status='delivered' if delivered else 'in_transit', estimated_delivery=eta,
+                actual_delivery=eta + timedelta(hours=self.rng.randint(-24, 48)) if delivered else None,
+                shipping_cost=order.shipping_cost,
+            ))
+        shipments = self.bulk_create(Shipment, shipments)
+
+        updates = []
+        for shipment, order in zip(shipments, dispatched):
+            stamp = order.generated_at
+            for status in ('processing', 'in_transit', 'delivered')[: 3 if shipment.status == 'delivered' else 2]:
+                stamp += timedelta(hours=self.rng.randint(4, 48))
+                updates.append(ShipmentUpdate(shipment=shipment, status=status, location=order.shipping_city,
+                                              timestamp=min(stamp, self.now)))
+        self.bulk_create(ShipmentUpdate, updates)
+
+    def generate_agro(self):
+        AgroUser = apps.get_model('agro_linker', 'User')
+        FarmerProfile = apps.get_model('agro_linker', 'FarmerProfile')
+        ProductCategory = apps.get_model('agro_linker', 'ProductCategory')
+        AgroProduct = apps.get_model('agro_linker', 'Product')
+        Bid = apps.get_model('agro_linker', 'Bid')
+        Offer = apps.get_model('agro_linker', 'Offer')
+        ThriftGroup = apps.get_model('agro_linker', 'ThriftGroup')
+        ThriftMembership = apps.get_model('agro_linker', 'ThriftMembership')
+        ThriftContribution = apps.get_model('agro_linker', 'ThriftContribution')
+        LoanApplication = apps.get_model('agro_linker', 'LoanApplication')
+
+        n_farmers = self.count('farmers')
+        self.log(f'Farmers: {n_farmers}')
+        phone_base = 2340000000000 + AgroUser._base_manager.count()
+
+        def agro_user(i, role):
+            return AgroUser(
+                id=self.uuid('agro-user', i), phone=f'+{phone_base + i}', role=role,
+                first_name=self.rng.choice(FIRST_NAMES), last_name=self.rng.choice(LAST_NAMES),
+                national_id=f'{self.tag}-{role[0]}{i}',
+            )
+
+        farmer_users = self.bulk_create(AgroUser, [agro_user(i, 'FARMER') for i in range(n_farmers)])
+        buyers = self.bulk_create(AgroUser, [agro_user(n_farmers + i, 'BUYER') for i in range(max(1, n_farmers // 2))])
+        farmers = self.bulk_create(FarmerProfile, [
+            FarmerProfile(
+                user=user, farm_size=Decimal(str(round(self.rng.lognormvariate(1.0, 0.8) + 0.1, 2))),
+                soil_type=self.rng.choice(['clay', 'sandy', 'loamy']),
+                crops=self.rng.sample(['maize', 'cassava', 'yam', 'rice', 'cocoa', 'sorghum'], 2),
+                farming_experience=self.rng.randint(0, 40),
+                irrigation_type=self.rng.choices(['rainfed', 'irrigated'], weights=[80, 20])[0],
+                verification_status=self.rng.choices(['VERIFIED', 'PENDING', 'REJECTED'], weights=[70, 25, 5])[0],
+                credit_score=round(self.rng.gauss(620, 90), 1),
+            )
+            for user in farmer_users
+        ])
+
+        categories = [ProductCategory.objects.get_or_create(name=name)[0]
+                      for name in ('Grains', 'Tubers', 'Cash Crops', 'Vegetables')]
+        n_products = self.count('agro_products')
+        self.log(f'Farm listings: {n_products}')
+        agro_products = self.bulk_create(AgroProduct, [
+            AgroProduct(
+                id=self.uuid('agro-product', i), farmer=self.rng.choice(farmers),
+                category=self.rng.choice(categories), name=self.rng.choice(['Maize', 'Cassava', 'Yam', 'Rice', 'Cocoa']),
+                price=self.price(median=1.5, sigma=0.5), quantity=Decimal(self.rng.randint(50, 5000)),
+                quality_grade=self.rng.choices(['A', 'B', 'C'], weights=[30, 50, 20])[0],
+                status=self.rng.choices(['ACTIVE', 'SOLD', 'RESERVED', 'EXPIRED', 'DRAFT'], weights=[55, 20, 10, 10, 5])[0],
+            )
+            for i in range(n_products)
+        ])
+        weights = self.popularity_weights(len(agro_products))
+
+        self.log(f"Bids: {self.count('bids')}, offers: {self.count('offers')}")
+        self.bulk_create(Bid, [
+            Bid(product=product, buyer=self.rng.choice(buyers),
+                amount=(product.price * Decimal(str(round(self.rng.uniform(0.85, 1.1), 2)))).quantize(Decimal('0.01')),
+                quantity=Decimal(self.rng.randint(10, 500)))
+            for product in self.pick_products(agro_products, weights, self.count('bids'))
+        ])
+        self.bulk_create(Offer, [
+            Offer(product=product, buyer=self.rng.choice(buyers),
+                  amount=(product.price * Decimal(str(round(self.rng.uniform(1.01, 1.2), 2)))).quantize(Decimal('0.01')),
+                  quantity=min(product.quantity, Decimal(self.rng.randint(10, 500))),
+                  delivery_address='Depot', delivery_date=(self.now + timedelta(days=self.rng.randint(3, 30))).date(),
+                  status=self.rng.choices(['PENDING', 'ACCEPTED', 'REJECTED', 'EXPIRED'], weights=[40, 25, 20, 15])[0],
+                  expires_at=self.now + timedelta(days=self.rng.randint(1, 14)))
+            for product in self.pick_products(agro_products, weights, self.count('offers'))
+        ])
+
+        n_groups = self.count('thrift_groups')
+        self.log(f'Thrift groups: {n_groups}')
+        groups = self.bulk_create(ThriftGroup, [
+            ThriftGroup(name=f'{self.tag} Thrift {i}', admin=self.rng.choice(farmer_users),
+                        meeting_schedule='Every 2nd Saturday',
+                        contribution_amount=Decimal(self.rng.choice([20, 50, 100, 200])),
+                        cycle_duration=self.rng.choice([4, 8, 12]), current_cycle=self.rng.randint(1, 12))
+            for i in range(n_groups)
+        ])
+        memberships = []
+        for group in groups:
+            for order, member in enumerate(self.rng.sample(farmer_users, min(len(farmer_users), self.rng.randint(8, 25))), 1):
+                memberships.append(ThriftMembership(group=group, user=member, rotation_order=order))
+        memberships = self.bulk_create(ThriftMembership, memberships)
+        group_by_id = {g.pk: g for g in groups}
+        contributions = []
+        for membership in memberships:
+            group = group_by_id[membership.group_id]
+            for cycle in range(1, group.current_cycle + 1):
+                if self.rng.random() < 0.9:  # some members miss a cycle
+                    contributions.append(ThriftContribution(
+                        membership=membership, cycle=cycle, amount=group.contribution_amount,
+                        payment_method=self.rng.choices(['MOBILE_MONEY', 'CASH', 'TRANSFER'], weights=[60, 30, 10])[0],
+                        transaction_reference=f'{self.tag}-{membership.pk}-{cycle}',
+                        is_verified=self.rng.random() < 0.85,
+                    ))
+        self.bulk_create(ThriftContribution, contributions)
+
+        self.log(f"Loans: {self.count('loans')}")
+        self.bulk_create(LoanApplication, [
+            LoanApplication(
+                farmer=farmer, amount=self.price(median=800, sigma=0.6), purpose='Inputs for the planting season',
+                repayment_period_months=self.rng.choice([3, 6, 12]), interest_rate=Decimal(self.rng.choice(['8.50', '12.00', '15.00'])),
+                collateral_details='Harvest lien',
+                status=self.rng.choices(['pending', 'approved', 'disbursed', 'repaid', 'defaulted', 'rejected'],
+                                        weights=[20, 15, 25, 25, 5, 10])[0],
+                reference_id=f'L{self.tag}-{i}'[:20],
+            )
+            for i, farmer in enumerate(self.rng.choices(farmers, k=self.count('loans')))
+        ])
@@ -0,0 +1,117 @@
+"""
+Read-replica routing.
+
+Catalog and report reads go to the REPLICA_DATABASE_ALIAS connection when one
+is configured; everything else (carts, checkout, payments, sessions, auth)
+stays on `default`. A request that writes reads from the primary for the rest
+of the request, and the shopper stays pinned to the primary for
+REPLICA_STICKY_SECONDS so they always read their own writes while the
+replica catches up (see ReplicaStickinessMiddleware). With no replica
+configured every query goes to `default`, exactly as before.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Models whose reads may be served slightly stale
+DEFAULT_REPLICA_READ_MODELS = [
+    'afriapp.service',
+    'afriapp.category',
+    'afriapp.product',
+    'afriapp.review',
+    'afriapp.slide',
+    'afriapp.carousel',
+    'agro_linker.agroanalytics',
+    'agro_linker.pricetrend',
+    'agro_linker.weatherdata',
+]
+
+# Writes to these do not pin the shopper (the session is saved on most page views)
+IGNORED_WRITE_MODELS = {'sessions.session'}
+
+_pinned = ContextVar('replica_pinned', default=False)
+_writes = ContextVar('replica_writes', default=None)
+_report_reads = ContextVar('replica_report_reads', default=False)
+
+
+def replica_alias():
+    """The configured replica alias, or None when reads should stay on the primary."""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def pin_to_primary(pinned=True):
+    """Route every read in the block to the primary (read-your-writes)."""
+    token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def track_writes():
+    """Yield a callable reporting whether the block wrote to the primary."""
+    # A mutable holder so writes made in copied contexts (sync_to_async) are still seen
+    state = {'wrote': False}
+    token = _writes.set(state)
+    try:
+        yield lambda: state['wrote']
+    finally:
+        _writes.reset(token)
+
+
+@contextmanager
+def read_from_replica():
+    """Send all reads in the block to the replica (for reports that tolerate lag)."""
+    token = _report_reads.set(True)
+    try:
+        yield
+    finally:
+        _report_reads.reset(token)
+
+
+def replica_reads(view):
+    """View decorator running the whole view under `read_from_replica`."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with read_from_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaRouter:
+    """Send allow-listed reads to the replica; all writes and migrations to the primary."""
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias()
+        if alias is None or _pinned.get():
+            return DEFAULT_DB_ALIAS
+        # Once this request has written, it reads its own writes from the primary
+        state = _writes.get()
+        if state is not None and state['wrote']:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see that transaction's writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        replica_models = getattr(settings, 'REPLICA_READ_MODELS', DEFAULT_REPLICA_READ_MODELS)
+        if _report_reads.get() or model._meta.label_lower in replica_models:
+            return alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _writes.get()
+        if state is not None and model._meta.label_lower not in IGNORED_WRITE_MODELS:
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
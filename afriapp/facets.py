@@ -0,0 +1,208 @@
+"""
+Faceted catalog filtering.
+
+The shop can be narrowed by category, price bucket, on-sale, in-stock and
+minimum rating. Counts for every facet value come from ONE grouped query
+over the current result set (available products matching the search): each
+row is a combination of (category, price bucket, on sale, in stock, rating
+band) with its product count. Facet counts are then summed in Python, each
+facet applying every selected filter except its own, so picking a value
+still shows how many products its siblings would give. Adding a facet value
+never adds a query.
+"""
+from urllib.parse import urlencode
+
+from django.db.models import BooleanField, Case, CharField, Count, IntegerField, Q, Value, When
+
+from .models import Category, Product, effective_price_expression, sale_price_condition
+
+# (key, label, lower bound inclusive, upper bound exclusive) on the price a shopper pays
+PRICE_BUCKETS = (
+    ('under-10', 'Under $10', None, 10),
+    ('10-25', '$10 to $25', 10, 25),
+    ('25-50', '$25 to $50', 25, 50),
+    ('50-100', '$50 to $100', 50, 100),
+    ('100-up', '$100 & above', 100, None),
+)
+PRICE_BUCKET_KEYS = [key for key, _, _, _ in PRICE_BUCKETS]
+
+# "N stars & up" bands, best first
+RATING_BANDS = (4, 3, 2, 1)
+
+TRUE_VALUES = ('1', 'true', 'on', 'yes')
+
+
+class FacetSelection:
+    """The facet filters requested in a query string; unknown or invalid values are ignored."""
+
+    def __init__(self, params):
+        self.params = params
+        self.search = params.get('search') or ''
+        category = params.get('category_id')
+        if category in (None, '', 'all'):
+            self.category = None
+        else:
+            try:
+                self.category = int(category)
+            except (ValueError, TypeError):
+                # Not an id: a category slug
+                self.category = category
+        price = params.get('price')
+        self.price = price if price in PRICE_BUCKET_KEYS else None
+        self.on_sale = str(params.get('on_sale', '')).lower() in TRUE_VALUES
+        self.in_stock = str(params.get('in_stock', '')).lower() in TRUE_VALUES
+        try:
+            min_rating = int(params.get('min_rating', ''))
+        except (ValueError, TypeError):
+            min_rating = None
+        self.min_rating = min_rating if min_rating in RATING_BANDS else None
+
+    @property
+    def active(self):
+        """Selected facets as {name: value}, for templates and JSON responses."""
+        selected = {
+            'category_id': self.category, 'price': self.price,
+            'on_sale': self.on_sale or None, 'in_stock': self.in_stock or None, 'min_rating': self.min_rating,
+        }
+        return {name: value for name, value in selected.items() if value is not None}
+
+    def url(self, name, value):
+        """Query string for the current page with facet `name` toggled to `value`."""
+        params = {key: self.params.get(key) for key in self.params if key != 'page' and self.params.get(key)}
+        if params.get(name) == str(value):
+            params.pop(name)
+        else:
+            params[name] = value
+        return '?' + urlencode(params)
+
+
+def catalog_queryset(search='', fuzzy_ids=()):
+    """
+    Available products matching the text search: the set the facets are
+    counted over. `fuzzy_ids` (typo-tolerant matches) are included as well.
+    """
+    products = Product.objects.filter(available=True)
+    if search:
+        matches = Q(name__icontains=search) | Q(description__icontains=search)
+        if fuzzy_ids:
+            matches |= Q(id__in=fuzzy_ids)
+        products = products.filter(matches)
+    return products
+
+
+def price_bucket_filter(key):
+    _, _, low, high = PRICE_BUCKETS[PRICE_BUCKET_KEYS.index(key)]
+    condition = Q()
+    if low is not None:
+        condition &= Q(effective_price__gte=low)
+    if high is not None:
+        condition &= Q(effective_price__lt=high)
+    return condition
+
+
+def filter_products(queryset, selection):
+    """Apply every selected facet to `queryset` (no extra queries, slugs are joined)."""
+    if isinstance(selection.category, int):
+        queryset = queryset.filter(category_id=selection.category)
+    elif selection.category:
+        queryset = queryset.filter(category__slug=selection.category)
+    if selection.price:
+        # alias() keeps the expression out of the SELECT, so with_pricing() can still be applied
+        queryset = queryset.alias(effective_price=effective_price_expression()).filter(price_bucket_filter(selection.price))
+    if selection.on_sale:
+        queryset = queryset.filter(sale_price_condition())
+    if selection.in_stock:
+        queryset = queryset.filter(stock_quantity__gt=0)
+    if selection.min_rating:
+        queryset = queryset.filter(rating__gte=selection.min_rating)
+    return queryset
+
+
+def facet_rows(queryset):
+    """One grouped query: product counts per (category, price bucket, on sale, in stock, rating band)."""
+    price_bucket = Case(
+        *[When(effective_price__lt=high, then=Value(key)) for key, _, _, high in PRICE_BUCKETS if high is not None],
+        default=Value(PRICE_BUCKET_KEYS[-1]),
+        output_field=CharField(),
+    )
+    rating_band = Case(
+        *[When(rating__gte=band, then=Value(band)) for band in RATING_BANDS],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return (
+        queryset.alias(effective_price=effective_price_expression())
+        .annotate(
+            price_bucket=price_bucket,
+            is_on_sale=Case(When(sale_price_condition(), then=Value(True)), default=Value(False), output_field=BooleanField()),
+            is_in_stock=Case(When(stock_quantity__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+            rating_band=rating_band,
+        )
+        .values('category_id', 'price_bucket', 'is_on_sale', 'is_in_stock', 'rating_band')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+
+
+def _row_matches(row, selection, category_id, skip=None):
+    if skip != 'category_id' and category_id is not None and row['category_id'] != category_id:
+        return False
+    if skip != 'price' and selection.price and row['price_bucket'] != selection.price:
+        return False
+    if skip != 'on_sale' and selection.on_sale and not row['is_on_sale']:
+        return False
+    if skip != 'in_stock' and selection.in_stock and not row['is_in_stock']:
+        return False
+    if skip != 'min_rating' and selection.min_rating and row['rating_band'] < selection.min_rating:
+        return False
+    return True
+
+
+def facet_counts(selection, queryset=None):
+    """
+    Per-value counts for every facet over `queryset` (the search results by
+    default), plus the total matching all selected facets. Each value carries
+    the query string that toggles it.
+    """
+    if queryset is None:
+        queryset = catalog_queryset(selection.search)
+    category_id = selection.category
+    if isinstance(category_id, str):
+        category_id = Category.objects.filter(slug=category_id).values_list('id', flat=True).first() or 0
+    rows = list(facet_rows(queryset))
+
+    def count(skip, predicate):
+        return sum(row['n'] for row in rows if _row_matches(row, selection, category_id, skip) and predicate(row))
+
+    categories = {}
+    for row in rows:
+        if _row_matches(row, selection, category_id, skip='category_id'):
+            categories[row['category_id']] = categories.get(row['category_id'], 0) + row['n']
+
+    return {
+        'total': count(None, lambda row: True),
+        'category': categories,
+        'price': [
+            {
+                'value': key, 'label': label, 'selected': selection.price == key, 'url': selection.url('price', key),
+                'count': count('price', lambda row, key=key: row['price_bucket'] == key),
+            }
+            for key, label, _, _ in PRICE_BUCKETS
+        ],
+        'on_sale': {
+            'selected': selection.on_sale, 'url': selection.url('on_sale', 1),
+            'count': count('on_sale', lambda row: row['is_on_sale']),
+        },
+        'in_stock': {
+            'selected': selection.in_stock, 'url': selection.url('in_stock', 1),
+            'count': count('in_stock', lambda row: row['is_in_stock']),
+        },
+        'rating': [
+            {
+                'value': band, 'label': f'{band} stars & up', 'selected': selection.min_rating == band,
+                'url': selection.url('min_rating', band),
+                'count': count('min_rating', lambda row, band=band: row['rating_band'] >= band),
+            }
+            for band in RATING_BANDS
+        ],
+    }
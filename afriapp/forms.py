@@ -40,7 +40,7 @@ class SignupForm(UserCreationForm):
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
-        fields = ['name','price', 'description', 'stock_quantity', 'image']
+        fields = ['name','price', 'description', 'stock_quantity', 'image', 'search_aliases']
 
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Product Name'}),
@@ -49,6 +49,7 @@ class ProductForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 5, 'placeholder': 'Product Description'}),
             'stock_quantity': forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Stock Quantity'}),
             'image': forms.ClearableFileInput(attrs={'class': 'form-control'}),
+            'search_aliases': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Other names, comma separated'}),
         }
         
 class CategoryForm(forms.ModelForm):
@@ -0,0 +1,83 @@
+"""
+Character-trigram index for typo-tolerant name matching.
+
+Every word of an indexed name is split into trigrams, padded like
+PostgreSQL's pg_trgm ("egusi" -> "  e", " eg", "egu", "gus", "usi", "si ").
+An inverted index maps each trigram to the words containing it, so the
+candidates for a misspelt word are found by counting shared trigrams over a
+handful of posting lists instead of comparing against every name. Word
+similarity is the Jaccard index of the two trigram sets; a name scores the
+average, over the query's words, of its best-matching word.
+"""
+from collections import Counter
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """Words of indexed names, their trigrams, and which refs (names) use each word."""
+
+    def __init__(self):
+        self.word_refs = {}     # word -> set of refs
+        self.word_grams = {}    # word -> its trigram count
+        self.postings = {}      # trigram -> set of words
+        self.ref_words = {}     # ref -> set of words
+
+    def add(self, ref, words):
+        self.remove(ref)
+        words = set(words)
+        self.ref_words[ref] = words
+        for word in words:
+            refs = self.word_refs.get(word)
+            if refs is None:
+                refs = self.word_refs[word] = set()
+                grams = trigrams(word)
+                self.word_grams[word] = len(grams)
+                for gram in grams:
+                    self.postings.setdefault(gram, set()).add(word)
+            refs.add(ref)
+
+    def remove(self, ref):
+        for word in self.ref_words.pop(ref, ()):
+            refs = self.word_refs[word]
+            refs.discard(ref)
+            if not refs:
+                del self.word_refs[word]
+                del self.word_grams[word]
+                for gram in trigrams(word):
+                    self.postings[gram].discard(word)
+                    if not self.postings[gram]:
+                        del self.postings[gram]
+
+    def similar_words(self, word, min_similarity):
+        """{indexed word: similarity} for words at least `min_similarity` like `word`."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+        similar = {}
+        for candidate, n in shared.items():
+            score = n / (len(grams) + self.word_grams[candidate] - n)
+            if score >= min_similarity:
+                similar[candidate] = score
+        return similar
+
+    def search(self, words, limit=12, min_similarity=0.3):
+        """[(ref, score)] for the names best matching the query `words`, best first."""
+        words = list(dict.fromkeys(words))
+        if not words:
+            return []
+        scores = Counter()
+        for word in words:
+            best = {}
+            for candidate, score in self.similar_words(word, min_similarity).items():
+                for ref in self.word_refs[candidate]:
+                    if score > best.get(ref, 0):
+                        best[ref] = score
+            for ref, score in best.items():
+                scores[ref] += score / len(words)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [(ref, score) for ref, score in ranked if score >= min_similarity][:limit]
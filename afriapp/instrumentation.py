@@ -0,0 +1,158 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+
+# Literals are stripped from SQL so that the same query issued with different
+# parameters maps to a single fingerprint (e.g. N+1 lookups by primary key).
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normalise a SQL statement so repeated queries compare equal."""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """
+    Collect query count, total DB time and SQL fingerprints.
+    Installed on connections with `connection.execute_wrapper`, so it works
+    with DEBUG off and adds only a counter and a timer per query.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duration_ms(self):
+        return self.duration * 1000
+
+    def duplicates(self):
+        """Return {fingerprint: count} for statements executed more than once."""
+        return {sql: n for sql, n in self.fingerprints.items() if n > 1}
+
+    @contextmanager
+    def record(self, using=None):
+        """Record queries on the given database aliases (all configured ones by default)."""
+        aliases = using or list(connections)
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'db_ms': round(self.duration_ms, 2),
+            'duplicates': sum(n - 1 for n in self.duplicates().values()),
+        }
+
+    def server_timing(self):
+        """Render a `Server-Timing` header value for the recorded queries."""
+        return f'db;dur={self.duration_ms:.2f};desc="{self.count} queries"'
+
+
+@contextmanager
+def record_queries(using=None):
+    """Context manager yielding a QueryStats that records every query in the block."""
+    stats = QueryStats()
+    with stats.record(using):
+        yield stats
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for declaring per-view query budgets.
+
+        with self.assertQueryBudget(6):
+            self.client.get(reverse('shop'))
+
+    Fails when the block runs more than `max_queries` queries, or more than
+    `max_duplicates` repeated statements when given (a typical N+1 signature).
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, max_queries, max_duplicates=None, using=None):
+        with record_queries(using) as stats:
+            yield stats
+
+        duplicates = stats.duplicates()
+        report = '\n'.join(f'  {n}x {sql}' for sql, n in stats.fingerprints.most_common())
+        if stats.count > max_queries:
+            self.fail(
+                f'{stats.count} queries executed, budget is {max_queries}:\n{report}'
+            )
+        if max_duplicates is not None:
+            repeated = sum(n - 1 for n in duplicates.values())
+            if repeated > max_duplicates:
+                self.fail(
+                    f'{repeated} duplicated queries executed, budget is {max_duplicates}:\n{report}'
+                )
+
+
+# Plan lines that read a whole table: SQLite reports `SCAN <table>` (with no
+# `USING INDEX`), PostgreSQL `Seq Scan on <table>`.
+_SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?"?(\w+)"?(?! USING)(?:\s|$)')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)"?')
+
+
+def explain(queryset):
+    """
+    Return the query plan for a queryset. On PostgreSQL sequential scans are
+    disabled for the statement, so a seq scan in the plan means no index can
+    serve the query at all (small test tables would otherwise always be scanned).
+    """
+    using = queryset.db
+    if connections[using].vendor != 'postgresql':
+        return queryset.explain()
+    with connections[using].cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            return queryset.explain()
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+def sequential_scans(plan, vendor):
+    """Tables read in full according to an EXPLAIN plan."""
+    pattern = _POSTGRES_SCAN if vendor == 'postgresql' else _SQLITE_SCAN
+    return set(pattern.findall(plan))
+
+
+class QueryPlanMixin:
+    """
+    TestCase mixin asserting that hot queries are served by indexes.
+
+        self.assertIndexed(ShopCart.objects.filter(user=user, paid_order=False))
+
+    Fails when the plan reads the queryset's table with a sequential scan.
+    """
+
+    def assertIndexed(self, queryset, tables=None):
+        tables = set(tables or [queryset.model._meta.db_table])
+        vendor = connections[queryset.db].vendor
+        plan = explain(queryset)
+        scanned = sequential_scans(plan, vendor) & tables
+        if scanned:
+            self.fail(f"Sequential scan on {', '.join(sorted(scanned))}:\n{plan}\n\n{queryset.query}")
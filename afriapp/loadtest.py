@@ -0,0 +1,284 @@
+"""
+In-process load-test harness for the storefront shopping flow.
+
+Virtual shoppers replay a weighted mix of browse / search / cart / checkout
+journeys through Django's request handler (the same middleware stack the WSGI
+app serves) from a pool of threads. Stripe is replaced by a local stub so
+checkouts never leave the process. Results are aggregated per endpoint into a
+JSON-serialisable report (throughput and latency percentiles) that can be
+diffed between commits.
+"""
+import math
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+import stripe
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+
+from .catalog_counts import reconcile_counts
+from .models import Category, Customer, Product, Service
+
+DEFAULT_MIX = {'browse': 50, 'search': 25, 'cart': 17, 'checkout': 8}
+
+SEARCH_TERMS = ['rice', 'palm oil', 'plantain', 'egusi', 'ogbono', 'garri', 'yam', 'pepper', 'beans', 'suya']
+PRODUCT_WORDS = [
+    'Rice', 'Palm Oil', 'Plantain Chips', 'Egusi', 'Ogbono', 'Garri', 'Yam Flour', 'Pepper Soup Spice',
+    'Honey Beans', 'Suya Spice', 'Stockfish', 'Crayfish', 'Fufu Flour', 'Chin Chin', 'Zobo Leaves', 'Iru',
+]
+LOADTEST_PASSWORD = 'loadtest-password'
+
+
+def seed_catalog(products=200, users=20, seed=0, batch_size=5000):
+    """Create a synthetic catalog and shopper accounts; return the shopper usernames.
+    Products are inserted in batches so large catalogs never sit in memory at once."""
+    rng = random.Random(seed)
+    services = [Service.objects.create(name=name, slug=f'loadtest-{name.lower()}') for name in ('Groceries', 'Restaurant')]
+    categories = [
+        Category.objects.create(name=f'Loadtest {service.name} {n}', service=service)
+        for service in services for n in range(5)
+    ]
+
+    batch = []
+    for n in range(products):
+        price = Decimal(rng.randint(199, 4999)) / 100
+        on_sale = rng.random() < 0.2
+        batch.append(Product(
+            category=rng.choice(categories),
+            name=f'{rng.choice(PRODUCT_WORDS)} {n}',
+            slug=f'loadtest-product-{n}',
+            price=price,
+            sale_price=(price * Decimal('0.8')).quantize(Decimal('0.01')) if on_sale else None,
+            description=f'Synthetic {rng.choice(PRODUCT_WORDS).lower()} product for load testing.',
+            featured=rng.random() < 0.1,
+            latest=rng.random() < 0.1,
+            stock_quantity=rng.randint(50, 500),
+        ))
+        if len(batch) >= batch_size:
+            Product.objects.bulk_create(batch)
+            batch = []
+    Product.objects.bulk_create(batch)
+    # bulk_create skips the category/service counter bookkeeping
+    reconcile_counts()
+
+    # Hash the shared password once instead of once per shopper
+    template = User(username='template')
+    template.set_password(LOADTEST_PASSWORD)
+    shoppers = User.objects.bulk_create([
+        User(username=f'loadtest{n}@example.com', email=f'loadtest{n}@example.com', password=template.password)
+        for n in range(users)
+    ])
+    Customer.objects.bulk_create([
+        Customer(user=user, email=user.email, first_name='Load', last_name=f'Tester{n}')
+        for n, user in enumerate(shoppers)
+    ])
+    return [user.username for user in shoppers]
+
+
+@contextmanager
+def throwaway_database():
+    """
+    Create a fresh test database for the duration of the block and drop it afterwards,
+    so load tests and benchmarks never touch the configured database.
+    SQLite uses a file (not :memory:) so worker threads share committed data.
+    """
+    tmpdir = None
+    if connection.vendor == 'sqlite':
+        tmpdir = tempfile.mkdtemp(prefix='afriapp-perf-')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(tmpdir, 'perf.sqlite3')
+        # Concurrent cart writes queue on SQLite's single writer lock; wait rather than fail
+        connection.settings_dict.setdefault('OPTIONS', {}).setdefault('timeout', 30)
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+@contextmanager
+def stub_stripe():
+    """Replace Stripe Checkout with a local stand-in that redirects straight to the success page."""
+
+    def create_session(**kwargs):
+        session_id = f'cs_test_{uuid.uuid4().hex[:24]}'
+        return SimpleNamespace(id=session_id, url='/successpayment/', metadata=kwargs.get('metadata', {}))
+
+    with override_settings(STRIPE_SECRET_KEY='sk_test_loadtest', STRIPE_PUBLIC_KEY='pk_test_loadtest'):
+        with mock.patch.object(stripe.checkout.Session, 'create', side_effect=create_session):
+            yield
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Thread-safe collector of (endpoint, latency, status) samples."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, endpoint, seconds, failed):
+        with self._lock:
+            self.latencies[endpoint].append(seconds * 1000)
+            if failed:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'errors': self.errors[endpoint],
+                'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0.0,
+                'mean_ms': round(sum(values) / len(values), 2),
+                'p50_ms': round(percentile(values, 50), 2),
+                'p90_ms': round(percentile(values, 90), 2),
+                'p95_ms': round(percentile(values, 95), 2),
+                'p99_ms': round(percentile(values, 99), 2),
+                'max_ms': round(values[-1], 2),
+            }
+        total = sum(e['requests'] for e in endpoints.values())
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'total_requests': total,
+            'total_errors': sum(e['errors'] for e in endpoints.values()),
+            'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+class VirtualShopper:
+    """One logged-in shopper replaying journeys picked from the scenario mix."""
+
+    def __init__(self, username, product_ids, recorder, rng, mix):
+        self.client = Client()
+        self.client.force_login(User.objects.get(username=username))
+        self.product_ids = product_ids
+        self.recorder = recorder
+        self.rng = rng
+        self.journeys = list(mix)
+        self.weights = [mix[name] for name in self.journeys]
+
+    def request(self, endpoint, method, url, **kwargs):
+        start = time.perf_counter()
+        response = getattr(self.client, method)(url, **kwargs)
+        elapsed = time.perf_counter() - start
+        # The JSON endpoints report failures as `{"success": false}` with a 200 status
+        failed = response.status_code >= 400
+        if not failed and response.get('Content-Type', '').startswith('application/json'):
+            failed = response.json().get('success') is False
+        self.recorder.record(endpoint, elapsed, failed)
+        return response
+
+    def run_journey(self):
+        journey = self.rng.choices(self.journeys, weights=self.weights)[0]
+        getattr(self, f'journey_{journey}')()
+
+    def journey_browse(self):
+        self.request('index', 'get', reverse('index'))
+        self.request('shop', 'get', reverse('shop'))
+        self.request('load_more_products', 'get', reverse('load_more_products'), data={'page': self.rng.randint(2, 4)})
+        self.request('product', 'get', reverse('product', args=[self.rng.choice(self.product_ids)]))
+
+    def journey_search(self):
+        term = self.rng.choice(SEARCH_TERMS)
+        for length in (3, len(term)):
+            self.request('api_search_products', 'get', reverse('api_search_products'), data={'search': term[:length]})
+        self.request('shop_search', 'get', reverse('shop'), data={'search': term})
+
+    def add_to_cart(self):
+        product_id = self.rng.choice(self.product_ids)
+        self.request('add_to_cart', 'post', reverse('add_to_cart', args=[product_id]),
+                     data={'quantity': self.rng.randint(1, 3)}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def journey_cart(self):
+        self.add_to_cart()
+        self.request('cart', 'get', reverse('cart'))
+        self.request('get_cart_items', 'get', reverse('get_cart_items'))
+
+    def journey_checkout(self):
+        self.add_to_cart()
+        self.request('checkout', 'get', reverse('checkout'))
+        self.request('payment_pipeline', 'post', reverse('payment_pipeline'), data={
+            'basket_no': uuid.uuid4().hex, 'first_name': 'Load', 'last_name': 'Tester',
+            'phone': '5550100', 'address': '1 Market Street', 'city': 'San Diego',
+            'state': 'CA', 'postal_code': '92101', 'country': 'US',
+        })
+        self.request('successpayment', 'get', reverse('successpayment'))
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_load_test(usernames, concurrency=4, iterations=20, duration=None, mix=None, seed=0):
+    """
+    Run `concurrency` shoppers in parallel. Each runs `iterations` journeys,
+    or keeps going until `duration` seconds have passed when given.
+    Returns the aggregated report.
+    """
+    mix = mix or DEFAULT_MIX
+    product_ids = list(Product.objects.filter(available=True).values_list('id', flat=True))
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(index):
+        try:
+            shopper = VirtualShopper(
+                usernames[index % len(usernames)], product_ids, recorder, random.Random(seed + index), mix
+            )
+            done = 0
+            while (deadline and time.perf_counter() < deadline) or (not deadline and done < iterations):
+                shopper.run_journey()
+                done += 1
+        finally:
+            close_old_connections()
+
+    start = time.perf_counter()
+    with stub_stripe(), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker, n) for n in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    report = recorder.report(elapsed)
+    report['config'] = {
+        'concurrency': concurrency,
+        'iterations': None if duration else iterations,
+        'duration_s': duration,
+        'mix': mix,
+        'seed': seed,
+        'products': len(product_ids),
+        'git_revision': git_revision(),
+    }
+    return report
@@ -0,0 +1,170 @@
+"""
+Housekeeping for rows that only ever grow.
+
+Guest carts (ShopCart rows keyed by session_key) outlive the sessions that
+created them, and every visit to checkout leaves an unpaid PaymentInfo
+attempt behind when the shopper abandons Stripe. Both tables sit under the
+hottest cart and webhook queries, so stale rows are removed in short,
+separately committed chunks that never hold locks for long.
+
+Finished orders are not deleted but moved to the ArchivedOrder /
+ArchivedOrderItem tables, in the same kind of chunks, so the live Order
+tables only hold recent and in-flight orders.
+"""
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, PaymentInfo, ShopCart
+
+logger = logging.getLogger('afriapp.maintenance')
+
+
+def stale_guest_carts(days, now=None):
+    """Unpaid guest cart lines not touched for `days` days."""
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return ShopCart.objects.filter(
+        user__isnull=True, customer__isnull=True, session_key__isnull=False,
+        paid_order=False, last_updated__lt=cutoff,
+    )
+
+
+def abandoned_payments(days, now=None):
+    """
+    Unpaid payment attempts older than `days` days (Stripe sessions expire
+    within 24 hours). Saved addresses are PaymentInfo rows too, made without
+    a basket, transaction or Stripe id, and are never included. Neither are
+    attempts `reconcile_stripe` flagged: Stripe charged them, and they wait
+    in the admin for a manual fix.
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    checkout_attempt = (
+        Q(basket_no__isnull=False) | Q(transaction_id__isnull=False) | Q(stripe_payment_intent_id__isnull=False)
+    )
+    return PaymentInfo.objects.filter(
+        checkout_attempt, paid_order=False, created_at__lt=cutoff, reconcile_issue='',
+    )
+
+
+def pk_chunks(queryset, chunk_size):
+    """
+    Yield lists of up to `chunk_size` primary keys of `queryset` in key order.
+    Each chunk resumes after the last key of the previous one, so the scan
+    never restarts from the beginning of the table.
+    """
+    last_pk = None
+    while True:
+        page = queryset.order_by('pk')
+        if last_pk is not None:
+            page = page.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def delete_in_chunks(queryset, chunk_size=1000, pause=0.0):
+    """
+    Delete `queryset` `chunk_size` rows per transaction.
+    Returns ({model label: rows}, chunks).
+    """
+    deleted = {}
+    chunks = 0
+    for pks in pk_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            # Re-check the predicate: a row touched or paid since the scan is kept
+            _, per_model = queryset.filter(pk__in=pks).delete()
+        for label, n in per_model.items():
+            deleted[label] = deleted.get(label, 0) + n
+        chunks += 1
+        if pause:
+            time.sleep(pause)
+    return deleted, chunks
+
+
+def purge_stale_records(guest_cart_days=30, payment_days=7, chunk_size=1000, pause=0.0, dry_run=False):
+    """
+    Remove stale guest carts and abandoned payment attempts.
+    Returns metrics: rows removed per model label (rows that would be removed,
+    without cascades, on a dry run), chunks committed and elapsed seconds.
+    The same metrics are logged as one JSON line on `afriapp.maintenance`.
+    """
+    start = time.perf_counter()
+    targets = [stale_guest_carts(guest_cart_days), abandoned_payments(payment_days)]
+    metrics = {'dry_run': dry_run, 'chunks': 0, 'deleted': {}}
+    for queryset in targets:
+        if dry_run:
+            deleted, chunks = {queryset.model._meta.label: queryset.count()}, 0
+        else:
+            deleted, chunks = delete_in_chunks(queryset, chunk_size, pause)
+        metrics['chunks'] += chunks
+        # Cascaded rows (e.g. CartItem lines under a cart) are reported under their own model
+        for label, n in deleted.items():
+            metrics['deleted'][label] = metrics['deleted'].get(label, 0) + n
+    metrics['seconds'] = round(time.perf_counter() - start, 3)
+    logger.info(json.dumps({'job': 'purge_stale_records', **metrics}, sort_keys=True))
+    return metrics
+
+
+def archivable_orders(days, now=None):
+    """Orders in a terminal status placed more than `days` days ago."""
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    return Order.objects.filter(status__in=Order.TERMINAL_STATUSES, created_at__lt=cutoff)
+
+
+def _copied_fields(archive_model):
+    # Every column of the archive table except its own bookkeeping
+    return [f.attname for f in archive_model._meta.concrete_fields if f.name != 'archived_at']
+
+
+def archive_order_chunk(pks):
+    """
+    Move the given orders and their items to the archive tables in one
+    transaction, keeping their primary keys. Shipments are re-pointed at the
+    archived order. Returns {model label: rows moved}.
+    """
+    with transaction.atomic():
+        orders = Order.objects.filter(pk__in=pks).values(*_copied_fields(ArchivedOrder))
+        archived = ArchivedOrder.objects.bulk_create(ArchivedOrder(**row) for row in orders)
+        items = OrderItem.objects.filter(order_id__in=pks).values(*_copied_fields(ArchivedOrderItem))
+        archived_items = ArchivedOrderItem.objects.bulk_create(ArchivedOrderItem(**row) for row in items)
+        moved = {'afriapp.Order': len(archived), 'afriapp.OrderItem': len(archived_items)}
+        if apps.is_installed('logistics'):
+            Shipment = apps.get_model('logistics', 'Shipment')
+            moved['logistics.Shipment'] = Shipment.objects.filter(order_id__in=pks).update(
+                archived_order_id=F('order_id'), order=None
+            )
+        OrderItem.objects.filter(order_id__in=pks).delete()
+        Order.objects.filter(pk__in=pks).delete()
+    return moved
+
+
+def archive_orders(days=365, chunk_size=500, pause=0.0, dry_run=False):
+    """
+    Move finished orders older than `days` days to the archive tables.
+    Returns metrics: rows moved per model label (orders that would be moved on
+    a dry run), chunks committed and elapsed seconds, also logged as one JSON
+    line on `afriapp.maintenance`.
+    """
+    start = time.perf_counter()
+    queryset = archivable_orders(days)
+    metrics = {'dry_run': dry_run, 'chunks': 0, 'archived': {}}
+    if dry_run:
+        metrics['archived']['afriapp.Order'] = queryset.count()
+    else:
+        for pks in pk_chunks(queryset, chunk_size):
+            for label, n in archive_order_chunk(pks).items():
+                metrics['archived'][label] = metrics['archived'].get(label, 0) + n
+            metrics['chunks'] += 1
+            if pause:
+                time.sleep(pause)
+    metrics['seconds'] = round(time.perf_counter() - start, 3)
+    logger.info(json.dumps({'job': 'archive_orders', **metrics}, sort_keys=True))
+    return metrics
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from afriapp.maintenance import archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Move delivered, cancelled and refunded orders past a given age to the archive tables in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Archive finished orders placed more than this many days ago')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Orders moved per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would be archived')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        metrics = archive_orders(
+            days=options['days'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        for label, n in metrics['archived'].items():
+            self.stdout.write(f'{verb} {n:>8} {label}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {metrics['seconds']}s ({metrics['chunks']} chunks)"
+        ))
@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from afriapp.benchmarks import BENCHMARKS, compare, parse_scale, run_benchmarks
+from afriapp.loadtest import git_revision, seed_catalog, throwaway_database
+
+
+class Command(BaseCommand):
+    help = 'Time storefront hot paths against seeded catalogs and compare with a saved baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', action='append', dest='scales',
+                            help='Catalog size to seed: 1k, 10k, 100k, 1M or a product count (repeatable, default 1k)')
+        parser.add_argument('--only', action='append', choices=sorted(BENCHMARKS), help='Run only these benchmarks (repeatable)')
+        parser.add_argument('--min-time', type=float, default=1.0, help='Seconds to spend timing each benchmark')
+        parser.add_argument('--max-ops', type=int, default=1000, help='Upper bound on timed calls per benchmark')
+        parser.add_argument('--baseline', default='benchmarks/baseline.json', help='Baseline file to compare against')
+        parser.add_argument('--save-baseline', action='store_true', help='Write this run to the baseline file')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Allowed slowdown / memory growth before flagging (0.2 = 20%%)')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit non-zero when regressions are found')
+        parser.add_argument('--output', default=None, help='Also write this run as JSON to the given path')
+
+    def handle(self, *args, **options):
+        try:
+            scales = [parse_scale(value) for value in options['scales'] or ['1k']]
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        results = {}
+        # The webhook logs a traceback per call for its best-effort receipt email; keep the table readable
+        logging.disable(logging.ERROR)
+        try:
+            for label, count in scales:
+                with throwaway_database():
+                    self.stdout.write(f'Seeding {count} products...')
+                    seed_catalog(products=count, users=1)
+                    results[label] = run_benchmarks(options['only'], options['min_time'], options['max_ops'])
+        finally:
+            logging.disable(logging.NOTSET)
+
+        for label, benchmarks in results.items():
+            self.stdout.write(f'\n[{label}]')
+            for name, stats in benchmarks.items():
+                self.stdout.write(
+                    f"{name:<22} {stats['ops_per_sec']:>10.1f} ops/s  {stats['mean_ms']:>9.3f}ms  "
+                    f"{stats['queries']:>3} queries  {stats['peak_kib']:>9.1f} KiB peak"
+                )
+
+        report = {'git_revision': git_revision(), 'scales': results}
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+
+        baseline_path = options['baseline']
+        if options['save_baseline']:
+            saved = {'git_revision': report['git_revision'], 'scales': {}}
+            if os.path.exists(baseline_path):
+                with open(baseline_path) as fh:
+                    saved = json.load(fh)
+            # Merge so a 1k run does not discard a slower-to-produce 1M baseline
+            for label, benchmarks in results.items():
+                saved['scales'].setdefault(label, {}).update(benchmarks)
+            saved['git_revision'] = report['git_revision']
+            os.makedirs(os.path.dirname(baseline_path) or '.', exist_ok=True)
+            with open(baseline_path, 'w') as fh:
+                json.dump(saved, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f'\nBaseline written to {baseline_path}'))
+            return
+
+        if not os.path.exists(baseline_path):
+            self.stdout.write(f'\nNo baseline at {baseline_path}; run with --save-baseline to create one.')
+            return
+
+        with open(baseline_path) as fh:
+            baseline = json.load(fh)
+        regressions = compare(results, baseline.get('scales', {}), options['threshold'])
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"\nNo regressions against baseline {baseline.get('git_revision')}"))
+            return
+        self.stdout.write(self.style.WARNING(f"\nRegressions against baseline {baseline.get('git_revision')}:"))
+        for line in regressions:
+            self.stdout.write(f'  {line}')
+        if options['fail_on_regression']:
+            raise CommandError(f'{len(regressions)} benchmark regression(s)')
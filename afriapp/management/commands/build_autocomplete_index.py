@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from afriapp.autocomplete import build_index, write_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search-box autocomplete index and publish its snapshot to every worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Snapshot path (defaults to AUTOCOMPLETE_SNAPSHOT_PATH)')
+
+    def handle(self, *args, **options):
+        path = options['output'] or settings.AUTOCOMPLETE_SNAPSHOT_PATH
+        start = time.perf_counter()
+        index = build_index()
+        if write_snapshot(index, path) is None:
+            self.stderr.write(self.style.WARNING(f'Snapshot not written to {path or "(no path configured)"}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index.entries)} names ({len(index.keys)} keys) in {time.perf_counter() - start:.2f}s'
+        ))
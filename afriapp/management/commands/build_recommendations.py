@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from afriapp.recommendations import build_associations
+
+
+class Command(BaseCommand):
+    help = 'Recompute "frequently bought together" pairs from the paid order history (run weekly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Order items fetched per database round trip')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        metrics = build_associations(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {metrics['pairs']} pairs for {metrics['products']} products "
+            f"from {metrics['orders']} orders in {metrics['seconds']}s"
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from afriapp.datasets import UNIT, DatasetGenerator
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a realistic synthetic dataset (customers, catalog, carts, orders, reviews, shipments, agro data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1,
+                            help=f"Units of data to generate; one unit is {UNIT['customers']} customers, "
+                                 f"{UNIT['products']} products and {UNIT['orders']} orders")
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same scale and seed reproduce the same data')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per bulk_create batch')
+
+    def handle(self, *args, **options):
+        if options['scale'] < 1:
+            raise CommandError('--scale must be at least 1')
+
+        start = time.perf_counter()
+        generator = DatasetGenerator(options['scale'], options['seed'], options['batch_size'], stdout=self.stdout)
+        counts = generator.generate()
+
+        for label, n in counts.items():
+            self.stdout.write(f'{label:<32} {n:>10}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {sum(counts.values())} rows in {time.perf_counter() - start:.1f}s'
+        ))
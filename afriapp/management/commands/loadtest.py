@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from afriapp.loadtest import DEFAULT_MIX, run_load_test, seed_catalog, throwaway_database
+
+
+def parse_mix(value):
+    """Parse `browse=50,search=25,...` into a weights dict."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise CommandError(f"Unknown journey '{name}'. Choose from: {', '.join(DEFAULT_MIX)}")
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}': {weight!r}")
+    return mix
+
+
+class Command(BaseCommand):
+    help = 'Replay a browse/search/cart/checkout mix against the storefront and report latency percentiles as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of concurrent virtual shoppers')
+        parser.add_argument('--iterations', type=int, default=20, help='Journeys per shopper (ignored with --duration)')
+        parser.add_argument('--duration', type=float, default=None, help='Run for this many seconds instead of a fixed iteration count')
+        parser.add_argument('--products', type=int, default=500, help='Synthetic catalog size')
+        parser.add_argument('--users', type=int, default=50, help='Synthetic shopper accounts')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for catalog and journeys')
+        parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='Journey weights, e.g. browse=50,search=25,cart=17,checkout=8')
+        parser.add_argument('--output', default='loadtest-report.json', help='Where to write the JSON report')
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            self.stdout.write(f"Seeding {options['products']} products and {options['users']} shoppers...")
+            usernames = seed_catalog(options['products'], options['users'], options['seed'])
+
+            self.stdout.write(f"Running with concurrency={options['concurrency']}...")
+            report = run_load_test(
+                usernames,
+                concurrency=options['concurrency'],
+                iterations=options['iterations'],
+                duration=options['duration'],
+                mix=options['mix'],
+                seed=options['seed'],
+            )
+
+        with open(options['output'], 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+
+        for endpoint, stats in report['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<22} {stats['requests']:>6} req  {stats['throughput_rps']:>8.1f} rps  "
+                f"p50 {stats['p50_ms']:>8.1f}ms  p95 {stats['p95_ms']:>8.1f}ms  p99 {stats['p99_ms']:>8.1f}ms  "
+                f"errors {stats['errors']}"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['total_requests']} requests in {report['elapsed_s']}s "
+            f"({report['throughput_rps']} rps). Report written to {options['output']}"
+        ))
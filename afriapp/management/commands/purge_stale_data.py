@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from afriapp.maintenance import purge_stale_records
+
+
+class Command(BaseCommand):
+    help = 'Delete stale guest carts and abandoned payment attempts in small chunks (run daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guest-cart-days', type=int, default=30, help='Remove unpaid guest carts idle for this many days')
+        parser.add_argument('--payment-days', type=int, default=7, help='Remove unpaid payment attempts older than this many days')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between chunks')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows that would be removed')
+
+    def handle(self, *args, **options):
+        if options['guest_cart_days'] < 1 or options['payment_days'] < 1:
+            raise CommandError('--guest-cart-days and --payment-days must be at least 1')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        metrics = purge_stale_records(
+            guest_cart_days=options['guest_cart_days'],
+            payment_days=options['payment_days'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            dry_run=options['dry_run'],
+        )
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        for label, n in metrics['deleted'].items():
+            self.stdout.write(f'{verb} {n:>8} {label}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {metrics['seconds']}s ({metrics['chunks']} chunks)"
+        ))
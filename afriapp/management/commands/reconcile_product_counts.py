@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from afriapp.catalog_counts import reconcile_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount available products per category and service and repair drifted counters (run daily)'
+
+    def handle(self, *args, **options):
+        metrics = reconcile_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f"Fixed {metrics['category']} categories and {metrics['service']} services in {metrics['seconds']}s"
+        ))
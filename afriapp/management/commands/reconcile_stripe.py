@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from afriapp.checkout_sessions import GatewayUnavailable
+from afriapp.stripe_reconcile import reconcile_stripe
+
+
+class Command(BaseCommand):
+    help = 'Match Stripe Checkout Sessions to payments and orders; create missing orders and flag the rest (run hourly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24, help='Reconcile sessions created in this many hours before --until')
+        parser.add_argument('--until', help='End of the window (ISO date/time, default: 15 minutes ago)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Sessions matched per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be created or flagged')
+
+    def handle(self, *args, **options):
+        if options['hours'] < 1:
+            raise CommandError('--hours must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        until = None
+        if options['until']:
+            try:
+                until = datetime.fromisoformat(options['until'])
+            except ValueError:
+                raise CommandError(f"Invalid --until {options['until']!r}")
+            if timezone.is_naive(until):
+                until = timezone.make_aware(until)
+
+        try:
+            metrics = reconcile_stripe(
+                hours=options['hours'], until=until, batch_size=options['batch_size'], dry_run=options['dry_run'],
+            )
+        except GatewayUnavailable as e:
+            raise CommandError(f'Stripe unavailable: {e}')
+
+        for issue, n in metrics['flagged'].items():
+            self.stdout.write(f'Flagged {n:>8} {issue}')
+        verb = 'would create' if options['dry_run'] else 'created'
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {metrics['sessions']} sessions ({metrics['paid']} paid): {verb} "
+            f"{metrics['orders_created']} orders, marked {metrics['marked_paid']} payments paid in {metrics['seconds']}s"
+        ))
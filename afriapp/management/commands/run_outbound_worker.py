@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from afriapp.outbound import OutboundWorker
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued WhatsApp messages (runs until stopped; --once drains the queue and exits)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Provider calls in flight at once')
+        parser.add_argument('--batch-size', type=int, default=50, help='Messages claimed per poll')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--lease', type=int, default=300, help='Seconds before a claimed message may be re-claimed')
+        parser.add_argument('--once', action='store_true', help='Exit once no messages are due')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--concurrency and --batch-size must be at least 1')
+
+        worker = OutboundWorker(
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            lease_seconds=options['lease'],
+        )
+        totals = {}
+        try:
+            while True:
+                counts = worker.run_once()
+                for status, n in counts.items():
+                    totals[status] = totals.get(status, 0) + n
+                if counts:
+                    self.stdout.write(', '.join(f'{n} {status}' for status, n in sorted(counts.items())))
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            worker.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            'Outbound worker stopped: ' + (', '.join(f'{n} {status}' for status, n in sorted(totals.items())) or 'nothing to send')
+        ))
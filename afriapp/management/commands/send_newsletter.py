@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from afriapp.models import NewsletterCampaign
+from afriapp.newsletter import send_campaign
+
+
+class Command(BaseCommand):
+    help = 'Send (or resume sending) a newsletter campaign to all active subscribers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('campaign_id', type=int, help='NewsletterCampaign to send')
+        parser.add_argument('--batch-size', type=int, default=100, help='Messages sent between progress checkpoints')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Subscribers fetched from the database at a time')
+        parser.add_argument('--rate', type=float, default=None, help='Maximum messages per second')
+
+    def handle(self, *args, **options):
+        try:
+            campaign = NewsletterCampaign.objects.get(pk=options['campaign_id'])
+        except NewsletterCampaign.DoesNotExist:
+            raise CommandError(f"Campaign {options['campaign_id']} does not exist")
+        if options['batch_size'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--batch-size and --chunk-size must be at least 1')
+
+        if campaign.status == 'sending':
+            self.stdout.write(f'Resuming after subscriber {campaign.last_subscriber_id} ({campaign.sent_count} already sent)')
+        try:
+            sent = send_campaign(
+                campaign,
+                batch_size=options['batch_size'],
+                chunk_size=options['chunk_size'],
+                rate=options['rate'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {sent} messages ({campaign.sent_count} total, {campaign.failed_count} failed)'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from afriapp.popularity import flush, update_trending
+
+
+class Command(BaseCommand):
+    help = 'Fold recent product views and cart adds into trending scores and refresh best sellers (run hourly)'
+
+    def handle(self, *args, **options):
+        # Counts still buffered in this process (none for a cron run) are written first
+        flush()
+        updated = update_trending()
+        self.stdout.write(self.style.SUCCESS(f"Updated popularity for {updated} products"))
@@ -1,23 +1,9 @@
-from twilio.rest import Client
+from .outbound import enqueue_whatsapp
 
-# Twilio credentials
-account_sid = 'YOUR_ACCOUNT_SID'  # Your Account SID from www.twilio.com/console
-auth_token = 'YOUR_AUTH_TOKEN'      # Your Auth Token from www.twilio.com/console
-twilio_whatsapp_number = 'whatsapp:+YOUR_TWILIO_WHATSAPP_NUMBER'  # Twilio WhatsApp number
-
-# Create a Twilio client
-client = Client(account_sid, auth_token)
 
 def send_whatsapp_message(to_number, message):
-    try:
-        message = client.messages.create(
-            body=message,
-            from_=twilio_whatsapp_number,
-            to=f'whatsapp:{to_number}'  # Replace with your personal WhatsApp number
-        )
-        print(f'Message sent: {message.sid}')
-    except Exception as e:
-        print(f'Error: {e}')
+    """Queue a WhatsApp message; the outbound worker delivers it through Twilio."""
+    return enqueue_whatsapp(to_number, message)
 
 
 
@@ -1,7 +1,22 @@
+import json
 import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .customers import get_customer
+from .db_router import pin_to_primary, replica_alias, track_writes
+from .instrumentation import QueryStats, record_queries
+from .profiling import StackSampler, get_profile_store
 
 logger = logging.getLogger(__name__)
+query_logger = logging.getLogger('afriapp.queries')
 
 class SessionCookieMiddleware(MiddlewareMixin):
     """
@@ -29,3 +44,242 @@ class SessionCookieMiddleware(MiddlewareMixin):
             logger.error(f"Error in SessionCookieMiddleware: {str(e)}")
             
         return response
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively in both stacks: plain calls under
+    WSGI and coroutines under ASGI, so async views are not pushed back onto a
+    worker thread by a sync-only middleware in the chain.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class CustomerMiddleware(HybridMiddleware):
+    """
+    Set `request.customer`: the signed-in user's Customer profile (or None),
+    looked up on first use and shared with `customers.get_customer(request)`.
+    It is a lazy proxy, so `request.customer is None` is always False: test
+    it for truthiness, or call get_customer(request) for the object itself.
+    Async requests get no `request.customer`, since touching it would run the
+    lookup on the event loop; async views use
+    `await sync_to_async(get_customer)(request)`.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def handle(self, request):
+        request.customer = SimpleLazyObject(lambda: get_customer(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that passes non-static requests straight through under ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+
+class ReplicaStickinessMiddleware(HybridMiddleware):
+    """
+    Read-your-writes for the replica router: a request that writes to the
+    primary sets a short-lived cookie, and requests carrying it read from the
+    primary too until it expires (REPLICA_STICKY_SECONDS).
+    """
+    cookie_name = 'replica_pin'
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 15)
+
+    def _pinned(self, request):
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def _pin(self, response):
+        response.set_cookie(
+            self.cookie_name, str(int(time.time() + self.sticky_seconds)),
+            max_age=self.sticky_seconds, httponly=True, samesite='Lax',
+        )
+
+    def handle(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+        with pin_to_primary(self._pinned(request)), track_writes() as wrote:
+            response = self.get_response(request)
+        if wrote():
+            self._pin(response)
+        return response
+
+    async def __acall__(self, request):
+        if replica_alias() is None:
+            return await self.get_response(request)
+        # Context variables follow the request into sync_to_async ORM calls
+        with pin_to_primary(self._pinned(request)), track_writes() as wrote:
+            response = await self.get_response(request)
+        if wrote():
+            self._pin(response)
+        return response
+
+
+class QueryInstrumentationMiddleware(HybridMiddleware):
+    """
+    Record per-request query count, DB time and duplicated SQL.
+    Emits the numbers as a `Server-Timing` header and one structured log line
+    on the `afriapp.queries` logger. Enabled with QUERY_INSTRUMENTATION.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'QUERY_INSTRUMENTATION', False)
+
+    def handle(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with record_queries() as stats:
+            response = self.get_response(request)
+        return self._report(request, response, stats, start)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        # Connections are per thread: install the wrapper on the thread that runs
+        # this request's sync_to_async ORM calls (one per request under ASGI)
+        start = time.perf_counter()
+        stats = QueryStats()
+        recorder = stats.record()
+        await sync_to_async(recorder.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recorder.__exit__)(None, None, None)
+        return self._report(request, response, stats, start)
+
+    def _report(self, request, response, stats, start):
+        total_ms = (time.perf_counter() - start) * 1000
+
+        timing = f'{stats.server_timing()}, app;dur={total_ms:.2f}'
+        if response.has_header('Server-Timing'):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response['Server-Timing'] = timing
+
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            **stats.as_dict(),
+        }
+        duplicates = stats.duplicates()
+        if duplicates:
+            record['duplicated_sql'] = sorted(duplicates, key=duplicates.get, reverse=True)[:5]
+        query_logger.info(json.dumps(record))
+        return response
+
+
+class SamplingProfilerMiddleware(HybridMiddleware):
+    """
+    Sample the request thread's stack and append it to the shared profile.
+    A request is profiled when a staff user sends the `X-Profile-Request`
+    header (value `wall` or `cpu`) or it falls within PROFILER_SAMPLE_RATE.
+    Requests that are not sampled only pay for one random() call.
+    Must run after AuthenticationMiddleware.
+    """
+
+    header = 'HTTP_X_PROFILE_REQUEST'
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = getattr(settings, 'PROFILER_ENABLED', False)
+        self.sample_rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0.0)
+        self.interval = getattr(settings, 'PROFILER_INTERVAL', 0.005)
+        self.default_mode = getattr(settings, 'PROFILER_MODE', 'wall')
+
+    def _sampling_mode(self, request):
+        requested = request.META.get(self.header)
+        if requested is not None:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return requested if requested in ('wall', 'cpu') else self.default_mode
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.default_mode
+        return None
+
+    def handle(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+        mode = self._sampling_mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        sampler = StackSampler(interval=self.interval, mode=mode)
+        with sampler:
+            response = self.get_response(request)
+        return self._store(request, response, sampler)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        # The staff check may load the user from the database
+        mode = await sync_to_async(self._sampling_mode)(request)
+        if mode is None:
+            return await self.get_response(request)
+
+        # Sample the thread running this request's sync code (ORM, templates)
+        thread_id = await sync_to_async(threading.get_ident)()
+        sampler = StackSampler(thread_id=thread_id, interval=self.interval, mode=mode)
+        with sampler:
+            response = await self.get_response(request)
+        return self._store(request, response, sampler)
+
+    def _store(self, request, response, sampler):
+        # Root each stack at the view name (not the raw path) to keep the profile compact
+        match = getattr(request, 'resolver_match', None)
+        root = f"{request.method} {match.view_name if match else request.path}"
+        get_profile_store().append({f'{root};{stack}': n for stack, n in sampler.samples.items()})
+        response['X-Profile-Samples'] = str(sum(sampler.samples.values()))
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-19 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0004_guestprofile_alter_customer_table'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer', 'created_at'], name='order_customer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentinfo',
+            index=models.Index(fields=['stripe_payment_intent_id'], name='paymentinfo_intent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentinfo',
+            index=models.Index(fields=['basket_no', 'created_at'], name='paymentinfo_basket_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['date_created'], name='product_avail_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopcart',
+            index=models.Index(fields=['user', 'paid_order'], name='shopcart_user_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shopcart',
+            index=models.Index(fields=['session_key', 'paid_order'], name='shopcart_session_paid_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2 on 2026-10-19 18:54
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0005_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrder',
+            fields=[
+                ('subtotal', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('shipping_cost', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('tax', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('discount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('stripe_payment_intent_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('is_paid', models.BooleanField(default=False)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('shipping_address', models.TextField(blank=True)),
+                ('shipping_city', models.CharField(blank=True, max_length=100)),
+                ('shipping_state', models.CharField(blank=True, max_length=100)),
+                ('shipping_country', models.CharField(blank=True, max_length=100)),
+                ('shipping_postal_code', models.CharField(blank=True, max_length=20)),
+                ('tracking_number', models.CharField(blank=True, max_length=100)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled'), ('refunded', 'Refunded')], default='pending', max_length=20)),
+                ('notes', models.TextField(blank=True)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('order_no', models.UUIDField(editable=False, unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to='afriapp.customer')),
+                ('payment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_orders', to='afriapp.paymentinfo')),
+            ],
+            options={
+                'db_table': 'archived_order',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderItem',
+            fields=[
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('discount', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='afriapp.archivedorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='afriapp.product')),
+            ],
+            options={
+                'db_table': 'archived_order_item',
+                'ordering': ['id'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorder',
+            index=models.Index(fields=['customer', 'created_at'], name='archived_order_customer_idx'),
+        ),
+    ]
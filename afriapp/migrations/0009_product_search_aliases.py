@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0008_outbound_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_aliases',
+            field=models.CharField(blank=True, default='', help_text='Comma-separated alternative names, e.g. "gari, eba"', max_length=255),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-19 19:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0009_product_search_aliases'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAssociation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='associations', to='afriapp.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_by', to='afriapp.product')),
+            ],
+            options={
+                'db_table': 'product_association',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productassociation',
+            index=models.Index(fields=['product', '-orders'], name='product_assoc_top_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productassociation',
+            constraint=models.UniqueConstraint(fields=('product', 'related'), name='product_association_unique'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-19 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0010_product_association'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStats',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='afriapp.product')),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('cart_adds', models.PositiveIntegerField(default=0)),
+                ('recent_views', models.PositiveIntegerField(default=0)),
+                ('recent_cart_adds', models.PositiveIntegerField(default=0)),
+                ('trending_score', models.FloatField(default=0)),
+                ('trending_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('units_sold', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'product stats',
+                'db_table': 'product_stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='productstats',
+            index=models.Index(fields=['-trending_score'], name='product_stats_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productstats',
+            index=models.Index(fields=['-units_sold'], name='product_stats_sold_idx'),
+        ),
+    ]
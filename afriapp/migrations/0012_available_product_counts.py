@@ -0,0 +1,34 @@
+# Generated by Django 4.2 on 2026-10-19 19:30
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def count_available_products(apps, schema_editor):
+    Category = apps.get_model('afriapp', 'Category')
+    Service = apps.get_model('afriapp', 'Service')
+    for model, lookup in ((Category, 'products'), (Service, 'services__products')):
+        counts = model.objects.annotate(n=Count(lookup, filter=Q(**{f'{lookup}__available': True}))).values_list('pk', 'n')
+        for pk, n in counts:
+            model.objects.filter(pk=pk).update(available_product_count=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0011_product_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='available_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='available_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_available_products, migrations.RunPython.noop),
+    ]
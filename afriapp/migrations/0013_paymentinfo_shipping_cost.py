@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0012_available_product_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentinfo',
+            name='shipping_cost',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-19 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0013_paymentinfo_shipping_cost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentinfo',
+            name='checkout_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymentinfo',
+            name='checkout_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='paymentinfo',
+            name='checkout_url',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddIndex(
+            model_name='paymentinfo',
+            index=models.Index(fields=['user', 'checkout_fingerprint', 'checkout_expires_at'], name='paymentinfo_checkout_idx'),
+        ),
+    ]
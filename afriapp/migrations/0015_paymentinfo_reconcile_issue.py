@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0014_paymentinfo_checkout_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentinfo',
+            name='reconcile_issue',
+            field=models.CharField(blank=True, choices=[('cart_gone', 'Paid, but the cart to build the order from is gone'), ('cart_changed', 'Paid, but the cart no longer matches the amount charged'), ('no_customer', 'Paid, but the user has no customer profile'), ('unpaid_order', 'Order exists, but the Stripe session expired unpaid')], default='', max_length=20),
+        ),
+    ]
@@ -1,12 +1,16 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
+from django.db.models import Case, F, Q, Value, When
 from django.db.models.deletion import CASCADE
+from django.db.models.functions import Cast, Floor
 from django.utils import timezone
 from django.utils.text import slugify
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 import uuid
 
+from .pricing import price_cart
+
 
 # Customer Model
 class Customer(models.Model):
@@ -46,15 +50,65 @@ class Newsletter(models.Model):
     def __str__(self):
         return self.email
 
+
+class NewsletterCampaign(models.Model):
+    """
+    One newsletter send. `subject`, `body_text` and `body_html` are Django
+    templates rendered once per campaign; `{{ email }}` and
+    `{{ unsubscribe_url }}` are filled in for each recipient. Progress is
+    checkpointed after every batch, so send_newsletter resumes where it stopped.
+    """
+    STATUS_CHOICES = (
+        ('draft', 'Draft'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+    )
+
+    subject = models.CharField(max_length=200)
+    body_text = models.TextField()
+    body_html = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    # Resume cursor: subscribers are sent to in primary-key order
+    last_subscriber_id = models.BigIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.subject} ({self.status})"
+
+    class Meta:
+        db_table = 'newsletter_campaign'
+        ordering = ['-created_at']
+
+def skip_counter_on_update(instance, save_kwargs):
+    """
+    Leave `available_product_count` out of a full-row UPDATE: the counter is
+    changed with F() updates, so an instance loaded earlier holds a stale copy.
+    """
+    if instance._state.adding or save_kwargs.get('update_fields') is not None or save_kwargs.get('force_insert'):
+        return
+    save_kwargs['update_fields'] = [
+        field.name for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name != 'available_product_count'
+    ]
+
+
 class Service(models.Model):
     name = models.CharField(max_length=50)
     image = models.ImageField(upload_to='products', default='pix.jpg')
     description = models.CharField(max_length=100, blank=True)
     slug = models.SlugField(unique=True, null=False, blank=True)  # Allow blank for now
+    # Maintained by afriapp/catalog_counts.py; `reconcile_product_counts` repairs drift
+    available_product_count = models.PositiveIntegerField(default=0, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.slug:  # Only generate slug if it doesn’t exist
             self.slug = slugify(self.name)
+        skip_counter_on_update(self, kwargs)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -71,22 +125,76 @@ class Category(models.Model):
     service = models.ForeignKey(Service, related_name='services', on_delete=models.CASCADE, default=None)
     name = models.CharField(max_length=255, blank=True)
     slug = models.SlugField(unique=True, blank=True)  # Allow blank slug initially
+    # Maintained by afriapp/catalog_counts.py; `reconcile_product_counts` repairs drift
+    available_product_count = models.PositiveIntegerField(default=0, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.slug:  # Only create a slug if it doesn't exist
             base_slug = slugify(self.name)
             slug = base_slug
             counter = 1
-            while Category.objects.filter(slug=slug).exists():  # Change from Service to Category
+            # On the write alias: the row is not written yet, so nothing pins this read to the primary
+            alias = kwargs.get('using') or router.db_for_write(Category, instance=self)
+            while Category.objects.using(alias).filter(slug=slug).exists():  # Change from Service to Category
                 slug = f"{base_slug}-{counter}"
                 counter += 1
             self.slug = slug
-        super(Category, self).save(*args, **kwargs)  # Change Service to Category
+        skip_counter_on_update(self, kwargs)
+        # Atomic so a service change moves this category's count between the services with the row
+        with transaction.atomic():
+            super(Category, self).save(*args, **kwargs)  # Change Service to Category
 
     def __str__(self):
         return self.name
 
 
+def sale_price_condition(prefix=''):
+    """Q matching rows whose sale price undercuts the regular price."""
+    return Q(**{
+        f'{prefix}sale_price__isnull': False,
+        f'{prefix}sale_price__lt': F(f'{prefix}price'),
+    })
+
+
+def effective_price_expression(prefix=''):
+    """SQL expression for the price a shopper actually pays (sale price when on sale)."""
+    return Case(
+        When(sale_price_condition(prefix), then=F(f'{prefix}sale_price')),
+        default=F(f'{prefix}price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_pricing(self):
+        """Annotate `on_sale`, `display_price` and `discount_pct` computed in SQL."""
+        on_sale = sale_price_condition()
+        return self.annotate(
+            on_sale=Case(
+                When(on_sale, then=Value(True)),
+                default=Value(False),
+                output_field=models.BooleanField(),
+            ),
+            display_price=effective_price_expression(),
+            discount_pct=Case(
+                When(on_sale, then=Cast(
+                    Floor((F('price') - F('sale_price')) * 100 / F('price')),
+                    models.IntegerField(),
+                )),
+                default=Value(0),
+                output_field=models.IntegerField(),
+            ),
+        )
+
+    def deals(self):
+        """Available products on sale, biggest discount first."""
+        return self.with_pricing().filter(available=True, on_sale=True).order_by('-discount_pct', 'display_price')
+
+    def clearance(self, min_discount=30):
+        """Deeply discounted products (at least `min_discount` percent off), cheapest first."""
+        return self.deals().filter(discount_pct__gte=min_discount).order_by('display_price', '-discount_pct')
+
+
 class Product(models.Model):
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE, null=True, blank=True)
     name = models.CharField(max_length=100)
@@ -121,6 +229,13 @@ class Product(models.Model):
         validators=[MinValueValidator(0), MaxValueValidator(5)]
     )
     cultural_significance = models.TextField(blank=True, null=True)
+    # Other spellings and local names, matched by the search box's typo-tolerant fallback
+    search_aliases = models.CharField(
+        max_length=255, blank=True, default='',
+        help_text='Comma-separated alternative names, e.g. "gari, eba"',
+    )
+
+    objects = ProductQuerySet.as_manager()
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -128,21 +243,33 @@ class Product(models.Model):
             # Ensure slug is unique
             counter = 1
             original_slug = self.slug
-            while Product.objects.filter(slug=self.slug).exists():
+            alias = kwargs.get('using') or router.db_for_write(Product, instance=self)
+            while Product.objects.using(alias).filter(slug=self.slug).exists():
                 self.slug = f"{original_slug}-{counter}"
                 counter += 1
-        super().save(*args, **kwargs)
+        # Atomic so the category/service counters (updated from the save signals) move with the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
+    # The pricing helpers below reuse the SQL annotations from
+    # `Product.objects.with_pricing()` when present, so templates rendering
+    # annotated listings don't recompute them per product.
     def is_on_sale(self):
+        if 'on_sale' in self.__dict__:
+            return self.on_sale
         return self.sale_price is not None and self.sale_price < self.price
 
     def get_discount_percentage(self):
+        if 'discount_pct' in self.__dict__:
+            return self.discount_pct
         if self.is_on_sale():
             discount = ((self.price - self.sale_price) / self.price) * 100
             return int(discount)
         return 0
 
     def get_display_price(self):
+        if 'display_price' in self.__dict__:
+            return self.display_price
         if self.is_on_sale():
             return self.sale_price
         return self.price
@@ -159,9 +286,22 @@ class Product(models.Model):
         verbose_name = 'product'
         verbose_name_plural = 'products'
         ordering = ['-date_created']
+        indexes = [
+            # Storefront listings: available products, newest first. Partial rather than
+            # (available, date_created) because SQLite compiles `available=True` to a bare
+            # column test that a composite index cannot serve; the partial index matches it.
+            models.Index(fields=['date_created'], condition=Q(available=True), name='product_avail_created_idx'),
+        ]
 
 
 
+class ShopCartQuerySet(models.QuerySet):
+    def totals(self):
+        """Item count and sale-aware amount for the cart, from the shared pricing engine (one query)."""
+        pricing = price_cart(self.select_related('product'))
+        return {'total_items': pricing.item_count, 'total_amount': pricing.subtotal}
+
+
 class ShopCart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, null=True, blank=True)
@@ -176,6 +316,8 @@ class ShopCart(models.Model):
     last_updated = models.DateTimeField(auto_now=True)
     session_key = models.CharField(max_length=40, null=True, blank=True)
 
+    objects = ShopCartQuerySet.as_manager()
+
     def __str__(self):
         if self.user:
             user_str = f"{self.user}'s"
@@ -208,6 +350,11 @@ class ShopCart(models.Model):
         verbose_name = 'shopcart'
         verbose_name_plural = 'shopcarts'
         ordering = ['-date_added']
+        indexes = [
+            # Open-cart lookups for signed-in shoppers and guests (every page via the context processor)
+            models.Index(fields=['user', 'paid_order'], name='shopcart_user_paid_idx'),
+            models.Index(fields=['session_key', 'paid_order'], name='shopcart_session_paid_idx'),
+        ]
 
 class CartItem(models.Model):
     shop_cart = models.ForeignKey(ShopCart, related_name='cart_items', on_delete=models.CASCADE)
@@ -216,7 +363,7 @@ class CartItem(models.Model):
 
     @property
     def total_price(self):
-        return self.quantity * self.product.price
+        return self.quantity * self.product.get_display_price()
 
     def __str__(self):
         return f"{self.product.name} (x{self.quantity})"
@@ -224,7 +371,8 @@ class CartItem(models.Model):
 
 
 # Order Model
-class Order(models.Model):
+class OrderRecord(models.Model):
+    """Fields and behaviour shared by live orders and their archived copies."""
     STATUS_CHOICES = (
         ('pending', 'Pending'),
         ('processing', 'Processing'),
@@ -233,12 +381,8 @@ class Order(models.Model):
         ('cancelled', 'Cancelled'),
         ('refunded', 'Refunded')
     )
-
-    order_no = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
-    payment = models.ForeignKey("PaymentInfo", on_delete=models.SET_NULL, null=True, blank=True, related_name="orders")
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # Orders in these states never change again and may be archived
+    TERMINAL_STATUSES = ('delivered', 'cancelled', 'refunded')
 
     # Financial details
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
@@ -270,20 +414,38 @@ class Order(models.Model):
         self.total = self.subtotal + self.shipping_cost + self.tax - self.discount
         return self.total
 
+    def __str__(self):
+        return f"Order #{self.order_no} - {self.customer.first_name} {self.customer.last_name} ({self.status})"
+
+    class Meta:
+        abstract = True
+
+
+class Order(OrderRecord):
+    order_no = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
+    payment = models.ForeignKey("PaymentInfo", on_delete=models.SET_NULL, null=True, blank=True, related_name="orders")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    is_archived = False
+
     def mark_as_paid(self):
         """Mark the order as paid"""
         self.is_paid = True
         self.paid_at = timezone.now()
         self.save()
 
-    def __str__(self):
-        return f"Order #{self.order_no} - {self.customer.first_name} {self.customer.last_name} ({self.status})"
-
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Order history pages list a customer's orders newest first
+            models.Index(fields=['customer', 'created_at'], name='order_customer_created_idx'),
+        ]
 
-class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
+
+class OrderItemRecord(models.Model):
+    """Fields and behaviour shared by live order lines and their archived copies."""
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -297,9 +459,49 @@ class OrderItem(models.Model):
         return f"{self.product.name} (Qty: {self.quantity}) - Order {self.order.order_no}"
 
     class Meta:
+        abstract = True
         ordering = ['id']
 
 
+class OrderItem(OrderItemRecord):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items')
+
+    class Meta(OrderItemRecord.Meta):
+        pass
+
+
+class ArchivedOrder(OrderRecord):
+    """
+    An order in a terminal status moved out of the live `Order` table by the
+    archive_orders command. It keeps the original primary key, so order links
+    and shipment references stay valid.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order_no = models.UUIDField(editable=False, unique=True)
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='archived_orders')
+    payment = models.ForeignKey("PaymentInfo", on_delete=models.SET_NULL, null=True, blank=True, related_name="archived_orders")
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+    class Meta:
+        db_table = 'archived_order'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['customer', 'created_at'], name='archived_order_customer_idx'),
+        ]
+
+
+class ArchivedOrderItem(OrderItemRecord):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='order_items')
+
+    class Meta(OrderItemRecord.Meta):
+        db_table = 'archived_order_item'
+
+
 
 
 class Payment(models.Model):
@@ -345,6 +547,8 @@ class Payment(models.Model):
 class PaymentInfo(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    # Delivery fee included in `amount`, so the order records the same breakdown
+    shipping_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stripe_payment_intent_id = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now, blank=True, null=True)  # Correct usage
     basket_no = models.CharField(max_length=36,null=True, blank=True)
@@ -373,6 +577,20 @@ class PaymentInfo(models.Model):
         default='credit_card'  # Set the default value here
     )
     transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True)  # New field for transaction ID
+    # The Stripe Checkout Session opened for this attempt, reused while the
+    # basket fingerprint (lines, prices, address) is unchanged
+    checkout_fingerprint = models.CharField(max_length=64, blank=True, default='')
+    checkout_url = models.TextField(blank=True, default='')
+    checkout_expires_at = models.DateTimeField(null=True, blank=True)
+    # Set by `reconcile_stripe` when Stripe and this record disagree and an
+    # order could not be created (or should not exist) automatically
+    RECONCILE_ISSUES = [
+        ('cart_gone', 'Paid, but the cart to build the order from is gone'),
+        ('cart_changed', 'Paid, but the cart no longer matches the amount charged'),
+        ('no_customer', 'Paid, but the user has no customer profile'),
+        ('unpaid_order', 'Order exists, but the Stripe session expired unpaid'),
+    ]
+    reconcile_issue = models.CharField(max_length=20, choices=RECONCILE_ISSUES, blank=True, default='')
 
     def __str__(self):
         if self.user:
@@ -385,6 +603,14 @@ class PaymentInfo(models.Model):
         managed = True
         verbose_name = 'paymentinfo'
         verbose_name_plural = 'paymentsinfo'
+        indexes = [
+            # Stripe webhook lookups by session / payment intent id
+            models.Index(fields=['stripe_payment_intent_id'], name='paymentinfo_intent_idx'),
+            # Success page and webhook fallback: latest payment for a basket
+            models.Index(fields=['basket_no', 'created_at'], name='paymentinfo_basket_idx'),
+            # Repeat pay clicks: an open session for the same user and basket fingerprint
+            models.Index(fields=['user', 'checkout_fingerprint', 'checkout_expires_at'], name='paymentinfo_checkout_idx'),
+        ]
 
 # Slide model (for homepage/carousel)
 class Slide(models.Model):
@@ -521,21 +747,17 @@ class Review(models.Model):
         if not self.user and not self.customer:
             raise ValueError("Either user or customer must be provided")
 
-        # Check if this is a verified purchase
+        # Check if this is a verified purchase (live or archived orders)
         if self.user:
             # Check if user has purchased this product
-            self.is_verified_purchase = OrderItem.objects.filter(
-                order__customer__user=self.user,
-                product=self.product,
-                order__is_paid=True
-            ).exists()
+            purchase = {'order__customer__user': self.user, 'product': self.product, 'order__is_paid': True}
         elif self.customer:
             # Check if customer has purchased this product
-            self.is_verified_purchase = OrderItem.objects.filter(
-                order__customer=self.customer,
-                product=self.product,
-                order__is_paid=True
-            ).exists()
+            purchase = {'order__customer': self.customer, 'product': self.product, 'order__is_paid': True}
+        self.is_verified_purchase = (
+            OrderItem.objects.filter(**purchase).exists()
+            or ArchivedOrderItem.objects.filter(**purchase).exists()
+        )
 
         super().save(*args, **kwargs)
 
@@ -617,4 +839,93 @@ class GuestProfile(models.Model):
 
     class Meta:
         verbose_name = "Guest Profile"
-        verbose_name_plural = "Guest Profiles"
\ No newline at end of file
+        verbose_name_plural = "Guest Profiles"
+
+class OutboundMessage(models.Model):
+    """
+    A WhatsApp (or other third-party) message waiting to be delivered by the
+    outbound worker (`python manage.py run_outbound_worker`), so requests never
+    wait on the provider's API.
+    """
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (SENDING, 'Sending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead-lettered'),
+    )
+
+    channel = models.CharField(max_length=20, default='whatsapp')
+    to_number = models.CharField(max_length=32)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Worker claim: a message being sent is leased until `locked_until`
+    claimed_by = models.CharField(max_length=40, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    provider_message_id = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.channel} to {self.to_number} ({self.status})"
+
+    class Meta:
+        db_table = 'outbound_message'
+        ordering = ['id']
+        indexes = [
+            # The worker polls for due messages
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_due_idx'),
+        ]
+
+
+# Precomputed "frequently bought together" pairs
+class ProductAssociation(models.Model):
+    """How many paid orders contained both `product` and `related` (one row per direction)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='associations')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_by')
+    orders = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.orders} orders)"
+
+    class Meta:
+        db_table = 'product_association'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='product_association_unique'),
+        ]
+        indexes = [
+            # Product and cart pages read a product's strongest pairs
+            models.Index(fields=['product', '-orders'], name='product_assoc_top_idx'),
+        ]
+
+
+# Popularity counters, written in batches by afriapp/popularity.py
+class ProductStats(models.Model):
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    views = models.PositiveIntegerField(default=0)
+    cart_adds = models.PositiveIntegerField(default=0)
+    # Counted since the last trending update, then folded into trending_score
+    recent_views = models.PositiveIntegerField(default=0)
+    recent_cart_adds = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0)
+    trending_updated_at = models.DateTimeField(null=True, blank=True)
+    # Units sold in paid orders over the best-seller window
+    units_sold = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stats for product {self.product_id}"
+
+    class Meta:
+        db_table = 'product_stats'
+        verbose_name_plural = 'product stats'
+        indexes = [
+            models.Index(fields=['-trending_score'], name='product_stats_trending_idx'),
+            models.Index(fields=['-units_sold'], name='product_stats_sold_idx'),
+        ]
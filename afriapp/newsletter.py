@@ -0,0 +1,153 @@
+"""
+Newsletter campaign delivery.
+
+A campaign's templates are rendered once, with unique markers where the
+per-recipient values go; each message then only needs string substitution.
+Active subscribers are streamed in primary-key order with `.iterator()`,
+messages are sent in batches over one pooled backend connection, and the
+campaign's cursor and counters are saved after every batch, so a crashed or
+interrupted send resumes with the next unsent subscriber (at most the batch
+in flight is sent twice).
+"""
+import logging
+import secrets
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template import Context, Template
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+
+from .models import Newsletter
+
+logger = logging.getLogger(__name__)
+
+UNSUBSCRIBE_SALT = 'afriapp.newsletter.unsubscribe'
+
+# Template variables that differ per recipient
+RECIPIENT_FIELDS = ('email', 'unsubscribe_url')
+
+
+def unsubscribe_token(email):
+    return signing.dumps(email, salt=UNSUBSCRIBE_SALT)
+
+
+def unsubscribe_email(token):
+    """Return the email address a token was issued for (raises signing.BadSignature)."""
+    return signing.loads(token, salt=UNSUBSCRIBE_SALT)
+
+
+def unsubscribe_url(email):
+    return settings.YOUR_DOMAIN.rstrip('/') + reverse('newsletter_unsubscribe', args=[unsubscribe_token(email)])
+
+
+class RenderedCampaign:
+    """A campaign's subject and bodies rendered once, ready for per-recipient substitution."""
+
+    def __init__(self, campaign):
+        nonce = secrets.token_hex(8)
+        self.markers = {name: f'__{name}_{nonce}__' for name in RECIPIENT_FIELDS}
+        context = {'campaign': campaign, 'site_url': settings.YOUR_DOMAIN, **self.markers}
+        self.subject = self._render(campaign.subject, context, autoescape=False).strip()
+        self.text = self._render(campaign.body_text, context, autoescape=False)
+        self.html = self._render(campaign.body_html, context, autoescape=True) if campaign.body_html else None
+
+    @staticmethod
+    def _render(source, context, autoescape):
+        return Template(source).render(Context(context, autoescape=autoescape))
+
+    def _fill(self, rendered, values):
+        for name, marker in self.markers.items():
+            rendered = rendered.replace(marker, values[name])
+        return rendered
+
+    def message(self, email, connection=None):
+        values = {'email': email, 'unsubscribe_url': unsubscribe_url(email)}
+        message = EmailMultiAlternatives(
+            subject=' '.join(self._fill(self.subject, values).split()),
+            body=self._fill(self.text, values),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+            connection=connection,
+            headers={
+                'List-Unsubscribe': f"<{values['unsubscribe_url']}>",
+                'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click',
+            },
+        )
+        if self.html:
+            escaped = {name: escape(value) for name, value in values.items()}
+            message.attach_alternative(self._fill(self.html, escaped), 'text/html')
+        return message
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _send_batch(connection, messages):
+    """Send over the open connection; a failing recipient reopens it and the batch carries on."""
+    sent = failed = 0
+    for message in messages:
+        try:
+            sent += connection.send_messages([message]) or 0
+        except Exception:
+            failed += 1
+            logger.exception("Newsletter delivery to %s failed", message.to[0])
+            connection.close()
+            connection.open()
+    return sent, failed
+
+
+def send_campaign(campaign, batch_size=100, chunk_size=2000, rate=None, connection=None):
+    """
+    Send `campaign` to every active subscriber it has not reached yet.
+    `rate` caps messages per second. Returns the number of messages sent by
+    this run; the campaign's own counters hold the running totals.
+    """
+    if campaign.status == 'sent':
+        raise ValueError(f'Campaign {campaign.pk} has already been sent')
+
+    rendered = RenderedCampaign(campaign)
+    if campaign.status == 'draft':
+        campaign.status = 'sending'
+        campaign.started_at = timezone.now()
+        campaign.save(update_fields=['status', 'started_at'])
+
+    subscribers = (
+        Newsletter.objects.filter(is_active=True, pk__gt=campaign.last_subscriber_id)
+        .order_by('pk')
+        .values_list('pk', 'email')
+        .iterator(chunk_size=chunk_size)
+    )
+    connection = connection or get_connection()
+    connection.open()
+    sent_this_run = 0
+    try:
+        for batch in _batches(subscribers, batch_size):
+            started = time.perf_counter()
+            sent, failed = _send_batch(connection, [rendered.message(email, connection) for _, email in batch])
+            sent_this_run += sent
+            campaign.last_subscriber_id = batch[-1][0]
+            campaign.sent_count += sent
+            campaign.failed_count += failed
+            campaign.save(update_fields=['last_subscriber_id', 'sent_count', 'failed_count'])
+            if rate:
+                time.sleep(max(0.0, len(batch) / rate - (time.perf_counter() - started)))
+    finally:
+        connection.close()
+
+    campaign.status = 'sent'
+    campaign.finished_at = timezone.now()
+    campaign.save(update_fields=['status', 'finished_at'])
+    logger.info("Newsletter campaign %s sent: %s delivered, %s failed", campaign.pk, campaign.sent_count, campaign.failed_count)
+    return sent_this_run
@@ -0,0 +1,159 @@
+"""
+Outbound message queue.
+
+Views call `enqueue_whatsapp()`, which only inserts an OutboundMessage row.
+A separate worker process (`python manage.py run_outbound_worker`) claims due
+messages in batches, sends them through one long-lived provider client with a
+bounded thread pool, and records the outcome: sent, retried later with
+exponential backoff, or dead-lettered once the attempts run out or the
+provider rejects the message outright.
+
+The provider is chosen with OUTBOUND_MESSAGE_PROVIDER: TwilioProvider in
+production, StubProvider locally and in tests.
+"""
+import logging
+import random
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentSendError(Exception):
+    """The provider rejected the message; retrying cannot succeed."""
+
+
+class TwilioProvider:
+    """Sends WhatsApp messages through one Twilio client reused for the worker's lifetime."""
+
+    def __init__(self):
+        from twilio.rest import Client
+
+        self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        self.from_number = f'whatsapp:{settings.TWILIO_WHATSAPP_NUMBER}'
+
+    def send(self, message):
+        from twilio.base.exceptions import TwilioRestException
+
+        try:
+            sent = self.client.messages.create(body=message.body, from_=self.from_number, to=f'whatsapp:{message.to_number}')
+        except TwilioRestException as e:
+            # 4xx other than rate limiting means a bad number, body or account: do not retry
+            if 400 <= e.status < 500 and e.status != 429:
+                raise PermanentSendError(str(e)) from e
+            raise
+        return sent.sid
+
+
+class StubProvider:
+    """Local provider that records messages instead of calling an API."""
+
+    sent = []
+
+    def send(self, message):
+        if message.to_number.startswith('+000'):
+            raise PermanentSendError(f'Invalid number {message.to_number}')
+        StubProvider.sent.append((message.to_number, message.body))
+        return f'stub-{uuid.uuid4().hex[:16]}'
+
+
+def get_provider():
+    return import_string(settings.OUTBOUND_MESSAGE_PROVIDER)()
+
+
+def enqueue_whatsapp(to_number, body):
+    """Queue a WhatsApp message for the outbound worker; never calls the provider."""
+    return OutboundMessage.objects.create(channel='whatsapp', to_number=to_number, body=body)
+
+
+def backoff(attempts):
+    """Delay before the next attempt: exponential from OUTBOUND_RETRY_BASE_SECONDS, with jitter."""
+    base = settings.OUTBOUND_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=base * random.uniform(0.8, 1.2))
+
+
+def claim_batch(worker_id, limit, lease_seconds=300):
+    """
+    Lease up to `limit` due messages to `worker_id` and return them.
+    Claiming is a conditional UPDATE, so concurrent workers never share a
+    message; leases left behind by a crashed worker expire and are re-claimed.
+    """
+    now = timezone.now()
+    OutboundMessage.objects.filter(status=OutboundMessage.SENDING, locked_until__lt=now).update(
+        status=OutboundMessage.QUEUED, claimed_by=''
+    )
+    due = list(
+        OutboundMessage.objects.filter(status=OutboundMessage.QUEUED, next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id')
+        .values_list('id', flat=True)[:limit]
+    )
+    if not due:
+        return []
+    OutboundMessage.objects.filter(id__in=due, status=OutboundMessage.QUEUED).update(
+        status=OutboundMessage.SENDING, claimed_by=worker_id, locked_until=now + timedelta(seconds=lease_seconds)
+    )
+    return list(OutboundMessage.objects.filter(id__in=due, status=OutboundMessage.SENDING, claimed_by=worker_id))
+
+
+def _deliver(provider, message):
+    # Runs in a pool thread: only the provider call, no database access
+    try:
+        return message, provider.send(message), None
+    except Exception as e:
+        return message, None, e
+
+
+def record_result(message, provider_id, error):
+    """Mark a claimed message sent, schedule a retry, or dead-letter it."""
+    message.attempts += 1
+    message.claimed_by = ''
+    message.locked_until = None
+    if error is None:
+        message.status = OutboundMessage.SENT
+        message.provider_message_id = provider_id or ''
+        message.sent_at = timezone.now()
+        message.last_error = ''
+    elif isinstance(error, PermanentSendError) or message.attempts >= settings.OUTBOUND_MAX_ATTEMPTS:
+        message.status = OutboundMessage.DEAD
+        message.last_error = str(error)
+        logger.error("Outbound message %s dead-lettered after %s attempt(s): %s", message.pk, message.attempts, error)
+    else:
+        message.status = OutboundMessage.QUEUED
+        message.next_attempt_at = timezone.now() + backoff(message.attempts)
+        message.last_error = str(error)
+        logger.warning("Outbound message %s failed (attempt %s), retrying: %s", message.pk, message.attempts, error)
+    message.save(update_fields=[
+        'attempts', 'claimed_by', 'locked_until', 'status', 'provider_message_id', 'sent_at', 'last_error', 'next_attempt_at',
+    ])
+    return message.status
+
+
+class OutboundWorker:
+    """Claims due messages and sends them with at most `concurrency` provider calls in flight."""
+
+    def __init__(self, provider=None, concurrency=4, batch_size=50, lease_seconds=300):
+        self.provider = provider or get_provider()
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.worker_id = uuid.uuid4().hex
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='outbound')
+
+    def run_once(self):
+        """Send one claimed batch; returns {status: count} for the messages processed."""
+        counts = {}
+        batch = claim_batch(self.worker_id, self.batch_size, self.lease_seconds)
+        for message, provider_id, error in self.pool.map(lambda m: _deliver(self.provider, m), batch):
+            status = record_result(message, provider_id, error)
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def close(self):
+        self.pool.shutdown(wait=True)
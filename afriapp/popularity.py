@@ -0,0 +1,174 @@
+"""
+Product popularity: write-behind counters, trending and best sellers.
+
+Product views and add-to-cart events are counted in this worker's memory
+(`record_view` / `record_cart_add` never touch the database). The counts are
+flushed to ProductStats in one transaction after a response has been sent,
+at most once every POPULARITY_FLUSH_SECONDS per worker, so a burst of page
+views costs one batched write instead of one write per view.
+
+`update_trending()` (the `update_trending` command, run hourly) folds the
+counts gathered since its last run into an exponentially decayed trending
+score with a half-life of POPULARITY_HALF_LIFE_HOURS, and refreshes each
+product's units sold over the last BEST_SELLER_DAYS days, archived orders
+included. The storefront lists read those two columns with one query each.
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+from django.db.models import F, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import ArchivedOrderItem, OrderItem, Product, ProductStats
+
+logger = logging.getLogger(__name__)
+
+# A cart add says more about intent than a view
+VIEW_WEIGHT = 1.0
+CART_ADD_WEIGHT = 5.0
+BEST_SELLER_DAYS = 30
+# Flush early (after the next response) once this many events are buffered
+MAX_BUFFERED = 1000
+
+
+class CounterBuffer:
+    """Per-worker view and cart-add counts waiting to be written."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = Counter()
+        self.cart_adds = Counter()
+        self.events = 0
+        self.flushed_at = time.monotonic()
+
+    def add(self, counter, product_id, n=1):
+        with self.lock:
+            counter[product_id] += n
+            self.events += n
+
+    def drain(self):
+        with self.lock:
+            views, cart_adds = self.views, self.cart_adds
+            self.views, self.cart_adds = Counter(), Counter()
+            self.events = 0
+            self.flushed_at = time.monotonic()
+        return views, cart_adds
+
+    def restore(self, views, cart_adds):
+        with self.lock:
+            self.views.update(views)
+            self.cart_adds.update(cart_adds)
+            self.events += sum(views.values()) + sum(cart_adds.values())
+
+    def due(self):
+        interval = getattr(settings, 'POPULARITY_FLUSH_SECONDS', 30)
+        return self.events and (self.events >= MAX_BUFFERED or time.monotonic() - self.flushed_at >= interval)
+
+
+_buffer = CounterBuffer()
+
+
+def record_view(product_id):
+    _buffer.add(_buffer.views, product_id)
+
+
+def record_cart_add(product_id, n=1):
+    _buffer.add(_buffer.cart_adds, product_id, n)
+
+
+def flush():
+    """Write the buffered counts to ProductStats; returns the number of products updated."""
+    views, cart_adds = _buffer.drain()
+    if not views and not cart_adds:
+        return 0
+    try:
+        with transaction.atomic():
+            # Products deleted since they were viewed are dropped
+            product_ids = set(Product.objects.filter(id__in=set(views) | set(cart_adds)).values_list('id', flat=True))
+            ProductStats.objects.bulk_create([ProductStats(product_id=pk) for pk in product_ids], ignore_conflicts=True)
+            for pk in product_ids:
+                v, c = views.get(pk, 0), cart_adds.get(pk, 0)
+                ProductStats.objects.filter(product_id=pk).update(
+                    views=F('views') + v, recent_views=F('recent_views') + v,
+                    cart_adds=F('cart_adds') + c, recent_cart_adds=F('recent_cart_adds') + c,
+                )
+    except DatabaseError:
+        logger.exception("Could not flush popularity counters; keeping them for the next flush")
+        _buffer.restore(views, cart_adds)
+        return 0
+    return len(product_ids)
+
+
+def _flush_after_response(sender, **kwargs):
+    if _buffer.due():
+        flush()
+
+
+def update_trending(now=None):
+    """
+    Decay every trending score by the time since the last run, add the views
+    and cart adds recorded since, and refresh units sold. Returns the rows updated.
+    """
+    now = now or timezone.now()
+    half_life = getattr(settings, 'POPULARITY_HALF_LIFE_HOURS', 24)
+    since = now - timedelta(days=BEST_SELLER_DAYS)
+    with transaction.atomic():
+        last_run = ProductStats.objects.aggregate(last=Max('trending_updated_at'))['last']
+        hours = (now - last_run).total_seconds() / 3600 if last_run else 0
+        decay = 0.5 ** (hours / half_life)
+
+        # archive_orders may already have moved recent paid orders out of the live tables
+        recent_sales = [
+            model.objects.filter(order__is_paid=True, order__created_at__gte=since)
+            for model in (OrderItem, ArchivedOrderItem)
+        ]
+        sold_ids = set()
+        for sales in recent_sales:
+            sold_ids.update(sales.values_list('product_id', flat=True).distinct())
+        ProductStats.objects.bulk_create([ProductStats(product_id=pk) for pk in sold_ids], ignore_conflicts=True)
+        live_units, archived_units = (
+            Coalesce(Subquery(
+                sales.filter(product_id=OuterRef('product_id'))
+                .values('product_id').annotate(n=Sum('quantity')).values('n')
+            ), 0)
+            for sales in recent_sales
+        )
+        return ProductStats.objects.update(
+            trending_score=F('trending_score') * decay
+            + F('recent_views') * VIEW_WEIGHT + F('recent_cart_adds') * CART_ADD_WEIGHT,
+            recent_views=0,
+            recent_cart_adds=0,
+            units_sold=live_units + archived_units,
+            trending_updated_at=now,
+        )
+
+
+def trending_products(products=None, limit=8):
+    """Available products (of `products`, default all) with the highest trending score (one query)."""
+    products = Product.objects.all() if products is None else products
+    return (
+        products.filter(available=True, stats__trending_score__gt=0)
+        .with_pricing().select_related('category')
+        .order_by('-stats__trending_score', 'id')[:limit]
+    )
+
+
+def best_sellers(products=None, limit=8):
+    """Available products (of `products`) with the most units sold in the last BEST_SELLER_DAYS days (one query)."""
+    products = Product.objects.all() if products is None else products
+    return (
+        products.filter(available=True, stats__units_sold__gt=0)
+        .with_pricing().select_related('category')
+        .order_by('-stats__units_sold', 'id')[:limit]
+    )
+
+
+def connect_signals():
+    request_finished.connect(_flush_after_response, dispatch_uid='popularity_flush_after_response')
@@ -0,0 +1,169 @@
+"""
+Cart pricing.
+
+Every cart figure on the site (the header summary, the cart page and its AJAX
+endpoints, checkout, the Stripe Checkout line items and the order recorded
+after payment) comes from `price_cart()`. It works in integer cents: each
+unit price is converted once, VAT is rounded half-up once on the subtotal and
+everything else is integer addition, so what the shopper sees, what Stripe
+charges and what the order stores agree to the cent.
+
+A cart's version is its lines (product, name, quantity, regular and paid unit
+price) plus the shipping fee; the breakdown for a version is computed once
+and memoised, so the context processor and the view pricing the same cart in
+one request, or the same cart on every page, reuse it.
+"""
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+
+from django.apps import apps
+
+VAT_RATE = Decimal('0.075')
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    """Decimal/float/int/None amount in dollars -> integer cents (half-up)."""
+    return int((Decimal(str(amount or 0)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def to_amount(cents):
+    """Integer cents -> Decimal dollars with two places."""
+    return (Decimal(cents) / 100).quantize(CENT)
+
+
+@dataclass(frozen=True)
+class Line:
+    product_id: int
+    name: str
+    quantity: int
+    regular_cents: int
+    unit_cents: int
+
+    @property
+    def total_cents(self):
+        return self.unit_cents * self.quantity
+
+    @property
+    def discount_cents(self):
+        return (self.regular_cents - self.unit_cents) * self.quantity
+
+    @property
+    def unit_price(self):
+        return to_amount(self.unit_cents)
+
+    @property
+    def total(self):
+        return to_amount(self.total_cents)
+
+
+@dataclass(frozen=True)
+class Breakdown:
+    lines: tuple
+    subtotal_cents: int
+    discount_cents: int
+    vat_cents: int
+    shipping_cents: int
+    total_cents: int
+    item_count: int
+
+    @property
+    def subtotal(self):
+        return to_amount(self.subtotal_cents)
+
+    @property
+    def discount(self):
+        return to_amount(self.discount_cents)
+
+    @property
+    def vat(self):
+        return to_amount(self.vat_cents)
+
+    @property
+    def shipping(self):
+        return to_amount(self.shipping_cents)
+
+    @property
+    def total(self):
+        return to_amount(self.total_cents)
+
+    def as_json(self):
+        return {
+            'subtotal': float(self.subtotal),
+            'discount': float(self.discount),
+            'vat': float(self.vat),
+            'shipping': float(self.shipping),
+            'total': float(self.total),
+        }
+
+    def stripe_line_items(self, currency='usd'):
+        """Checkout line items that add up to `total_cents`: the products, then VAT and shipping."""
+        def item(name, unit_cents, quantity=1):
+            return {
+                'price_data': {'currency': currency, 'product_data': {'name': name}, 'unit_amount': unit_cents},
+                'quantity': quantity,
+            }
+
+        items = [item(line.name, line.unit_cents, line.quantity) for line in self.lines]
+        if self.vat_cents:
+            items.append(item(f'VAT ({(VAT_RATE * 100).normalize()}%)', self.vat_cents))
+        if self.shipping_cents:
+            items.append(item('Shipping', self.shipping_cents))
+        return items
+
+
+@lru_cache(maxsize=4096)
+def _price(lines, shipping_cents):
+    subtotal = sum(line.total_cents for line in lines)
+    vat = int((subtotal * VAT_RATE).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    return Breakdown(
+        lines=lines,
+        subtotal_cents=subtotal,
+        discount_cents=sum(line.discount_cents for line in lines),
+        vat_cents=vat,
+        shipping_cents=shipping_cents,
+        total_cents=subtotal + vat + shipping_cents,
+        item_count=sum(line.quantity for line in lines),
+    )
+
+
+def cart_lines(items):
+    """Pricing lines for ShopCart rows (load them with select_related('product'))."""
+    return tuple(
+        Line(
+            product_id=item.product_id,
+            name=item.product.name,
+            quantity=item.quantity,
+            regular_cents=to_cents(item.product.price),
+            unit_cents=to_cents(item.product.get_display_price()),
+        )
+        for item in items
+    )
+
+
+def price_cart(items, shipping_cents=0):
+    """The integer-cents Breakdown of ShopCart rows plus a shipping fee (memoised per cart version)."""
+    return _price(cart_lines(items), shipping_cents)
+
+
+def delivery_zones():
+    """Active delivery zones for the checkout's shipping choice (empty without the logistics app)."""
+    if not apps.is_installed('logistics'):
+        return []
+    return list(apps.get_model('logistics', 'DeliveryZone').objects.filter(is_active=True).order_by('base_fee', 'name'))
+
+
+def zone_shipping_cents(zone_id):
+    """An active DeliveryZone's fee in cents; 0 when no (valid) zone is chosen."""
+    if not zone_id or not apps.is_installed('logistics'):
+        return 0
+    try:
+        zone_id = int(zone_id)
+    except (TypeError, ValueError):
+        return 0
+    fee = (
+        apps.get_model('logistics', 'DeliveryZone').objects
+        .filter(pk=zone_id, is_active=True).values_list('base_fee', flat=True).first()
+    )
+    return to_cents(fee) if fee is not None else 0
@@ -0,0 +1,158 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+
+
+@lru_cache(maxsize=4096)
+def _frame_label(code):
+    """Return a flamegraph label for a code object (cached, labels are hot)."""
+    filename = '/'.join(code.co_filename.replace('\\', '/').split('/')[-2:])
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def collapse_stack(frame, root=None):
+    """Render a frame chain in collapsed-stack format (root first, `;` separated)."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    if root:
+        labels.append(root)
+    labels.reverse()
+    return ';'.join(labels)
+
+
+def _thread_cpu_clock(thread_id):
+    """Return a per-thread CPU clock reader, or None where the platform lacks one."""
+    try:
+        clock_id = time.pthread_getcpuclockid(thread_id)
+    except (AttributeError, OSError):
+        return None
+    return lambda: time.clock_gettime(clock_id)
+
+
+class StackSampler:
+    """
+    Sample the stack of one thread from a background thread.
+
+    In `wall` mode every tick is recorded; in `cpu` mode a tick is only
+    recorded when the target thread consumed CPU since the previous tick, so
+    time spent waiting on the database or Stripe drops out of the profile.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005, mode='wall', root=None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.mode = mode
+        self.root = root
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cpu_clock = _thread_cpu_clock(self.thread_id) if mode == 'cpu' else None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        last_cpu = self._cpu_clock() if self._cpu_clock else None
+        while not self._stop.wait(self.interval):
+            if self._cpu_clock:
+                cpu = self._cpu_clock()
+                if cpu == last_cpu:
+                    continue
+                last_cpu = cpu
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[collapse_stack(frame, self.root)] += 1
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class ProfileStore:
+    """
+    Collapsed-stack file shared by all requests (and worker processes).
+    Each sampled request appends its own lines in a single write; reading
+    merges identical stacks, so the download is a ready-to-use flamegraph input.
+    Once the file passes max_bytes it is rewritten with the stacks merged, and
+    if that is still too big only the heaviest stacks that fit are kept.
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = path or settings.PROFILER_OUTPUT
+        self.max_bytes = max_bytes or settings.PROFILER_MAX_BYTES
+        self._lock = threading.Lock()
+
+    def append(self, samples):
+        if not samples:
+            return
+        payload = ''.join(f'{stack} {count}\n' for stack, count in samples.items())
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as fh:
+                fh.write(payload)
+                size = fh.tell()
+            if size > self.max_bytes:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the file with identical stacks merged, keeping it under max_bytes."""
+        lines, size = [], 0
+        for stack, count in self.aggregate().most_common():
+            line = f'{stack} {count}\n'
+            size += len(line.encode('utf-8'))
+            if size > self.max_bytes:
+                break
+            lines.append(line)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as fh:
+            fh.write(''.join(sorted(lines)))
+        os.replace(tmp_path, self.path)
+
+    def aggregate(self):
+        totals = Counter()
+        try:
+            with open(self.path, encoding='utf-8') as fh:
+                for line in fh:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack and count.isdigit():
+                        totals[stack] += int(count)
+        except FileNotFoundError:
+            pass
+        return totals
+
+    def render(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.aggregate().items()))
+
+    def clear(self):
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+_store = None
+
+
+def get_profile_store():
+    global _store
+    if _store is None or _store.path != settings.PROFILER_OUTPUT:
+        _store = ProfileStore()
+    return _store
@@ -0,0 +1,161 @@
+"""
+"Frequently bought together" recommendations.
+
+Co-purchases are counted offline: `build_associations()` streams the items
+of every paid order (live and archived) in order-id order, counts for each
+product how many orders also contained each other product, and replaces the
+ProductAssociation table with each product's strongest pairs. New paid
+orders are folded in by `record_order()`, which bumps only the pairs in that
+order, so the full rebuild is needed rarely (e.g. weekly, to correct drift).
+Product and cart pages read the precomputed rows with one query each.
+"""
+import heapq
+import json
+import logging
+import time
+from itertools import chain, groupby
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import ArchivedOrderItem, OrderItem, Product, ProductAssociation
+
+logger = logging.getLogger('afriapp.maintenance')
+
+# Pairs shown per product
+TOP_K = 8
+# Pairs kept per product; the slack lets a new pair climb past older weak ones
+STORED_PER_PRODUCT = 2 * TOP_K
+# Bigger baskets (wholesale orders) say little about affinity and cost n^2 pairs
+MAX_BASKET = 50
+
+
+def _paid_baskets(chunk_size):
+    """Yield the distinct product ids of each paid order."""
+    rows = chain(
+        OrderItem.objects.filter(order__is_paid=True)
+        .order_by('order_id').values_list('order_id', 'product_id').iterator(chunk_size=chunk_size),
+        ArchivedOrderItem.objects.filter(order__is_paid=True)
+        .order_by('order_id').values_list('order_id', 'product_id').iterator(chunk_size=chunk_size),
+    )
+    for _, items in groupby(rows, key=lambda row: row[0]):
+        yield {product_id for _, product_id in items}
+
+
+def co_purchase_counts(baskets):
+    """{product id: {other product id: orders containing both}} for an iterable of baskets."""
+    counts = {}
+    for basket in baskets:
+        if not 2 <= len(basket) <= MAX_BASKET:
+            continue
+        for product_id in basket:
+            row = counts.setdefault(product_id, {})
+            for other in basket:
+                if other != product_id:
+                    row[other] = row.get(other, 0) + 1
+    return counts
+
+
+def top_pairs(counts, limit=STORED_PER_PRODUCT):
+    """Strongest `limit` pairs per product (ties go to the lower product id)."""
+    for product_id, row in counts.items():
+        for other, n in heapq.nsmallest(limit, row.items(), key=lambda item: (-item[1], item[0])):
+            yield ProductAssociation(product_id=product_id, related_id=other, orders=n)
+
+
+def build_associations(chunk_size=2000, batch_size=1000):
+    """
+    Recompute every product's pairs from the paid order history and replace
+    the table in one transaction. Returns metrics, also logged as one JSON
+    line on `afriapp.maintenance`.
+    """
+    start = time.perf_counter()
+    baskets = 0
+
+    def counted(rows):
+        nonlocal baskets
+        for basket in rows:
+            baskets += 1
+            yield basket
+
+    counts = co_purchase_counts(counted(_paid_baskets(chunk_size)))
+    with transaction.atomic():
+        ProductAssociation.objects.all().delete()
+        created = ProductAssociation.objects.bulk_create(top_pairs(counts), batch_size=batch_size)
+    metrics = {
+        'orders': baskets,
+        'products': len(counts),
+        'pairs': len(created),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    logger.info(json.dumps({'job': 'build_associations', **metrics}, sort_keys=True))
+    return metrics
+
+
+def _trim(product_ids):
+    limit = STORED_PER_PRODUCT
+    rows = (
+        ProductAssociation.objects.filter(product_id__in=product_ids)
+        .order_by('product_id', '-orders', 'id')
+        .values_list('id', 'product_id')
+    )
+    excess = []
+    for _, group in groupby(rows, key=lambda row: row[1]):
+        excess += [pk for pk, _ in list(group)[limit:]]
+    if excess:
+        ProductAssociation.objects.filter(id__in=excess).delete()
+
+
+def record_order(order_id):
+    """
+    Fold one newly paid order into the pairs: existing pairs between its
+    products gain an order, new pairs start at one, and each product is
+    trimmed back to STORED_PER_PRODUCT rows. Returns the pairs touched.
+    """
+    product_ids = set(OrderItem.objects.filter(order_id=order_id).values_list('product_id', flat=True))
+    if not 2 <= len(product_ids) <= MAX_BASKET:
+        return 0
+    pairs = {(a, b) for a in product_ids for b in product_ids if a != b}
+    with transaction.atomic():
+        existing = ProductAssociation.objects.filter(product_id__in=product_ids, related_id__in=product_ids)
+        seen = set(existing.values_list('product_id', 'related_id'))
+        existing.update(orders=F('orders') + 1)
+        ProductAssociation.objects.bulk_create(
+            [ProductAssociation(product_id=a, related_id=b, orders=1) for a, b in pairs - seen],
+            ignore_conflicts=True,
+        )
+        _trim(product_ids)
+    return len(pairs)
+
+
+def record_order_safely(order):
+    # Recommendations must never break checkout
+    try:
+        record_order(order.pk)
+    except Exception:
+        logger.exception("Could not record co-purchases for order %s", order.pk)
+
+
+def bought_together(product_id, limit=4):
+    """Available products most often bought with `product_id` (one query)."""
+    return list(
+        Product.objects.filter(recommended_by__product_id=product_id, available=True)
+        .with_pricing()
+        .select_related('category')
+        .order_by('-recommended_by__orders', 'id')[:limit]
+    )
+
+
+def bought_with_cart(product_ids, limit=4):
+    """Available products most often bought with anything in the cart, excluding the cart (one query)."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+    return list(
+        Product.objects.filter(recommended_by__product_id__in=product_ids, available=True)
+        .exclude(id__in=product_ids)
+        .with_pricing()
+        .annotate(together=Sum('recommended_by__orders'))
+        .select_related('category')
+        .order_by('-together', 'id')[:limit]
+    )
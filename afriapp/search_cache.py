@@ -0,0 +1,164 @@
+"""
+Search result cache.
+
+Popular searches repeat all day, so their results are kept in the Django
+cache under a key built from the normalized query, the category and the
+catalog version. Saving or deleting a product or category bumps the version,
+which retires every cached result at once; entries also expire after
+SEARCH_CACHE_SECONDS as a backstop for bulk `.update()` calls, which send no
+signals.
+
+The version lives in the cache, so with the default per-process cache a
+bump only reaches the worker that made the edit. The key therefore also
+carries the mtime of the autocomplete snapshot, which every catalog change
+rewrites on shared storage (afriapp/autocomplete.py): other workers miss
+and recompute as soon as it moves. A shared cache (REDIS_URL) is still
+recommended for multi-worker deployments, to share results and locks.
+
+A miss takes a short-lived lock (`cache.add`) so that concurrent identical
+searches compute once: the others wait briefly for the first to store its
+result, and only compute themselves if it does not appear in time. With the
+default per-process cache this coordinates the threads of one worker.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import autocomplete
+from .models import Category, Product
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'search:catalog-version'
+# How long a miss may hold the lock, and how long identical searches wait for it
+LOCK_SECONDS = 10
+WAIT_SECONDS = 2
+POLL_SECONDS = 0.05
+# Log the hit rate once per this many lookups
+LOG_EVERY = 1000
+
+
+class HitCounter:
+    """Per-worker lookup counts: hits, misses (computed) and waits (served by another computation)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.hits = self.misses = self.waits = 0
+
+    def record(self, outcome):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            due = (self.hits + self.misses + self.waits) % LOG_EVERY == 0
+        if due:
+            logger.info(json.dumps({'metric': 'search_cache', **self.stats()}, sort_keys=True))
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.waits
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'waits': self.waits,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+_counter = HitCounter()
+
+
+def stats():
+    """This worker's hit/miss counts and hit rate since start-up."""
+    return _counter.stats()
+
+
+def normalize_query(text):
+    """Case and whitespace folded query: 'Palm  Oil ' and 'palm oil' share an entry."""
+    return ' '.join(str(text or '').lower().split())
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # First use, or the key was evicted: start a namespace no old entry can be in
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        catalog_version()
+
+
+def snapshot_version():
+    mtime = autocomplete.snapshot_mtime()
+    if mtime is None:
+        # Nothing published yet: publish now, so the key does not move under the first searches
+        autocomplete.get_index()
+        mtime = autocomplete.snapshot_mtime()
+    return mtime
+
+
+def cache_key(kind, query, category=None):
+    digest = hashlib.sha1(json.dumps([query, category]).encode()).hexdigest()
+    return f'search:{kind}:{catalog_version()}.{snapshot_version()}:{digest}'
+
+
+def cached(kind, compute, query, category=None):
+    """
+    `compute(query, category)` for the normalized query, served from the cache
+    when an identical search (same kind, query, category and catalog version)
+    has been computed before. The result must be picklable and not None.
+    """
+    query = normalize_query(query)
+    category = None if category in (None, '') else str(category)
+    key = cache_key(kind, query, category)
+    result = cache.get(key)
+    if result is not None:
+        _counter.record('hits')
+        return result
+
+    lock_key = f'{key}:lock'
+    if not cache.add(lock_key, 1, LOCK_SECONDS):
+        deadline = time.monotonic() + WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            result = cache.get(key)
+            if result is not None:
+                _counter.record('waits')
+                return result
+        # The lock holder is slow or gone: compute rather than keep the customer waiting
+        lock_key = None
+
+    _counter.record('misses')
+    try:
+        result = compute(query, category)
+        cache.set(key, result, getattr(settings, 'SEARCH_CACHE_SECONDS', 300))
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
+    return result
+
+
+def _catalog_changed(sender, **kwargs):
+    # Bump now so the writing request never reads its own stale results, and
+    # again after commit in case another request cached the old rows meanwhile
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+def connect_signals():
+    for model in (Product, Category):
+        post_save.connect(_catalog_changed, sender=model, dispatch_uid=f'search_cache_{model.__name__}_saved')
+        post_delete.connect(_catalog_changed, sender=model, dispatch_uid=f'search_cache_{model.__name__}_deleted')
@@ -11,7 +11,8 @@ const LiveSearch = {
         searchInputSelector: '#searchInput',
         categorySelectSelector: '#modalSearchCategories',
         resultsContainerSelector: '#searchResults',
-        searchEndpoint: '/api/search/',
+        searchEndpoint: '/api/autocomplete/',
+        maxSuggestions: 8,
         debounceTime: 300, // milliseconds
         minSearchLength: 2,
     },
@@ -106,15 +107,12 @@ const LiveSearch = {
         // Show loading indicator
         this.showLoading();
 
-        // Build query parameters
+        // Build query parameters (suggestions cover every category)
         const params = new URLSearchParams();
-        params.append('search', searchTerm);
+        params.append('q', searchTerm);
+        params.append('limit', this.config.maxSuggestions);
 
-        if (this.categorySelect && this.categorySelect.value !== 'All Categories') {
-            params.append('category', this.categorySelect.value);
-        }
-
-        // Fetch search results
+        // Fetch suggestions
         fetch(`${this.config.searchEndpoint}?${params.toString()}`)
             .then(response => {
                 if (!response.ok) {
@@ -123,7 +121,7 @@ const LiveSearch = {
                 return response.json();
             })
             .then(data => {
-                this.displayResults(data.products);
+                this.displayResults(data.suggestions);
             })
             .catch(error => {
                 console.error('Search error:', error);
@@ -134,19 +132,19 @@ const LiveSearch = {
             });
     },
 
-    // Display search results
-    displayResults: function(products) {
+    // Display suggestions
+    displayResults: function(suggestions) {
         // Clear previous results
         this.clearResults();
 
-        // If no products found
-        if (!products || products.length === 0) {
+        // If nothing matches
+        if (!suggestions || suggestions.length === 0) {
             this.displayNoResults();
             return;
         }
 
         // Create results HTML
-        const resultsHTML = products.map(product => this.createProductCard(product)).join('');
+        const resultsHTML = suggestions.map(suggestion => this.createSuggestionItem(suggestion)).join('');
 
         // Update results container
         this.resultsContainer.innerHTML = resultsHTML;
@@ -155,27 +153,25 @@ const LiveSearch = {
         this.showResults();
     },
 
-    // Create HTML for a product card
-    createProductCard: function(product) {
+    // Escape text for use in HTML
+    escapeHTML: function(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div.innerHTML;
+    },
+
+    // Create HTML for a product or category suggestion
+    createSuggestionItem: function(suggestion) {
+        const icon = suggestion.type === 'category' ? 'fa-folder-open' : 'fa-shopping-basket';
         return `
             <div class="search-result-item">
                 <div class="row align-items-center position-relative mb-3">
-                    <div class="col-4 col-md-3">
-                        <img class="img-fluid" src="${product.image_url}" alt="${product.name}">
+                    <div class="col-auto">
+                        <i class="fas ${icon} text-muted"></i>
                     </div>
                     <div class="col position-static">
-                        <p class="mb-0 fw-bold">
-                            <a class="stretched-link text-body" href="/product/${product.id}/">${product.name}</a> <br>
-                            <span class="text-muted">$${product.price.toFixed(2)}</span>
-                        </p>
-                    </div>
-                </div>
-                <div class="row mt-2">
-                    <div class="col">
-                        <button class="btn btn-sm btn-outline-success w-100"
-                                onclick="event.preventDefault(); event.stopPropagation(); addToCartWithAnimation(${product.id}); return false;">
-                            <i class="fas fa-cart-plus me-1"></i> Add to Cart
-                        </button>
+                        <a class="stretched-link text-body" href="${suggestion.url}">${this.escapeHTML(suggestion.label)}</a>
+                        ${suggestion.type === 'category' ? '<span class="text-muted fs-sm ms-1">in categories</span>' : ''}
                     </div>
                 </div>
             </div>
@@ -0,0 +1,199 @@
+"""
+Stripe reconciliation.
+
+An order is normally created by the success page or the Stripe webhook. If
+the shopper closes the tab and the webhook is lost or fails, Stripe holds a
+paid Checkout Session that no order records. Conversely the success page
+creates its order without asking Stripe, so an order can exist for a
+session that expired unpaid.
+
+`reconcile_stripe()` (the `reconcile_stripe` command, run hourly) pages
+through the Checkout Sessions created in a time window and matches each
+batch against PaymentInfo and Order rows with a handful of bulk, indexed
+queries, whatever the batch size. Every payment in this shop goes through
+Checkout, so sessions cover payment intents too: a paid session carries
+its intent id, which the webhook may have stored instead of the session id.
+
+For a paid session without an order, the order is rebuilt from the user's
+open cart when it still prices to the amount charged. Otherwise the
+PaymentInfo is flagged (`reconcile_issue`) for a manual fix in the admin.
+So is a payment whose order exists although its session expired unpaid.
+Paid sessions with no PaymentInfo at all only appear in the log and metrics.
+"""
+import json
+import logging
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .checkout_sessions import get_gateway
+from .models import ArchivedOrder, Customer, Order, OrderItem, PaymentInfo, ShopCart
+from .pricing import price_cart, to_amount, to_cents
+
+logger = logging.getLogger('afriapp.maintenance')
+
+# Sessions younger than this are left to the success page and the webhook
+GRACE = timedelta(minutes=15)
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _payment_id(session):
+    payment_id = str((getattr(session, 'metadata', None) or {}).get('payment_id') or '')
+    return int(payment_id) if payment_id.isdigit() else None
+
+
+def match_payments(sessions):
+    """{session id: PaymentInfo} by metadata payment id, session id or payment intent id (one query)."""
+    payment_ids, stripe_ids = set(), set()
+    for session in sessions:
+        if _payment_id(session) is not None:
+            payment_ids.add(_payment_id(session))
+        stripe_ids.update(filter(None, [session.id, getattr(session, 'payment_intent', None)]))
+    payments = list(
+        PaymentInfo.objects.filter(Q(pk__in=payment_ids) | Q(stripe_payment_intent_id__in=stripe_ids))
+    )
+    by_pk = {payment.pk: payment for payment in payments}
+    by_stripe_id = {payment.stripe_payment_intent_id: payment for payment in payments if payment.stripe_payment_intent_id}
+    matched = {}
+    for session in sessions:
+        payment = (
+            by_pk.get(_payment_id(session))
+            or by_stripe_id.get(session.id)
+            or by_stripe_id.get(getattr(session, 'payment_intent', None))
+        )
+        if payment is not None:
+            matched[session.id] = payment
+    return matched
+
+
+def _build_orders(candidates):
+    """
+    Orders (with their items and the cart rows they consume) for paid
+    sessions without one, built from each user's open cart; the rest are
+    returned as {payment pk: issue}.
+    """
+    user_ids = {payment.user_id for _, payment in candidates if payment.user_id}
+    carts = defaultdict(list)
+    for item in ShopCart.objects.filter(user_id__in=user_ids, paid_order=False).select_related('product').order_by('id'):
+        carts[item.user_id].append(item)
+    customers = {customer.user_id: customer for customer in Customer.objects.filter(user_id__in=user_ids)}
+
+    built, issues = [], {}
+    for session, payment in candidates:
+        items = carts.pop(payment.user_id, [])
+        if payment.user_id not in customers:
+            issues[payment.pk] = 'no_customer'
+            continue
+        if not items:
+            issues[payment.pk] = 'cart_gone'
+            continue
+        pricing = price_cart(items, to_cents(payment.shipping_cost))
+        if pricing.total_cents != session.amount_total:
+            issues[payment.pk] = 'cart_changed'
+            continue
+        order = Order(
+            order_no=uuid.uuid4(),
+            customer=customers[payment.user_id],
+            payment=payment,
+            subtotal=pricing.subtotal,
+            shipping_cost=pricing.shipping,
+            tax=pricing.vat,
+            total=to_amount(session.amount_total),
+            stripe_payment_intent_id=getattr(session, 'payment_intent', None),
+            is_paid=True,
+            paid_at=timezone.now(),
+            shipping_address=f"{payment.address}, {payment.city}, {payment.state}, {payment.postal_code}, {payment.country}",
+            status='processing',
+        )
+        built.append((order, items))
+    return built, issues
+
+
+def reconcile_batch(sessions, metrics, dry_run=False):
+    """Match one page of sessions and create, mark or flag in bulk; adds the outcome to `metrics`."""
+    matched = match_payments(sessions)
+    payment_pks = [payment.pk for payment in matched.values()]
+    with_order = set(Order.objects.filter(payment_id__in=payment_pks).values_list('payment_id', flat=True))
+    with_order |= set(ArchivedOrder.objects.filter(payment_id__in=payment_pks).values_list('payment_id', flat=True))
+
+    mark_paid, issues, candidates, candidate_pks = set(), {}, [], set()
+    for session in sessions:
+        metrics['sessions'] += 1
+        payment = matched.get(session.id)
+        if getattr(session, 'payment_status', None) != 'paid':
+            if session.status == 'expired' and payment and payment.pk in with_order:
+                issues[payment.pk] = 'unpaid_order'
+            continue
+        metrics['paid'] += 1
+        if payment is None:
+            metrics['missing_payment'] += 1
+            logger.warning("Paid Stripe session %s matches no PaymentInfo", session.id)
+        elif payment.pk in with_order:
+            if not payment.paid_order:
+                mark_paid.add(payment.pk)
+        elif payment.pk not in candidate_pks:
+            candidate_pks.add(payment.pk)
+            candidates.append((session, payment))
+
+    built, build_issues = _build_orders(candidates)
+    issues.update(build_issues)
+    metrics['orders_created'] += len(built)
+    metrics['marked_paid'] += len(mark_paid)
+    for issue in issues.values():
+        metrics[issue] += 1
+    if dry_run:
+        return
+
+    with transaction.atomic():
+        orders = Order.objects.bulk_create([order for order, _ in built])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=item.product, quantity=item.quantity, price=item.product.get_display_price())
+            for order, (_, items) in zip(orders, built) for item in items
+        ])
+        ShopCart.objects.filter(id__in=[item.id for _, items in built for item in items]).delete()
+        fixed = mark_paid | {order.payment_id for order in orders}
+        PaymentInfo.objects.filter(pk__in=fixed).update(paid_order=True, reconcile_issue='')
+        by_issue = defaultdict(list)
+        for pk, issue in issues.items():
+            by_issue[issue].append(pk)
+        for issue, pks in by_issue.items():
+            PaymentInfo.objects.filter(pk__in=pks).update(reconcile_issue=issue)
+
+
+def reconcile_stripe(hours=24, until=None, batch_size=500, dry_run=False, gateway=None):
+    """
+    Reconcile the Checkout Sessions created in the `hours` before `until`
+    (default: now less GRACE). Returns metrics, also logged as one JSON line
+    on `afriapp.maintenance`.
+    """
+    start = time.perf_counter()
+    until = until or timezone.now() - GRACE
+    gateway = gateway or get_gateway()
+    metrics = Counter()
+    for sessions in _batches(gateway.list_sessions(until - timedelta(hours=hours), until), batch_size):
+        reconcile_batch(sessions, metrics, dry_run=dry_run)
+    metrics = {
+        'sessions': metrics['sessions'],
+        'paid': metrics['paid'],
+        'orders_created': metrics['orders_created'],
+        'marked_paid': metrics['marked_paid'],
+        'flagged': {
+            issue: metrics[issue]
+            for issue in ['missing_payment', *dict(PaymentInfo.RECONCILE_ISSUES)]
+            if metrics[issue]
+        },
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    logger.info(json.dumps({'job': 'reconcile_stripe', 'dry_run': dry_run, **metrics}, sort_keys=True))
+    return metrics
@@ -0,0 +1,104 @@
+import json
+from decimal import Decimal
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from afriapp import async_views, views
+from afriapp.middleware import (
+    CustomerMiddleware, QueryInstrumentationMiddleware, ReplicaStickinessMiddleware, SamplingProfilerMiddleware,
+)
+from afriapp.models import Category, Product, Service, ShopCart
+
+
+class AsyncViewsTestCase(TestCase):
+    """Test that the async JSON endpoints match their sync counterparts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='async@example.com', password='pass12345')
+        service = Service.objects.create(name='Groceries')
+        category = Category.objects.create(name='Grains', service=service)
+        cls.products = [
+            Product.objects.create(
+                name=f'Ofada Rice {n}', price=Decimal('10.00'), sale_price=Decimal('8.00') if n % 2 else None,
+                description='Rice', category=category, stock_quantity=5,
+            )
+            for n in range(15)
+        ]
+        ShopCart.objects.create(user=cls.user, product=cls.products[1], quantity=2)
+        ShopCart.objects.create(user=cls.user, product=cls.products[2], quantity=1)
+
+    @sync_to_async
+    def sync_json(self, view, path, data=None, *args):
+        request = RequestFactory().get(path, data or {})
+        request.user = self.user
+        return json.loads(view(request, *args).content)
+
+    async def async_json(self, view, path, data=None, *args):
+        request = AsyncRequestFactory().get(path, data or {})
+        request.user = self.user
+        response = await view(request, *args)
+        return json.loads(response.content)
+
+    async def test_search_matches_sync(self):
+        expected = await self.sync_json(views.api_search_products, '/api/search/', {'search': 'rice'})
+        actual = await self.async_json(async_views.api_search_products, '/api/search/', {'search': 'rice'})
+        self.assertEqual(actual, expected)
+        self.assertEqual(len(actual['products']), 12)
+
+    async def test_load_more_matches_sync(self):
+        params = {'page': 2, 'per_page': 5}
+        expected = await self.sync_json(views.load_more_products, '/api/load-more-products/', params)
+        actual = await self.async_json(async_views.load_more_products, '/api/load-more-products/', params)
+        self.assertEqual(actual, expected)
+        self.assertTrue(actual['has_more'])
+
+    async def test_stock_check_matches_sync(self):
+        product_id = self.products[0].id
+        expected = await self.sync_json(views.check_stock_availability, '/check-stock/', {'quantity': 9}, product_id)
+        actual = await self.async_json(async_views.check_stock_availability, '/check-stock/', {'quantity': 9}, product_id)
+        self.assertEqual(actual, expected)
+        self.assertFalse(actual['available'])
+
+    async def test_stock_check_unknown_product(self):
+        request = AsyncRequestFactory().get('/check-stock/999999/')
+        request.user = self.user
+        response = await async_views.check_stock_availability(request, 999999)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cart_items_match_sync(self):
+        expected = await self.sync_json(views.get_cart_items, '/get-cart-items/')
+        actual = await self.async_json(async_views.get_cart_items, '/get-cart-items/')
+        self.assertEqual(actual, expected)
+        self.assertEqual(actual['count'], 3)
+        self.assertEqual(actual['subtotal'], 26.0)
+
+    async def test_cart_items_require_login(self):
+        request = AsyncRequestFactory().get('/get-cart-items/')
+        request.user = AnonymousUser()
+        response = await async_views.get_cart_items(request)
+        self.assertEqual(response.status_code, 302)
+
+
+class AsyncMiddlewareTestCase(TestCase):
+    """Test that the project's middleware stays async under ASGI"""
+
+    async def test_middleware_is_async_for_async_views(self):
+        async def view(request):
+            return JsonResponse({})
+
+        for middleware_class in (CustomerMiddleware, QueryInstrumentationMiddleware, ReplicaStickinessMiddleware, SamplingProfilerMiddleware):
+            middleware = middleware_class(view)
+            self.assertTrue(iscoroutinefunction(middleware), middleware_class.__name__)
+            response = await middleware(AsyncRequestFactory().get('/'))
+            self.assertEqual(response.status_code, 200)
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    async def test_query_instrumentation_counts_async_orm_queries(self):
+        async def view(request):
+            return JsonResponse({'count': await Product.objects.acount()})
+
+        response = await QueryInstrumentationMiddleware(view)(AsyncRequestFactory().get('/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
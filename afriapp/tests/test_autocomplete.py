@@ -0,0 +1,151 @@
+import fcntl
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from afriapp import autocomplete
+from afriapp.autocomplete import PrefixIndex, normalize
+from afriapp.models import Category, Customer, Order, OrderItem, Product, Service
+
+
+class PrefixIndexTestCase(TestCase):
+    """Test the sorted prefix structure on its own"""
+
+    def entry(self, pk, label, score=0, kind='product'):
+        return {'type': kind, 'id': pk, 'label': label, 'url': f'/{kind}/{pk}/', 'score': score}
+
+    def test_normalize(self):
+        self.assertEqual(normalize('  Égúsí  Soup-Mix! '), 'egusi soup mix')
+
+    def test_matches_any_word_start_ranked_by_score(self):
+        index = PrefixIndex([
+            self.entry(1, 'Pepper Soup Spice', score=2),
+            self.entry(2, 'Egusi Soup', score=9),
+            self.entry(3, 'Suya Spice', score=5),
+        ])
+        self.assertEqual([e['id'] for e in index.search('sp')], [3, 1])
+        self.assertEqual([e['id'] for e in index.search('soup')], [2, 1])
+        self.assertEqual([e['id'] for e in index.search('soup sp')], [1])
+        self.assertEqual(index.search('xyz'), [])
+        self.assertEqual(index.search('  '), [])
+
+    def test_incremental_add_and_remove(self):
+        index = PrefixIndex([self.entry(1, 'Ofada Rice')])
+        self.assertEqual(len(index.search('ri')), 1)
+        index.add(self.entry(2, 'Jollof Rice Mix', score=3))
+        self.assertEqual([e['id'] for e in index.search('ri')], [2, 1])
+        # Renaming replaces the old keys
+        index.add(self.entry(2, 'Jollof Seasoning', score=3))
+        self.assertEqual([e['id'] for e in index.search('ri')], [1])
+        index.remove('product', 1)
+        self.assertEqual(index.search('ri'), [])
+        self.assertEqual(index.keys, sorted(index.keys))
+
+    def test_snapshot_round_trip(self):
+        index = PrefixIndex([self.entry(1, 'Ofada Rice'), self.entry(7, 'Grains', score=4, kind='category')])
+        copy = PrefixIndex.from_snapshot(json.loads(json.dumps(index.to_snapshot())))
+        self.assertEqual(copy.keys, index.keys)
+        self.assertEqual(copy.search('gr')[0]['type'], 'category')
+
+
+class AutocompleteTestCase(TestCase):
+    """Test the autocomplete endpoint, popularity ranking and snapshot sharing"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'autocomplete.json')
+        self.settings_override = override_settings(AUTOCOMPLETE_SNAPSHOT_PATH=self.path)
+        self.settings_override.enable()
+        autocomplete.reset()
+
+        service = Service.objects.create(name='Groceries')
+        self.rice_category = Category.objects.create(name='Rice & Grains', service=service)
+        self.ofada = Product.objects.create(name='Ofada Rice', price=Decimal('9.00'), description='Rice', category=self.rice_category)
+        self.jollof = Product.objects.create(name='Jollof Rice Mix', price=Decimal('4.00'), description='Mix', category=self.rice_category)
+        Product.objects.create(name='Rice Flour', price=Decimal('3.00'), description='Flour', available=False)
+        user = User.objects.create_user(username='buyer@example.com', password='pass12345')
+        customer = Customer.objects.create(user=user, email='buyer@example.com')
+        order = Order.objects.create(customer=customer, total=Decimal('8.00'))
+        OrderItem.objects.create(order=order, product=self.jollof, quantity=2, price=Decimal('4.00'))
+
+    def tearDown(self):
+        autocomplete.reset()
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def suggestions(self, q, **params):
+        response = self.client.get(reverse('api_autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['suggestions']
+
+    def test_endpoint_ranks_by_units_sold(self):
+        suggestions = self.suggestions('ric')
+        self.assertEqual(
+            [(s['type'], s['id']) for s in suggestions],
+            [('category', self.rice_category.id), ('product', self.jollof.id), ('product', self.ofada.id)],
+        )
+        self.assertEqual(suggestions[1]['url'], reverse('product', args=[self.jollof.id]))
+        self.assertEqual(len(self.suggestions('ric', limit=1)), 1)
+
+    def test_lookups_do_not_query_the_database(self):
+        self.suggestions('ri')
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.suggest('ofa')[0]['id'], self.ofada.id)
+
+    def test_first_build_publishes_a_snapshot_other_workers_load(self):
+        autocomplete.suggest('ri')
+        self.assertTrue(os.path.exists(self.path))
+        autocomplete.reset()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(autocomplete.suggest('ri')), 3)
+
+    def test_product_changes_update_index_and_snapshot(self):
+        autocomplete.suggest('ri')
+        with self.captureOnCommitCallbacks(execute=True):
+            suya = Product.objects.create(name='Suya Spice', price=Decimal('5.00'), description='Spice')
+            self.ofada.available = False
+            self.ofada.save()
+        self.assertEqual([s['id'] for s in autocomplete.suggest('suy')], [suya.id])
+        self.assertNotIn(self.ofada.id, [s['id'] for s in autocomplete.suggest('ofa')])
+
+        # Another worker picks the change up from the snapshot alone
+        with open(self.path) as f:
+            other = PrefixIndex.from_snapshot(json.load(f))
+        self.assertEqual([e['id'] for e in other.search('suy')], [suya.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            suya.delete()
+        self.assertEqual(autocomplete.suggest('suy'), [])
+
+    def test_changes_hold_the_snapshot_lock(self):
+        autocomplete.suggest('ri')
+        held = []
+
+        def change(index):
+            # Another worker trying to rewrite the snapshot now has to wait
+            with open(f'{self.path}.lock') as other:
+                try:
+                    fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    held.append(True)
+            index.remove('product', self.ofada.id)
+
+        autocomplete._apply(change)
+        self.assertEqual(held, [True])
+        with open(self.path) as f:
+            self.assertNotIn('Ofada Rice', [e['label'] for e in json.load(f)['entries']])
+
+    def test_search_modal_uses_the_endpoint(self):
+        html = render_to_string('partials/modals/modal-search.html')
+        self.assertIn(f'searchEndpoint = "{reverse("api_autocomplete")}"', html)
+
+    def test_build_command(self):
+        call_command('build_autocomplete_index', stdout=open(os.devnull, 'w'))
+        with open(self.path) as f:
+            self.assertEqual(len(json.load(f)['entries']), 3)
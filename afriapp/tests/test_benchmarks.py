@@ -0,0 +1,45 @@
+from django.test import TestCase
+from afriapp.benchmarks import BENCHMARKS, compare, parse_scale, run_benchmarks
+from afriapp.loadtest import seed_catalog
+from afriapp.models import Order
+
+
+class BenchmarkRunTestCase(TestCase):
+    """Test the storefront micro-benchmarks against a small seeded catalog"""
+
+    def test_every_benchmark_reports_stats(self):
+        seed_catalog(products=60, users=1)
+        results = run_benchmarks(min_time=0, max_ops=1)
+
+        self.assertEqual(set(results), set(BENCHMARKS))
+        for name, stats in results.items():
+            self.assertGreater(stats['ops_per_sec'], 0, name)
+            self.assertGreater(stats['queries'], 0, name)
+            self.assertGreater(stats['peak_kib'], 0, name)
+        # Warm-up, query count, memory and the timed call each settle their own payment
+        self.assertEqual(Order.objects.count(), 4)
+
+    def test_parse_scale(self):
+        self.assertEqual(parse_scale('100k'), ('100k', 100_000))
+        self.assertEqual(parse_scale('2500'), ('2500', 2500))
+        with self.assertRaises(ValueError):
+            parse_scale('lots')
+
+
+class BenchmarkCompareTestCase(TestCase):
+    """Test regression detection against a saved baseline"""
+
+    baseline = {'1k': {'shop_view': {'ops_per_sec': 100.0, 'queries': 3, 'peak_kib': 1000.0}}}
+
+    def test_within_threshold(self):
+        results = {'1k': {'shop_view': {'ops_per_sec': 85.0, 'queries': 3, 'peak_kib': 1100.0}}}
+        self.assertEqual(compare(results, self.baseline, threshold=0.2), [])
+
+    def test_flags_slowdown_queries_and_memory(self):
+        results = {'1k': {'shop_view': {'ops_per_sec': 70.0, 'queries': 4, 'peak_kib': 1500.0}}}
+        regressions = compare(results, self.baseline, threshold=0.2)
+        self.assertEqual(len(regressions), 3)
+
+    def test_ignores_unknown_scales(self):
+        results = {'1M': {'shop_view': {'ops_per_sec': 1.0, 'queries': 99, 'peak_kib': 1.0}}}
+        self.assertEqual(compare(results, self.baseline), [])
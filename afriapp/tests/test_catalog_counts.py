@@ -0,0 +1,102 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from afriapp.models import Category, Product, Service
+
+
+class CatalogCountsTestCase(TestCase):
+    """Test the maintained available-product counters and their reconciliation"""
+
+    def setUp(self):
+        self.groceries = Service.objects.create(name='Groceries')
+        self.restaurant = Service.objects.create(name='Restaurant')
+        self.grains = Category.objects.create(name='Grains', service=self.groceries)
+        self.spices = Category.objects.create(name='Spices', service=self.groceries)
+        self.meals = Category.objects.create(name='Meals', service=self.restaurant)
+
+    def product(self, name, category, **kwargs):
+        return Product.objects.create(name=name, price=Decimal('5.00'), description=name, category=category, **kwargs)
+
+    def counts(self):
+        return (
+            dict(Category.objects.values_list('name', 'available_product_count')),
+            dict(Service.objects.values_list('name', 'available_product_count')),
+        )
+
+    def test_create_and_availability_changes(self):
+        self.product('Rice', self.grains)
+        beans = self.product('Beans', self.grains)
+        self.product('Old Stock', self.grains, available=False)
+        self.assertEqual(self.counts(), ({'Grains': 2, 'Spices': 0, 'Meals': 0}, {'Groceries': 2, 'Restaurant': 0}))
+
+        beans.available = False
+        beans.save()
+        beans.save()  # saving again changes nothing
+        self.assertEqual(self.counts()[0]['Grains'], 1)
+        beans.available = True
+        beans.save()
+        self.assertEqual(self.counts()[0]['Grains'], 2)
+
+    def test_moving_between_categories_and_services(self):
+        jollof = self.product('Jollof Mix', self.spices)
+        jollof.category = self.meals
+        jollof.save()
+        self.assertEqual(self.counts(), ({'Grains': 0, 'Spices': 0, 'Meals': 1}, {'Groceries': 0, 'Restaurant': 1}))
+        jollof.category = None
+        jollof.save()
+        self.assertEqual(self.counts()[1], {'Groceries': 0, 'Restaurant': 0})
+
+    def test_moving_a_category_to_another_service(self):
+        self.product('Rice', self.grains)
+        self.product('Beans', self.grains)
+        self.product('Pepper', self.spices)
+        grains = Category.objects.get(pk=self.grains.pk)
+        grains.service = self.restaurant
+        grains.save()
+        self.assertEqual(self.counts()[1], {'Groceries': 1, 'Restaurant': 2})
+        # A stale instance saved again changes nothing
+        self.grains.service = self.restaurant
+        self.grains.save()
+        self.assertEqual(self.counts(), ({'Grains': 2, 'Spices': 1, 'Meals': 0}, {'Groceries': 1, 'Restaurant': 2}))
+
+    def test_deletes(self):
+        rice = self.product('Rice', self.grains)
+        self.product('Garri', self.grains)
+        self.product('Pepper', self.spices)
+        rice.delete()
+        self.assertEqual(self.counts()[0]['Grains'], 1)
+        Product.objects.filter(name='Garri').delete()
+        self.assertEqual(self.counts()[1]['Groceries'], 1)
+        self.spices.delete()
+        self.assertEqual(self.counts()[1]['Groceries'], 0)
+
+    def test_stale_instance_does_not_overwrite_the_counter(self):
+        category = Category.objects.get(pk=self.grains.pk)
+        self.product('Rice', self.grains)
+        category.name = 'Grains & Cereals'
+        category.save()
+        self.grains.refresh_from_db()
+        self.assertEqual((self.grains.name, self.grains.available_product_count), ('Grains & Cereals', 1))
+
+    def test_reconcile_repairs_bulk_changes(self):
+        self.product('Rice', self.grains)
+        Product.objects.bulk_create([Product(name='Uziza', slug='uziza', price=Decimal('5.00'), category=self.spices)])
+        Product.objects.filter(name='Rice').update(available=False)
+        self.product('Suya Spice', self.spices)
+
+        out = StringIO()
+        call_command('reconcile_product_counts', stdout=out)
+        self.assertIn('Fixed 2 categories and 0 services', out.getvalue())
+        self.assertEqual(self.counts(), ({'Grains': 0, 'Spices': 2, 'Meals': 0}, {'Groceries': 2, 'Restaurant': 0}))
+
+    def test_service_page_reads_the_counters(self):
+        self.product('Rice', self.grains)
+        self.product('Pepper', self.spices)
+        self.product('Old Stock', self.spices, available=False)
+        response = self.client.get(reverse('service', args=[self.groceries.id]))
+        self.assertEqual(response.context['total_products'], 2)
+        counts = {category.name: data['product_count'] for category, data in response.context['categories_with_products'].items()}
+        self.assertEqual(counts, {'Grains': 1, 'Spices': 1})
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from afriapp import checkout_sessions
+from afriapp.checkout_sessions import CircuitBreaker, GatewayUnavailable, LocalStripeGateway
+from afriapp.models import Category, Customer, Order, PaymentInfo, Product, Service, ShopCart
+
+
+@override_settings(STRIPE_CHECKOUT_GATEWAY='afriapp.checkout_sessions.LocalStripeGateway')
+class CheckoutSessionTestCase(TestCase):
+    """Test Checkout Session reuse, idempotent creation and the circuit breaker against the local stand-in"""
+
+    def setUp(self):
+        cache.clear()
+        checkout_sessions.breaker.reset()
+        LocalStripeGateway.sessions = {}
+        LocalStripeGateway.outage = False
+        self.user = User.objects.create_user(username='pay@example.com', password='pass12345', email='pay@example.com')
+        category = Category.objects.create(name='Grains', service=Service.objects.create(name='Groceries'))
+        self.rice = Product.objects.create(
+            name='Rice', price=Decimal('19.99'), description='Rice', category=category, stock_quantity=50
+        )
+        ShopCart.objects.create(user=self.user, product=self.rice, quantity=2, basket_no='PAY-1')
+        self.client.login(username='pay@example.com', password='pass12345')
+        self.form = {
+            'basket_no': 'PAY-1', 'first_name': 'Ada', 'last_name': 'Obi', 'phone': '5550100',
+            'address': '1 Market Street', 'city': 'Lagos', 'state': 'LA', 'postal_code': '100001', 'country': 'NG',
+        }
+
+    def pay(self, **changes):
+        return self.client.post(reverse('payment_pipeline'), {**self.form, **changes})
+
+    def test_repeat_submissions_reuse_the_session(self):
+        first = self.pay()
+        payment = PaymentInfo.objects.get()
+        self.assertRedirects(first, payment.checkout_url, fetch_redirect_response=False)
+        self.assertTrue(payment.stripe_payment_intent_id.startswith('cs_local_'))
+        self.assertEqual(payment.amount, Decimal('42.98'))
+
+        self.assertRedirects(self.pay(), payment.checkout_url, fetch_redirect_response=False)
+        self.assertEqual(PaymentInfo.objects.count(), 1)
+        self.assertEqual(len(LocalStripeGateway.sessions), 1)
+
+    def test_changed_basket_or_address_opens_a_new_session(self):
+        self.pay()
+        self.pay(address='2 Market Street')
+        ShopCart.objects.filter(product=self.rice).update(quantity=3)
+        self.pay(address='2 Market Street')
+        self.assertEqual(PaymentInfo.objects.count(), 3)
+        self.assertEqual(len(LocalStripeGateway.sessions), 3)
+
+    def test_expired_or_paid_sessions_are_not_reused(self):
+        self.pay()
+        PaymentInfo.objects.update(checkout_expires_at=timezone.now() + timedelta(minutes=1))
+        self.pay()
+        PaymentInfo.objects.update(paid_order=True)
+        self.pay()
+        self.assertEqual(PaymentInfo.objects.count(), 3)
+
+    def test_retry_after_failure_uses_the_same_idempotency_key(self):
+        LocalStripeGateway.outage = True
+        response = self.pay()
+        self.assertRedirects(response, reverse('checkout'), fetch_redirect_response=False)
+        payment = PaymentInfo.objects.get()
+        self.assertEqual(payment.checkout_url, '')
+
+        LocalStripeGateway.outage = False
+        self.pay()
+        payment.refresh_from_db()
+        self.assertTrue(payment.checkout_url)
+        self.assertEqual(PaymentInfo.objects.count(), 1)
+        self.assertEqual(list(LocalStripeGateway.sessions), [f'checkout-session-{payment.pk}-{payment.checkout_fingerprint[:16]}'])
+
+    def test_success_page_binds_the_session_that_was_paid(self):
+        Customer.objects.create(user=self.user, email='pay@example.com')
+        self.pay()
+        first = PaymentInfo.objects.get()
+        self.pay(address='2 Market Street')
+        # Back to the first address: its older attempt is reused
+        self.assertRedirects(self.pay(), first.checkout_url, fetch_redirect_response=False)
+        self.assertEqual(PaymentInfo.objects.count(), 2)
+
+        self.assertIn(f'session_id={first.stripe_payment_intent_id}', first.checkout_url)
+        self.client.get(first.checkout_url)
+        order = Order.objects.get()
+        self.assertEqual(order.payment_id, first.pk)
+        self.assertTrue(order.shipping_address.startswith('1 Market Street'))
+        self.assertEqual(list(PaymentInfo.objects.filter(paid_order=True).values_list('pk', flat=True)), [first.pk])
+
+    @override_settings(STRIPE_BREAKER_FAILURES=2, STRIPE_BREAKER_RESET_SECONDS=60)
+    def test_breaker_fails_fast_then_recovers(self):
+        breaker = CircuitBreaker()
+        calls = []
+
+        def down():
+            calls.append(1)
+            raise GatewayUnavailable('timeout')
+
+        for _ in range(3):
+            with self.assertRaises(GatewayUnavailable):
+                breaker.call(down)
+        # The third call never reached Stripe
+        self.assertEqual(len(calls), 2)
+
+        breaker.opened_at -= 61
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertIsNone(breaker.opened_at)
@@ -0,0 +1,90 @@
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from afriapp.customers import customer_for_user, get_customer
+from afriapp.middleware import CustomerMiddleware
+from afriapp.models import Customer
+
+
+class CustomerLookupTestCase(TestCase):
+    """Test the once-per-request customer profile lookup and its optional cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ada@example.com', password='pass12345')
+        self.customer = Customer.objects.create(user=self.user, email='ada@example.com', first_name='Ada')
+
+    def request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_looked_up_once_per_request(self):
+        request = self.request(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_customer(request), self.customer)
+            self.assertEqual(get_customer(request), self.customer)
+
+    def test_anonymous_and_profileless_users(self):
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_customer(self.request(AnonymousUser())))
+        other = User.objects.create_user(username='bayo@example.com', password='pass12345')
+        self.assertIsNone(customer_for_user(other))
+
+    def test_middleware_sets_lazy_customer(self):
+        seen = {}
+
+        def view(request):
+            with self.assertNumQueries(1):
+                seen['name'] = request.customer.first_name
+                seen['same'] = get_customer(request) == self.customer
+            return HttpResponse()
+
+        request = self.request(self.user)
+        with self.assertNumQueries(1):
+            CustomerMiddleware(view)(request)
+        self.assertEqual(seen, {'name': 'Ada', 'same': True})
+
+    def test_lazy_customer_is_falsy_without_a_profile(self):
+        other = User.objects.create_user(username='bayo@example.com', password='pass12345')
+        seen = {}
+
+        def view(request):
+            seen['truthy'] = bool(request.customer)
+            seen['customer'] = get_customer(request)
+            return HttpResponse()
+
+        CustomerMiddleware(view)(self.request(other))
+        self.assertEqual(seen, {'truthy': False, 'customer': None})
+
+    async def test_async_requests_get_no_lazy_customer(self):
+        seen = {}
+
+        async def view(request):
+            seen['has_customer'] = hasattr(request, 'customer')
+            seen['customer'] = await sync_to_async(get_customer)(request)
+            return HttpResponse()
+
+        await CustomerMiddleware(view)(self.request(self.user))
+        self.assertEqual(seen, {'has_customer': False, 'customer': self.customer})
+
+    @override_settings(CUSTOMER_CACHE_SECONDS=60)
+    def test_cache_is_shared_between_requests_and_invalidated(self):
+        other = User.objects.create_user(username='bayo@example.com', password='pass12345')
+        customer_for_user(self.user)
+        customer_for_user(other)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_customer(self.request(self.user)).first_name, 'Ada')
+            self.assertIsNone(get_customer(self.request(other)))
+
+        self.customer.first_name = 'Adaeze'
+        self.customer.save()
+        Customer.objects.create(user=other, email='bayo@example.com')
+        self.assertEqual(customer_for_user(self.user).first_name, 'Adaeze')
+        self.assertEqual(customer_for_user(other).email, 'bayo@example.com')
+
+        self.customer.delete()
+        self.assertIsNone(customer_for_user(self.user))
@@ -0,0 +1,45 @@
+from django.core.management import call_command
+from django.test import TestCase
+from afriapp.datasets import UNIT, DatasetGenerator
+from afriapp.models import Customer, Order, OrderItem, Product, Review
+from logistics.models import Shipment
+
+
+class DatasetGeneratorTestCase(TestCase):
+    """Test the synthetic scale-testing dataset generator"""
+
+    def test_generates_one_unit(self):
+        counts = DatasetGenerator(scale=1, seed=7, batch_size=250).generate()
+
+        self.assertEqual(counts['afriapp.Customer'], UNIT['customers'])
+        self.assertEqual(Product.objects.count(), UNIT['products'])
+        self.assertEqual(Order.objects.count(), UNIT['orders'])
+        self.assertEqual(OrderItem.objects.count(), counts['afriapp.OrderItem'])
+        self.assertTrue(Review.objects.exists())
+        # Only dispatched orders get shipments
+        self.assertEqual(
+            Shipment.objects.count(),
+            Order.objects.filter(status__in=['shipped', 'delivered', 'refunded']).count(),
+        )
+        # Orders are spread over the history window instead of all stamped "now"
+        oldest = Order.objects.order_by('created_at').first().created_at
+        newest = Order.objects.order_by('-created_at').first().created_at
+        self.assertGreater((newest - oldest).days, 300)
+        # Guests have no user account
+        self.assertTrue(Customer.objects.filter(is_guest=True, user__isnull=True).exists())
+
+    def test_same_seed_is_reproducible(self):
+        DatasetGenerator(scale=1, seed=3).generate()
+        first = list(Product.objects.order_by('pk').values_list('name', 'price', 'sale_price')[:200])
+        Product.objects.all().delete()
+
+        # A second run appends under a new tag, so unique fields do not collide
+        DatasetGenerator(scale=1, seed=3).generate()
+        second = list(Product.objects.order_by('pk').values_list('name', 'price', 'sale_price')[:200])
+        self.assertEqual(first, second)
+        self.assertEqual(Customer.objects.count(), 2 * UNIT['customers'])
+
+    def test_command_rejects_zero_scale(self):
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', scale=0)
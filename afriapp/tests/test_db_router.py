@@ -0,0 +1,120 @@
+import time
+from unittest import mock
+
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from afriapp.db_router import ReplicaRouter, pin_to_primary, read_from_replica, track_writes
+from afriapp.middleware import ReplicaStickinessMiddleware
+from afriapp.models import Category, Order, Product, ShopCart
+
+
+def with_replica(test):
+    """Run the test as if a `replica` database alias were configured."""
+    test = mock.patch('afriapp.middleware.replica_alias', return_value='replica')(test)
+    return mock.patch('afriapp.db_router.replica_alias', return_value='replica')(test)
+
+
+class ReplicaRouterTestCase(SimpleTestCase):
+    """Test routing of catalog/report reads to the replica"""
+
+    router = ReplicaRouter()
+
+    def test_no_replica_configured(self):
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    @with_replica
+    def test_catalog_reads_use_replica(self, *_):
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+        # Transactional models stay on the primary
+        self.assertEqual(self.router.db_for_read(ShopCart), 'default')
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+
+    @with_replica
+    def test_report_block_reads_everything_from_replica(self, *_):
+        with read_from_replica():
+            self.assertEqual(self.router.db_for_read(Order), 'replica')
+
+    @with_replica
+    def test_pinned_reads_use_primary(self, *_):
+        with pin_to_primary(), read_from_replica():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    @with_replica
+    def test_writes_and_migrations_use_primary(self, *_):
+        with track_writes() as wrote:
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertTrue(wrote())
+        self.assertTrue(self.router.allow_migrate('default', 'afriapp'))
+        self.assertFalse(self.router.allow_migrate('replica', 'afriapp'))
+
+    @with_replica
+    def test_reads_after_a_write_in_the_same_request_use_primary(self, *_):
+        with track_writes():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.router.db_for_write(Product)
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+            self.assertEqual(self.router.db_for_read(Category), 'default')
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+
+    def test_session_writes_are_not_tracked(self):
+        with track_writes() as wrote:
+            self.router.db_for_write(Session)
+        self.assertFalse(wrote())
+
+
+class SlugCheckRoutingTestCase(TransactionTestCase):
+    """Test that slug-uniqueness checks made before the first write read the primary"""
+
+    @with_replica
+    def test_slug_checks_use_write_alias(self, *_):
+        checked = []
+
+        def exists(queryset):
+            checked.append((queryset.model, queryset.db))
+            return False
+
+        with mock.patch('django.db.models.query.QuerySet.exists', exists), mock.patch('django.db.models.Model.save_base'):
+            Category(name='Grains').save()
+            Product(name='Garri').save()
+        self.assertEqual(checked, [(Category, 'default'), (Product, 'default')])
+
+
+@override_settings(REPLICA_STICKY_SECONDS=30)
+class ReplicaStickinessMiddlewareTestCase(SimpleTestCase):
+    """Test read-your-writes pinning after a shopper's own writes"""
+
+    def run_middleware(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            if write:
+                ReplicaRouter().db_for_write(ShopCart)
+            seen['read'] = ReplicaRouter().db_for_read(Product)
+            return HttpResponse()
+
+        response = ReplicaStickinessMiddleware(view)(request)
+        return response, seen['read']
+
+    @with_replica
+    def test_write_sets_pin_cookie(self, *_):
+        response, read = self.run_middleware(RequestFactory().post('/add_to_cart/1/'), write=True)
+        # The rest of the writing request already reads its own writes
+        self.assertEqual(read, 'default')
+        cookie = response.cookies[ReplicaStickinessMiddleware.cookie_name]
+        self.assertEqual(cookie['max-age'], 30)
+
+    @with_replica
+    def test_pinned_request_reads_primary(self, *_):
+        request = RequestFactory().get('/shop/')
+        request.COOKIES[ReplicaStickinessMiddleware.cookie_name] = str(int(time.time()) + 10)
+        response, read = self.run_middleware(request)
+        self.assertEqual(read, 'default')
+        self.assertNotIn(ReplicaStickinessMiddleware.cookie_name, response.cookies)
+
+    @with_replica
+    def test_expired_pin_reads_replica(self, *_):
+        request = RequestFactory().get('/shop/')
+        request.COOKIES[ReplicaStickinessMiddleware.cookie_name] = str(int(time.time()) - 1)
+        _, read = self.run_middleware(request)
+        self.assertEqual(read, 'replica')
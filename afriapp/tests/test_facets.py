@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+from django.http import QueryDict
+from django.test import TestCase
+from django.urls import reverse
+from afriapp.facets import FacetSelection, facet_counts, filter_products, catalog_queryset
+from afriapp.models import Category, Product, Service
+
+
+class FacetTestCase(TestCase):
+    """Test facet counts and facet-filtered product listings"""
+
+    def setUp(self):
+        service = Service.objects.create(name='Groceries')
+        self.spices = Category.objects.create(name='Spices', slug='spices', service=service)
+        self.grains = Category.objects.create(name='Grains', slug='grains', service=service)
+
+        def product(name, category, price, sale_price=None, stock=10, rating='0'):
+            return Product.objects.create(
+                name=name, description='Facet product', category=category, price=Decimal(price),
+                sale_price=Decimal(sale_price) if sale_price else None, stock_quantity=stock, rating=Decimal(rating),
+            )
+
+        self.suya = product('Suya Spice', self.spices, '8.00', rating='4.5')
+        self.pepper = product('Pepper Soup Spice', self.spices, '30.00', sale_price='20.00', rating='3.2')
+        self.curry = product('Curry Powder', self.spices, '12.00', stock=0, rating='4.0')
+        self.rice = product('Ofada Rice', self.grains, '120.00', sale_price='90.00', rating='2.0')
+        self.garri = product('Garri', self.grains, '6.00', stock=0)
+        Product.objects.create(name='Hidden Spice', description='Facet product', category=self.spices,
+                               price=Decimal('5.00'), available=False)
+
+    def counts(self, query=''):
+        return facet_counts(FacetSelection(QueryDict(query)))
+
+    def by_value(self, entries):
+        return {entry['value']: entry['count'] for entry in entries}
+
+    def test_all_facets_from_one_query(self):
+        with self.assertNumQueries(1):
+            facets = self.counts()
+        self.assertEqual(facets['total'], 5)
+        self.assertEqual(facets['category'], {self.spices.id: 3, self.grains.id: 2})
+        # Buckets use the price a shopper pays: the rice is on sale for 90
+        self.assertEqual(self.by_value(facets['price']), {'under-10': 2, '10-25': 2, '25-50': 0, '50-100': 1, '100-up': 0})
+        self.assertEqual(facets['on_sale']['count'], 2)
+        self.assertEqual(facets['in_stock']['count'], 3)
+        self.assertEqual(self.by_value(facets['rating']), {4: 2, 3: 3, 2: 4, 1: 4})
+
+    def test_selected_facet_keeps_its_own_alternatives(self):
+        facets = self.counts('category_id=%d&in_stock=1' % self.spices.id)
+        self.assertEqual(facets['total'], 2)
+        # Category counts ignore the category filter but honour in_stock
+        self.assertEqual(facets['category'], {self.spices.id: 2, self.grains.id: 1})
+        # In-stock count ignores in_stock but honours the category
+        self.assertEqual(facets['in_stock']['count'], 2)
+        self.assertTrue(facets['in_stock']['selected'])
+        self.assertEqual(self.by_value(facets['price'])['10-25'], 1)
+
+    def test_search_and_slug_narrow_the_counts(self):
+        facets = self.counts('search=spice&category_id=spices&on_sale=1')
+        self.assertEqual(facets['total'], 1)
+        self.assertEqual(facets['on_sale']['count'], 1)
+
+    def test_filter_products_matches_counts(self):
+        for query in ['price=10-25', 'on_sale=1&min_rating=2', 'in_stock=1&price=under-10', 'min_rating=4&category_id=%d' % self.spices.id]:
+            selection = FacetSelection(QueryDict(query))
+            products = filter_products(catalog_queryset(), selection)
+            self.assertEqual(products.count(), facet_counts(selection)['total'], query)
+        selection = FacetSelection(QueryDict('price=10-25'))
+        self.assertEqual(set(filter_products(catalog_queryset(), selection)), {self.pepper, self.curry})
+
+    def test_invalid_values_are_ignored(self):
+        selection = FacetSelection(QueryDict('price=free&min_rating=9&on_sale=maybe'))
+        self.assertEqual(selection.active, {})
+
+    def test_toggle_urls(self):
+        selection = FacetSelection(QueryDict('search=rice&price=50-100&page=3'))
+        self.assertEqual(selection.url('price', '50-100'), '?search=rice')
+        self.assertEqual(selection.url('on_sale', 1), '?search=rice&price=50-100&on_sale=1')
+
+    def test_shop_view_filters_and_counts(self):
+        response = self.client.get(reverse('shop'), {'on_sale': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({p.id for p in response.context['products']}, {self.pepper.id, self.rice.id})
+        self.assertEqual(response.context['active_facets'], {'on_sale': True})
+        counts = {c.id: c.product_count for c in response.context['categories']}
+        self.assertEqual(counts, {self.spices.id: 1, self.grains.id: 1})
+
+    def test_load_more_keeps_facets(self):
+        response = self.client.get(reverse('load_more_products'), {'in_stock': '1', 'min_rating': '3'})
+        data = response.json()
+        self.assertEqual(data['total_count'], 2)
+        self.assertEqual({p['id'] for p in data['products']}, {self.suya.id, self.pepper.id})
@@ -0,0 +1,109 @@
+import json
+import os
+import tempfile
+from decimal import Decimal
+
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from afriapp import async_views, autocomplete
+from afriapp.fuzzy import TrigramIndex, trigrams
+from afriapp.models import Category, Product, Service
+
+
+class TrigramIndexTestCase(TestCase):
+    """Test the trigram index on its own"""
+
+    def test_trigrams_are_padded(self):
+        self.assertEqual(trigrams('iru'), {'  i', ' ir', 'iru', 'ru '})
+
+    def test_misspellings_find_the_word(self):
+        index = TrigramIndex()
+        index.add('product:1', ['egusi', 'seeds'])
+        index.add('product:2', ['ogbono', 'powder'])
+        index.add('product:3', ['garri'])
+        self.assertEqual([ref for ref, _ in index.search(['egussi'])], ['product:1'])
+        self.assertEqual([ref for ref, _ in index.search(['ogbonno', 'powder'])], ['product:2'])
+        self.assertEqual([ref for ref, _ in index.search(['gari'])], ['product:3'])
+        self.assertEqual(index.search(['plantain']), [])
+
+    def test_remove_drops_unused_words(self):
+        index = TrigramIndex()
+        index.add('product:1', ['garri', 'white'])
+        index.add('product:2', ['garri', 'yellow'])
+        index.remove('product:1')
+        self.assertNotIn('white', index.word_refs)
+        self.assertEqual([ref for ref, _ in index.search(['garri'])], ['product:2'])
+        index.remove('product:2')
+        self.assertEqual(index.postings, {})
+
+
+class FuzzySearchTestCase(TestCase):
+    """Test the typo-tolerant fallback in the search endpoints and shop page"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            AUTOCOMPLETE_SNAPSHOT_PATH=os.path.join(self.tmp.name, 'autocomplete.json')
+        )
+        self.settings_override.enable()
+        autocomplete.reset()
+
+        service = Service.objects.create(name='Groceries')
+        category = Category.objects.create(name='Soup Ingredients', service=service)
+        self.ogbono = Product.objects.create(name='Ogbono Seeds', price=Decimal('7.00'), description='Ground', category=category)
+        self.garri = Product.objects.create(name='Yellow Garri', price=Decimal('5.00'), description='Cassava', category=category)
+        self.iru = Product.objects.create(
+            name='Locust Beans', price=Decimal('6.00'), description='Fermented', category=category, search_aliases='iru, dawadawa'
+        )
+
+    def tearDown(self):
+        autocomplete.reset()
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def search(self, term):
+        response = self.client.get(reverse('api_search_products'), {'search': term})
+        return [product['id'] for product in response.json()['products']]
+
+    def test_misspelt_search_falls_back_to_trigrams(self):
+        self.assertEqual(self.search('ogbonno'), [self.ogbono.id])
+        self.assertEqual(self.search('gari'), [self.garri.id])
+
+    def test_aliases_are_matched(self):
+        self.assertEqual(self.search('dawadawa'), [self.iru.id])
+        self.assertEqual(self.search('dawa dawa'), [self.iru.id])
+        self.assertEqual(autocomplete.suggest('iru')[0]['id'], self.iru.id)
+
+    def test_exact_matches_come_first(self):
+        Product.objects.create(name='Ogbono Soup Base', price=Decimal('9.00'), description='Base')
+        autocomplete.reset()
+        ids = self.search('ogbono')
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(self.search('ogbono soup')[0], Product.objects.get(name='Ogbono Soup Base').id)
+
+    def test_shop_view_uses_fallback(self):
+        response = self.client.get(reverse('shop'), {'search': 'ogbonno'})
+        self.assertEqual([p.id for p in response.context['products']], [self.ogbono.id])
+        self.assertEqual(response.context['facets']['total'], 1)
+
+    async def test_async_search_uses_fallback(self):
+        request = AsyncRequestFactory().get(reverse('api_search_products'), {'search': 'ogbonno'})
+        response = await async_views.api_search_products(request)
+        self.assertEqual([p['id'] for p in json.loads(response.content)['products']], [self.ogbono.id])
+
+    def test_load_more_pages_use_fallback(self):
+        Product.objects.create(name='Ogbono Powder', price=Decimal('8.00'), description='Ground')
+        autocomplete.reset()
+        params = {'search': 'ogbonno', 'per_page': 1}
+        first = self.client.get(reverse('load_more_products'), {**params, 'page': 1}).json()
+        second = self.client.get(reverse('load_more_products'), {**params, 'page': 2}).json()
+        self.assertEqual((first['total_count'], first['has_more'], second['has_more']), (2, True, False))
+        self.assertEqual(
+            {first['products'][0]['id'], second['products'][0]['id']},
+            set(Product.objects.filter(name__startswith='Ogbono').values_list('id', flat=True)),
+        )
+
+    async def test_async_load_more_uses_fallback(self):
+        request = AsyncRequestFactory().get(reverse('load_more_products'), {'search': 'ogbonno', 'page': 1})
+        response = await async_views.load_more_products(request)
+        self.assertEqual([p['id'] for p in json.loads(response.content)['products']], [self.ogbono.id])
@@ -0,0 +1,44 @@
+from django.test import TestCase, TransactionTestCase
+from afriapp.loadtest import Recorder, percentile, run_load_test, seed_catalog
+from afriapp.models import Order, Product
+
+
+class LoadTestReportTestCase(TestCase):
+    """Test latency aggregation used by the load-test report"""
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_recorder_report(self):
+        recorder = Recorder()
+        for ms in (10, 20, 30, 40):
+            recorder.record('shop', ms / 1000, failed=False)
+        recorder.record('add_to_cart', 0.005, failed=True)
+
+        report = recorder.report(elapsed=2.0)
+        self.assertEqual(report['total_requests'], 5)
+        self.assertEqual(report['total_errors'], 1)
+        self.assertEqual(report['endpoints']['shop']['throughput_rps'], 2.0)
+        self.assertEqual(report['endpoints']['shop']['p50_ms'], 20.0)
+        self.assertEqual(report['endpoints']['shop']['max_ms'], 40.0)
+
+
+class LoadTestRunTestCase(TransactionTestCase):
+    """Test a small end-to-end run with Stripe stubbed locally"""
+
+    def test_run_checkout_journeys(self):
+        usernames = seed_catalog(products=30, users=2, seed=1)
+        self.assertEqual(Product.objects.count(), 30)
+
+        report = run_load_test(usernames, concurrency=1, iterations=2, mix={'checkout': 1}, seed=1)
+
+        self.assertEqual(report['config']['concurrency'], 1)
+        for endpoint in ('add_to_cart', 'checkout', 'payment_pipeline', 'successpayment'):
+            self.assertEqual(report['endpoints'][endpoint]['requests'], 2)
+            self.assertEqual(report['endpoints'][endpoint]['errors'], 0)
+        # The stubbed Stripe session redirects to the success page, which creates the orders
+        self.assertEqual(Order.objects.count(), 2)
@@ -0,0 +1,97 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from afriapp import maintenance
+from afriapp.maintenance import purge_stale_records
+from afriapp.models import CartItem, Category, PaymentInfo, Product, Service, ShopCart
+
+
+class PurgeStaleRecordsTestCase(TestCase):
+    """Test the stale guest-cart and abandoned-payment purge job"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper@example.com', password='pass12345')
+        service = Service.objects.create(name='Groceries')
+        category = Category.objects.create(name='Flour', service=service)
+        self.product = Product.objects.create(
+            name='Yam Flour', price=Decimal('6.00'), description='Flour', category=category, stock_quantity=50
+        )
+        long_ago = timezone.now() - timedelta(days=45)
+
+        self.stale_guest = [ShopCart.objects.create(session_key=f'old{n}', product=self.product) for n in range(5)]
+        CartItem.objects.create(shop_cart=self.stale_guest[0], product=self.product)
+        self.fresh_guest = ShopCart.objects.create(session_key='fresh', product=self.product)
+        self.paid_guest = ShopCart.objects.create(session_key='paid', product=self.product, paid_order=True)
+        self.user_cart = ShopCart.objects.create(user=self.user, product=self.product)
+        ShopCart.objects.exclude(pk=self.fresh_guest.pk).update(last_updated=long_ago)
+
+        self.abandoned = self.payment(created_at=long_ago, basket_no='B-1')
+        self.paid = self.payment(created_at=long_ago, paid_order=True, basket_no='B-2')
+        self.pending = self.payment(created_at=timezone.now() - timedelta(hours=2), basket_no='B-3')
+        # A saved address (account address book) is an unpaid PaymentInfo without a basket
+        self.saved_address = self.payment(created_at=long_ago)
+
+    def payment(self, **kwargs):
+        return PaymentInfo.objects.create(
+            user=self.user, amount=Decimal('12.00'), first_name='Ada', last_name='Obi',
+            phone='5550100', address='1 Market Street', city='San Diego', state='CA', country='US', **kwargs
+        )
+
+    def test_removes_only_stale_rows_in_chunks(self):
+        with self.assertLogs('afriapp.maintenance', level='INFO') as logs:
+            metrics = purge_stale_records(chunk_size=2)
+
+        self.assertEqual(metrics['deleted'], {'afriapp.ShopCart': 5, 'afriapp.CartItem': 1, 'afriapp.PaymentInfo': 1})
+        # Five carts in chunks of two, plus one chunk of payments
+        self.assertEqual(metrics['chunks'], 4)
+        self.assertEqual(
+            set(ShopCart.objects.values_list('pk', flat=True)),
+            {self.fresh_guest.pk, self.paid_guest.pk, self.user_cart.pk},
+        )
+        self.assertEqual(
+            set(PaymentInfo.objects.values_list('pk', flat=True)), {self.paid.pk, self.pending.pk, self.saved_address.pk},
+        )
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['job'], 'purge_stale_records')
+        self.assertEqual(record['deleted']['afriapp.ShopCart'], 5)
+
+    def test_dry_run_deletes_nothing(self):
+        out = StringIO()
+        call_command('purge_stale_data', dry_run=True, stdout=out)
+        self.assertIn('Would remove        5 afriapp.ShopCart', out.getvalue())
+        self.assertIn('Would remove        1 afriapp.PaymentInfo', out.getvalue())
+        self.assertEqual(ShopCart.objects.count(), 8)
+        self.assertEqual(PaymentInfo.objects.count(), 4)
+
+    def test_thresholds_are_configurable(self):
+        call_command('purge_stale_data', guest_cart_days=60, payment_days=1, stdout=StringIO())
+        self.assertEqual(ShopCart.objects.count(), 8)
+        self.assertFalse(PaymentInfo.objects.filter(pk=self.abandoned.pk).exists())
+
+    def test_saved_addresses_survive(self):
+        purge_stale_records(payment_days=1)
+        self.assertTrue(PaymentInfo.objects.filter(pk=self.saved_address.pk).exists())
+
+    def test_payments_flagged_by_reconciliation_survive(self):
+        PaymentInfo.objects.filter(pk=self.abandoned.pk).update(reconcile_issue='cart_gone')
+        purge_stale_records(payment_days=1)
+        self.assertTrue(PaymentInfo.objects.filter(pk=self.abandoned.pk, reconcile_issue='cart_gone').exists())
+
+    def test_rows_changed_since_the_scan_are_kept(self):
+        scan = maintenance.pk_chunks
+
+        def scan_then_pay(queryset, chunk_size):
+            for pks in scan(queryset, chunk_size):
+                PaymentInfo.objects.filter(pk=self.abandoned.pk).update(paid_order=True)
+                yield pks
+
+        with patch('afriapp.maintenance.pk_chunks', scan_then_pay):
+            purge_stale_records()
+        self.assertTrue(PaymentInfo.objects.filter(pk=self.abandoned.pk).exists())
@@ -0,0 +1,98 @@
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import call_command
+from django.test import TestCase
+from afriapp.models import Newsletter, NewsletterCampaign
+from afriapp.newsletter import RenderedCampaign, send_campaign, unsubscribe_url
+
+
+class CrashingConnection:
+    """A locmem connection that dies (like a killed worker) after `limit` messages."""
+
+    def __init__(self, limit):
+        self.inner = get_connection('django.core.mail.backends.locmem.EmailBackend')
+        self.limit = limit
+
+    def open(self):
+        return self.inner.open()
+
+    def close(self):
+        return self.inner.close()
+
+    def send_messages(self, messages):
+        if len(mail.outbox) >= self.limit:
+            raise KeyboardInterrupt
+        return self.inner.send_messages(messages)
+
+
+class NewsletterCampaignTestCase(TestCase):
+    """Test batched, resumable newsletter campaigns"""
+
+    def setUp(self):
+        Newsletter.objects.bulk_create(Newsletter(email=f'reader{n}@example.com') for n in range(250))
+        Newsletter.objects.bulk_create(Newsletter(email=f'gone{n}@example.com', is_active=False) for n in range(3))
+        self.campaign = NewsletterCampaign.objects.create(
+            subject='Fresh {{ campaign.pk }} deals for {{ email }}',
+            body_text='Hi {{ email }}, unsubscribe: {{ unsubscribe_url }}',
+            body_html='<p>Hi {{ email }}</p><a href="{{ unsubscribe_url }}">Unsubscribe</a>',
+        )
+
+    def test_sends_each_active_subscriber_once(self):
+        with mock.patch.object(RenderedCampaign, '_render', wraps=RenderedCampaign._render) as render:
+            sent = send_campaign(self.campaign, batch_size=100, chunk_size=64)
+
+        # Subject, text and HTML are rendered once for the whole campaign
+        self.assertEqual(render.call_count, 3)
+        self.assertEqual(sent, 250)
+        self.assertEqual(len(mail.outbox), 250)
+        self.assertEqual(len({m.to[0] for m in mail.outbox}), 250)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.sent_count, self.campaign.failed_count), ('sent', 250, 0))
+
+        message = mail.outbox[0]
+        self.assertEqual(message.subject, f'Fresh {self.campaign.pk} deals for reader0@example.com')
+        self.assertIn(unsubscribe_url('reader0@example.com'), message.body)
+        self.assertEqual(message.extra_headers['List-Unsubscribe'], f"<{unsubscribe_url('reader0@example.com')}>")
+        self.assertIn('<p>Hi reader0@example.com</p>', message.alternatives[0][0])
+
+    def test_resumes_after_a_crash(self):
+        with self.assertRaises(KeyboardInterrupt):
+            send_campaign(self.campaign, batch_size=100, connection=CrashingConnection(limit=100))
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.sent_count), ('sending', 100))
+
+        out = StringIO()
+        call_command('send_newsletter', self.campaign.pk, batch_size=100, stdout=out)
+        self.assertIn('Resuming after subscriber', out.getvalue())
+        self.assertEqual(len(mail.outbox), 250)
+        self.assertEqual(len({m.to[0] for m in mail.outbox}), 250)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.status, self.campaign.sent_count), ('sent', 250))
+
+    def test_failed_recipient_does_not_stop_the_batch(self):
+        connection = get_connection('django.core.mail.backends.locmem.EmailBackend')
+        deliver = connection.send_messages
+
+        def flaky(messages):
+            if messages[0].to[0] == 'reader5@example.com':
+                raise OSError('mailbox unavailable')
+            return deliver(messages)
+
+        with mock.patch.object(connection, 'send_messages', side_effect=flaky), self.assertLogs('afriapp.newsletter', 'ERROR'):
+            send_campaign(self.campaign, connection=connection)
+        self.campaign.refresh_from_db()
+        self.assertEqual((self.campaign.sent_count, self.campaign.failed_count), (249, 1))
+
+    def test_sent_campaign_is_not_resent(self):
+        send_campaign(self.campaign)
+        with self.assertRaises(ValueError):
+            send_campaign(self.campaign)
+
+    def test_unsubscribe_link(self):
+        response = self.client.get(unsubscribe_url('reader7@example.com'))
+        self.assertContains(response, 'reader7@example.com will no longer receive')
+        self.assertFalse(Newsletter.objects.get(email='reader7@example.com').is_active)
+        self.assertEqual(self.client.post('/newsletter/unsubscribe/forged/').status_code, 400)
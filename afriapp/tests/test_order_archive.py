@@ -0,0 +1,106 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from afriapp.admininterface import get_total_orders
+from afriapp.maintenance import archive_orders
+from afriapp.models import (
+    ArchivedOrder, ArchivedOrderItem, Category, Customer, Order, OrderItem, Product, Review, Service,
+)
+from logistics.models import Shipment
+
+
+class OrderArchiveTestCase(TestCase):
+    """Test moving finished orders to the archive tables and reading them back"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='archive@example.com', password='pass12345')
+        self.customer = Customer.objects.create(user=self.user, email='archive@example.com', first_name='Ada', last_name='Obi')
+        service = Service.objects.create(name='Groceries')
+        category = Category.objects.create(name='Grains', service=service)
+        self.product = Product.objects.create(
+            name='Ofada Rice', price=Decimal('10.00'), description='Rice', category=category, stock_quantity=50
+        )
+        now = timezone.now()
+        self.old_finished = [self.order('delivered', now - timedelta(days=400 + n)) for n in range(3)]
+        self.old_finished.append(self.order('refunded', now - timedelta(days=500)))
+        self.old_pending = self.order('pending', now - timedelta(days=450))
+        self.recent = self.order('delivered', now - timedelta(days=10))
+        self.newest = self.order('processing', now - timedelta(days=1))
+        self.shipment = Shipment.objects.create(order=self.old_finished[0], tracking_number='TRK-ARCHIVE-1', status='delivered')
+
+    def order(self, status, created_at):
+        order = Order.objects.create(customer=self.customer, status=status, total=Decimal('20.00'))
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=Decimal('10.00'))
+        Order.objects.filter(pk=order.pk).update(created_at=created_at)
+        return order
+
+    def test_moves_finished_orders_in_chunks(self):
+        with self.assertLogs('afriapp.maintenance', level='INFO'):
+            metrics = archive_orders(days=365, chunk_size=3)
+
+        self.assertEqual(metrics['archived'], {'afriapp.Order': 4, 'afriapp.OrderItem': 4, 'logistics.Shipment': 1})
+        self.assertEqual(metrics['chunks'], 2)
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {self.old_pending.pk, self.recent.pk, self.newest.pk})
+        # Primary keys, order numbers and timestamps survive the move
+        archived = ArchivedOrder.objects.get(pk=self.old_finished[0].pk)
+        self.assertEqual(archived.order_no, self.old_finished[0].order_no)
+        self.assertEqual(archived.order_items.get().get_total(), Decimal('20.00'))
+        self.assertLess(archived.created_at, timezone.now() - timedelta(days=399))
+        self.assertEqual(ArchivedOrderItem.objects.count(), 4)
+        # The shipment follows its order into the archive
+        self.shipment.refresh_from_db()
+        self.assertIsNone(self.shipment.order)
+        self.assertEqual(self.shipment.order_record, archived)
+
+    def test_dry_run_moves_nothing(self):
+        out = StringIO()
+        call_command('archive_orders', dry_run=True, stdout=out)
+        self.assertIn('Would archive        4 afriapp.Order', out.getvalue())
+        self.assertEqual(Order.objects.count(), 7)
+        self.assertFalse(ArchivedOrder.objects.exists())
+
+    def test_history_pages_back_into_the_archive(self):
+        archive_orders(days=365)
+        self.client.login(username='archive@example.com', password='pass12345')
+
+        with CaptureQueriesContext(connection) as ctx:
+            first = self.client.get(reverse('order_history'))
+        # Page one is served from the live table; the archive is only counted
+        archive_reads = [q['sql'] for q in ctx.captured_queries if '"archived_order"' in q['sql']]
+        self.assertEqual(len(archive_reads), 1)
+        self.assertIn('COUNT', archive_reads[0])
+        self.assertEqual([o.pk for o in first.context['page_obj']], [self.newest.pk, self.recent.pk, self.old_pending.pk])
+
+        page_obj = self.client.get(reverse('order_history'), {'page': 2}).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 7)
+        self.assertEqual([o.pk for o in page_obj], [o.pk for o in self.old_finished[:3]])
+        self.assertTrue(all(o.is_archived for o in page_obj))
+        last = self.client.get(reverse('order_history'), {'page': 3}).context['page_obj']
+        self.assertEqual([o.pk for o in last], [self.old_finished[3].pk])
+
+    def test_order_detail_finds_archived_order(self):
+        archive_orders(days=365)
+        self.client.login(username='archive@example.com', password='pass12345')
+        response = self.client.get(reverse('order_detail', args=[self.old_finished[1].pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['order'].order_no, self.old_finished[1].order_no)
+        self.assertContains(response, str(self.old_finished[1].order_no))
+
+    def test_archived_purchases_still_verify_reviews(self):
+        Order.objects.filter(pk=self.old_finished[0].pk).update(is_paid=True)
+        archive_orders(days=365)
+        review = Review.objects.create(user=self.user, product=self.product, rating=5, comment='Lovely rice')
+        self.assertTrue(review.is_verified_purchase)
+
+    def test_dashboard_totals_include_the_archive(self):
+        self.assertEqual(get_total_orders(), 7)
+        archive_orders(days=365)
+        self.assertEqual(get_total_orders(), 7)
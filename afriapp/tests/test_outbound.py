@@ -0,0 +1,150 @@
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from twilio.base.exceptions import TwilioRestException
+from afriapp.messenger import send_whatsapp_message
+from afriapp.models import OutboundMessage
+from afriapp.outbound import OutboundWorker, PermanentSendError, StubProvider, TwilioProvider, claim_batch
+
+
+class FlakyProvider:
+    """Fails the first `failures` sends of every message, then succeeds."""
+
+    def __init__(self, failures=1, error=RuntimeError):
+        self.failures = failures
+        self.error = error
+        self.calls = {}
+
+    def send(self, message):
+        self.calls[message.pk] = self.calls.get(message.pk, 0) + 1
+        if self.calls[message.pk] <= self.failures:
+            raise self.error('provider unavailable')
+        return f'ok-{message.pk}'
+
+
+class SlowProvider:
+    """Records the most provider calls in flight at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def send(self, message):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+        return 'ok'
+
+
+@override_settings(OUTBOUND_MESSAGE_PROVIDER='afriapp.outbound.StubProvider', OUTBOUND_MAX_ATTEMPTS=3)
+class OutboundQueueTestCase(TestCase):
+    """Test the outbound WhatsApp queue and its worker"""
+
+    def setUp(self):
+        StubProvider.sent = []
+
+    def run_worker(self, provider=None, **kwargs):
+        worker = OutboundWorker(provider=provider, **kwargs)
+        try:
+            return worker.run_once()
+        finally:
+            worker.close()
+
+    def test_enqueue_does_not_call_the_provider(self):
+        with mock.patch('afriapp.outbound.get_provider') as get_provider:
+            message = send_whatsapp_message('+15550100', 'Your order has shipped')
+        get_provider.assert_not_called()
+        self.assertEqual(message.status, OutboundMessage.QUEUED)
+
+        self.assertEqual(self.run_worker(), {'sent': 1})
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboundMessage.SENT)
+        self.assertTrue(message.provider_message_id.startswith('stub-'))
+        self.assertEqual(StubProvider.sent, [('+15550100', 'Your order has shipped')])
+
+    def test_retries_with_backoff_then_sends(self):
+        message = send_whatsapp_message('+15550101', 'Hello')
+        provider = FlakyProvider(failures=1)
+        with self.assertLogs('afriapp.outbound', 'WARNING'):
+            self.assertEqual(self.run_worker(provider), {'queued': 1})
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        self.assertIn('provider unavailable', message.last_error)
+
+        # Not due yet
+        self.assertEqual(self.run_worker(provider), {})
+        OutboundMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(self.run_worker(provider), {'sent': 1})
+
+    def test_dead_letters_after_max_attempts(self):
+        message = send_whatsapp_message('+15550102', 'Hello')
+        provider = FlakyProvider(failures=10)
+        with self.assertLogs('afriapp.outbound', 'WARNING'):
+            for _ in range(3):
+                OutboundMessage.objects.filter(pk=message.pk).update(next_attempt_at=timezone.now())
+                self.run_worker(provider)
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), (OutboundMessage.DEAD, 3))
+
+    def test_permanent_errors_are_dead_lettered_immediately(self):
+        message = send_whatsapp_message('+0001234', 'Hello')
+        with self.assertLogs('afriapp.outbound', 'ERROR'):
+            self.assertEqual(self.run_worker(), {'dead': 1})
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 1)
+
+    def test_workers_never_share_a_claim(self):
+        for n in range(5):
+            send_whatsapp_message(f'+1555020{n}', 'Hello')
+        first = claim_batch('worker-a', 3)
+        second = claim_batch('worker-b', 10)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertFalse({m.pk for m in first} & {m.pk for m in second})
+
+        # A crashed worker's lease expires and the messages become claimable again
+        OutboundMessage.objects.filter(claimed_by='worker-a').update(locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual({m.pk for m in claim_batch('worker-c', 10)}, {m.pk for m in first})
+
+    def test_concurrency_is_bounded(self):
+        for n in range(12):
+            send_whatsapp_message(f'+1555030{n}', 'Hello')
+        provider = SlowProvider()
+        self.assertEqual(self.run_worker(provider, concurrency=3, batch_size=12), {'sent': 12})
+        self.assertLessEqual(provider.peak, 3)
+        self.assertGreater(provider.peak, 1)
+
+    def test_command_drains_the_queue(self):
+        for n in range(3):
+            send_whatsapp_message(f'+1555040{n}', 'Hello')
+        out = StringIO()
+        call_command('run_outbound_worker', once=True, batch_size=2, stdout=out)
+        self.assertIn('Outbound worker stopped: 3 sent', out.getvalue())
+        self.assertFalse(OutboundMessage.objects.exclude(status=OutboundMessage.SENT).exists())
+
+    @override_settings(TWILIO_ACCOUNT_SID='AC123', TWILIO_AUTH_TOKEN='token', TWILIO_WHATSAPP_NUMBER='+15559999')
+    def test_twilio_client_errors_are_classified(self):
+        provider = TwilioProvider()
+        message = OutboundMessage(to_number='+15550500', body='Hello')
+        with mock.patch.object(provider.client.messages, 'create') as create:
+            create.return_value = mock.Mock(sid='SM123')
+            self.assertEqual(provider.send(message), 'SM123')
+            create.assert_called_with(body='Hello', from_='whatsapp:+15559999', to='whatsapp:+15550500')
+
+            create.side_effect = TwilioRestException(400, '/Messages', 'Invalid To number')
+            with self.assertRaises(PermanentSendError):
+                provider.send(message)
+            create.side_effect = TwilioRestException(503, '/Messages', 'Service unavailable')
+            with self.assertRaises(TwilioRestException):
+                provider.send(message)
@@ -0,0 +1,135 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from afriapp import popularity
+from afriapp.maintenance import archive_orders
+from afriapp.models import ArchivedOrderItem, Category, Customer, Order, OrderItem, Product, ProductStats, Service
+from afriapp.popularity import best_sellers, flush, record_cart_add, record_view, trending_products, update_trending
+
+
+@override_settings(POPULARITY_FLUSH_SECONDS=3600, POPULARITY_HALF_LIFE_HOURS=24)
+class PopularityTestCase(TestCase):
+    """Test the write-behind counters, trending decay and the storefront listings"""
+
+    def setUp(self):
+        popularity._buffer.drain()
+        self.user = User.objects.create_user(username='pop@example.com', password='pass12345', email='pop@example.com')
+        self.customer = Customer.objects.create(user=self.user, email='pop@example.com')
+        service = Service.objects.create(name='Groceries')
+        category = Category.objects.create(name='Grains', service=service)
+        self.rice, self.beans, self.garri = [
+            Product.objects.create(name=name, price=Decimal('5.00'), description=name, category=category, stock_quantity=20)
+            for name in ('Ofada Rice', 'Honey Beans', 'Ijebu Garri')
+        ]
+
+    def tearDown(self):
+        popularity._buffer.drain()
+
+    def stats(self, product):
+        return ProductStats.objects.get(product=product)
+
+    def test_product_view_is_buffered_not_written(self):
+        self.client.get(reverse('product', args=[self.rice.id]))
+        self.client.get(reverse('product', args=[self.rice.id]))
+        self.assertFalse(ProductStats.objects.exists())
+
+        self.assertEqual(flush(), 1)
+        self.assertEqual((self.stats(self.rice).views, self.stats(self.rice).recent_views), (2, 2))
+        self.assertEqual(flush(), 0)
+
+    def test_flush_batches_and_accumulates(self):
+        record_view(self.rice.id)
+        record_cart_add(self.rice.id, 2)
+        record_view(self.beans.id)
+        record_view(999_999)  # deleted product
+        with self.assertNumQueries(6):  # savepoint, lookup, insert, two updates, release
+            self.assertEqual(flush(), 2)
+        record_view(self.rice.id)
+        flush()
+        rice = self.stats(self.rice)
+        self.assertEqual((rice.views, rice.cart_adds, rice.recent_cart_adds), (2, 2, 2))
+
+    def test_flush_after_response_when_due(self):
+        record_view(self.beans.id)
+        with override_settings(POPULARITY_FLUSH_SECONDS=0):
+            self.client.get(reverse('deals'))
+        self.assertEqual(self.stats(self.beans).views, 1)
+
+    def test_cart_add_is_counted(self):
+        self.client.login(username='pop@example.com', password='pass12345')
+        self.client.post(reverse('add_to_cart', args=[self.garri.id]), {'quantity': 1})
+        flush()
+        self.assertEqual(self.stats(self.garri).cart_adds, 1)
+
+    def test_trending_score_decays(self):
+        now = timezone.now()
+        for _ in range(10):
+            record_view(self.rice.id)
+        record_cart_add(self.beans.id)
+        flush()
+        update_trending(now)
+        self.assertEqual(self.stats(self.rice).trending_score, 10)
+        self.assertEqual(self.stats(self.beans).trending_score, popularity.CART_ADD_WEIGHT)
+        self.assertEqual(self.stats(self.rice).recent_views, 0)
+
+        # One half-life later rice has halved and beans gained fresh interest
+        record_cart_add(self.beans.id)
+        flush()
+        update_trending(now + timedelta(hours=24))
+        self.assertAlmostEqual(self.stats(self.rice).trending_score, 5)
+        self.assertAlmostEqual(self.stats(self.beans).trending_score, 7.5)
+        self.assertEqual(list(trending_products()), [self.beans, self.rice])
+
+    def test_best_sellers_count_recent_paid_units(self):
+        def order(product, quantity, paid=True, days_ago=0):
+            o = Order.objects.create(customer=self.customer, total=Decimal('10.00'), is_paid=paid)
+            Order.objects.filter(pk=o.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+            OrderItem.objects.create(order=o, product=product, quantity=quantity, price=product.price)
+
+        order(self.garri, 3)
+        order(self.garri, 1)
+        order(self.beans, 2)
+        order(self.rice, 10, paid=False)
+        order(self.rice, 10, days_ago=45)
+        update_trending()
+        self.assertEqual(self.stats(self.garri).units_sold, 4)
+        self.assertFalse(ProductStats.objects.filter(product=self.rice).exists())
+        with self.assertNumQueries(1):
+            self.assertEqual(list(best_sellers()), [self.garri, self.beans])
+
+        response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['best_sellers'], [self.garri, self.beans])
+        self.assertContains(response, 'Best sellers')
+
+    def test_best_sellers_include_archived_orders(self):
+        for quantity in (3, 2):
+            o = Order.objects.create(customer=self.customer, total=Decimal('10.00'), is_paid=True, status='delivered')
+            OrderItem.objects.create(order=o, product=self.garri, quantity=quantity, price=self.garri.price)
+        Order.objects.filter(pk=o.pk).update(created_at=timezone.now() - timedelta(days=2))
+        archive_orders(days=1)
+        self.assertEqual(ArchivedOrderItem.objects.get().quantity, 2)
+        update_trending()
+        self.assertEqual(self.stats(self.garri).units_sold, 5)
+
+    def test_deals_list_only_sale_items(self):
+        Product.objects.filter(pk=self.beans.pk).update(sale_price=Decimal('4.00'))
+        for product in (self.rice, self.beans):
+            record_view(product.id)
+        flush()
+        update_trending()
+        response = self.client.get(reverse('deals'))
+        self.assertEqual(list(response.context['trending']), [self.beans])
+        self.assertContains(response, 'Trending deals')
+
+    def test_command(self):
+        record_view(self.rice.id)
+        out = StringIO()
+        call_command('update_trending', stdout=out)
+        self.assertIn('Updated popularity for 1 products', out.getvalue())
+        self.assertEqual(self.stats(self.rice).trending_score, 1)
@@ -0,0 +1,101 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from afriapp.models import Product, Category, Service, ShopCart
+from decimal import Decimal
+from unittest.mock import patch
+
+
+class PriceAnnotationTestCase(TestCase):
+    """Test the SQL-side price annotations on Product querysets and the ShopCart totals"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='shopper@example.com', password='pass12345')
+        service = Service.objects.create(name='Groceries')
+        self.category = Category.objects.create(name='Grains', service=service)
+
+        self.regular = Product.objects.create(
+            name='Ofada Rice', price=Decimal('20.00'), description='Rice',
+            category=self.category, stock_quantity=10
+        )
+        self.discounted = Product.objects.create(
+            name='Palm Oil', price=Decimal('20.00'), sale_price=Decimal('15.00'),
+            description='Oil', category=self.category, stock_quantity=10
+        )
+        self.clearance = Product.objects.create(
+            name='Egusi', price=Decimal('10.00'), sale_price=Decimal('4.00'),
+            description='Seeds', category=self.category, stock_quantity=10
+        )
+        # A sale price above the regular price is not a sale
+        self.bogus_sale = Product.objects.create(
+            name='Garri', price=Decimal('5.00'), sale_price=Decimal('6.00'),
+            description='Cassava', category=self.category, stock_quantity=10
+        )
+
+    def test_annotations_match_python_methods(self):
+        """Test that annotated values agree with the model helpers"""
+        for product in Product.objects.with_pricing():
+            fresh = Product.objects.get(pk=product.pk)
+            self.assertEqual(product.on_sale, fresh.is_on_sale())
+            self.assertEqual(product.display_price, fresh.get_display_price())
+            self.assertEqual(product.discount_pct, fresh.get_discount_percentage())
+
+    def test_deals_and_clearance_filters(self):
+        """Test deals are ordered by discount and clearance applies the threshold"""
+        deals = list(Product.objects.deals())
+        self.assertEqual(deals, [self.clearance, self.discounted])
+        self.assertEqual(list(Product.objects.clearance(min_discount=30)), [self.clearance])
+
+    def test_order_by_effective_price(self):
+        """Test sorting listings by the price shoppers actually pay"""
+        names = list(Product.objects.with_pricing().order_by('display_price').values_list('name', flat=True))
+        self.assertEqual(names, ['Egusi', 'Garri', 'Palm Oil', 'Ofada Rice'])
+
+    def test_cart_totals_use_sale_price(self):
+        """Test cart totals apply sale prices from one query, through the pricing engine"""
+        ShopCart.objects.create(user=self.user, product=self.regular, quantity=2)
+        ShopCart.objects.create(user=self.user, product=self.discounted, quantity=3)
+
+        cart = ShopCart.objects.filter(user=self.user, paid_order=False)
+        with self.assertNumQueries(1):
+            totals = cart.totals()
+
+        self.assertEqual(totals['total_items'], 5)
+        self.assertEqual(totals['total_amount'], Decimal('85.00'))
+
+    def test_empty_cart_totals(self):
+        """Test totals for an empty cart are zero rather than None"""
+        totals = ShopCart.objects.filter(user=self.user).totals()
+        self.assertEqual(totals['total_items'], 0)
+        self.assertEqual(totals['total_amount'], Decimal('0.00'))
+
+    def test_deals_and_clearance_pages(self):
+        """Test the deals and clearance listings render from the annotated querysets"""
+        response = self.client.get('/deals/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['products']), [self.clearance, self.discounted])
+
+        response = self.client.get('/clearance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Egusi')
+        self.assertNotContains(response, 'Palm Oil')
+
+    def test_deals_sort_filter_and_pages(self):
+        """Test the deals page honours ?sort=, ?category_id= and ?page= and links keep them"""
+        spices = Category.objects.create(name='Spices', service=self.category.service)
+        pepper = Product.objects.create(
+            name='Cameroon Pepper', price=Decimal('8.00'), sale_price=Decimal('7.00'),
+            description='Pepper', category=spices, stock_quantity=10
+        )
+        response = self.client.get('/deals/', {'sort': 'price_desc'})
+        self.assertEqual(list(response.context['products']), [self.discounted, pepper, self.clearance])
+        self.assertEqual([label for label, _ in response.context['category_links']], ['All Categories', 'Grains', 'Spices'])
+
+        response = self.client.get('/deals/', {'sort': 'price_desc', 'category_id': spices.id})
+        self.assertEqual(list(response.context['products']), [pepper])
+        self.assertIn(('Best Discount', f'?sort=discount&category_id={spices.id}'), response.context['sort_links'])
+
+        with patch('afriapp.views.SALE_PAGE_SIZE', 2):
+            response = self.client.get('/deals/', {'sort': 'price_asc', 'page': 2})
+        self.assertEqual(list(response.context['products']), [self.discounted])
+        self.assertEqual(response.context['previous_page_url'], '?sort=price_asc&page=1')
+        self.assertIsNone(response.context['next_page_url'])
@@ -0,0 +1,116 @@
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from afriapp.models import Category, Customer, Order, OrderItem, PaymentInfo, Product, Service, ShopCart
+from afriapp.pricing import Line, _price, price_cart, to_cents
+from logistics.models import DeliveryZone
+
+
+class PricingEngineTestCase(TestCase):
+    """Test the integer-cents breakdown on its own"""
+
+    def test_to_cents_rounds_half_up(self):
+        self.assertEqual(to_cents(Decimal('19.99')), 1999)
+        self.assertEqual(to_cents(0.1 + 0.2), 30)
+        self.assertEqual(to_cents(Decimal('0.005')), 1)
+        self.assertEqual(to_cents(None), 0)
+
+    def test_breakdown(self):
+        lines = (Line(1, 'Rice', 3, 1999, 1999), Line(2, 'Palm Oil', 2, 1000, 800))
+        pricing = _price(lines, 500)
+        self.assertEqual(pricing.subtotal_cents, 5997 + 1600)
+        self.assertEqual(pricing.discount_cents, 400)
+        # 7.5% of 75.97 is 5.69775, rounded once on the subtotal
+        self.assertEqual(pricing.vat_cents, 570)
+        self.assertEqual(pricing.total_cents, 7597 + 570 + 500)
+        self.assertEqual((pricing.total, pricing.item_count), (Decimal('86.67'), 5))
+
+    def test_stripe_line_items_add_up_to_the_total(self):
+        pricing = _price((Line(1, 'Rice', 3, 1999, 1999),), 750)
+        items = pricing.stripe_line_items()
+        self.assertEqual([item['price_data']['product_data']['name'] for item in items], ['Rice', 'VAT (7.5%)', 'Shipping'])
+        self.assertEqual(sum(item['price_data']['unit_amount'] * item['quantity'] for item in items), pricing.total_cents)
+
+
+class CartPricingTestCase(TestCase):
+    """Test that every cart figure, the Stripe charge and the order agree"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='price@example.com', password='pass12345', email='price@example.com')
+        self.customer = Customer.objects.create(user=self.user, email='price@example.com')
+        category = Category.objects.create(name='Staples', service=Service.objects.create(name='Groceries'))
+        self.rice = Product.objects.create(
+            name='Rice', price=Decimal('19.99'), description='Rice', category=category, stock_quantity=50
+        )
+        self.oil = Product.objects.create(
+            name='Palm Oil', price=Decimal('10.00'), sale_price=Decimal('8.00'), description='Oil', category=category,
+            stock_quantity=50,
+        )
+        ShopCart.objects.create(user=self.user, product=self.rice, quantity=3)
+        ShopCart.objects.create(user=self.user, product=self.oil, quantity=2)
+        self.zone = DeliveryZone.objects.create(name='Lagos Mainland', base_fee=Decimal('5.00'))
+        self.client.login(username='price@example.com', password='pass12345')
+
+    def cart(self):
+        return ShopCart.objects.filter(user=self.user, paid_order=False).select_related('product')
+
+    def test_breakdown_is_memoised_per_cart_version(self):
+        first = price_cart(self.cart())
+        self.assertIs(price_cart(self.cart()), first)
+        ShopCart.objects.filter(product=self.rice).update(quantity=4)
+        self.assertEqual(price_cart(self.cart()).subtotal_cents, 4 * 1999 + 1600)
+
+    def test_cart_page_and_endpoints_use_sale_prices(self):
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['subtotal'], Decimal('75.97'))
+        self.assertEqual(response.context['vat'], Decimal('5.70'))
+        self.assertEqual(response.context['total'], Decimal('81.67'))
+        self.assertContains(response, 'Sale savings')
+
+        data = self.client.get(reverse('get_cart_items')).json()
+        self.assertEqual((data['subtotal'], data['discount'], data['vat'], data['total'], data['count']), (75.97, 4.0, 5.7, 81.67, 5))
+
+    @override_settings(STRIPE_SECRET_KEY='sk_test_pricing')
+    @patch('stripe.checkout.Session.create')
+    def test_checkout_charge_and_order_agree(self, create_session):
+        create_session.return_value = MagicMock(id='cs_test_pricing', url='https://stripe.test/pay')
+        response = self.client.get(reverse('checkout'), {'delivery_zone': self.zone.id})
+        self.assertEqual((response.context['shipping_cost'], response.context['total_price']), (Decimal('5.00'), Decimal('86.67')))
+
+        self.client.post(reverse('payment_pipeline'), {
+            'basket_no': 'PRICE-1', 'delivery_zone': self.zone.id, 'first_name': 'Ada', 'last_name': 'Obi',
+            'phone': '5550100', 'address': '1 Market Street', 'city': 'Lagos', 'state': 'LA',
+            'postal_code': '100001', 'country': 'NG',
+        })
+        payment = PaymentInfo.objects.get(basket_no='PRICE-1')
+        self.assertEqual((payment.amount, payment.shipping_cost), (Decimal('86.67'), Decimal('5.00')))
+        line_items = create_session.call_args.kwargs['line_items']
+        self.assertEqual(sum(item['price_data']['unit_amount'] * item['quantity'] for item in line_items), 8667)
+
+        self.client.get(reverse('successpayment'))
+        order = Order.objects.get(payment=payment)
+        self.assertEqual(
+            (order.subtotal, order.tax, order.shipping_cost, order.total),
+            (Decimal('75.97'), Decimal('5.70'), Decimal('5.00'), Decimal('86.67')),
+        )
+        self.assertEqual(OrderItem.objects.get(order=order, product=self.oil).price, Decimal('8.00'))
+
+    def test_order_records_the_amount_charged(self):
+        payment = PaymentInfo.objects.create(
+            user=self.user, amount=Decimal('81.67'), shipping_cost=0, basket_no='PRICE-2', paid_order=False,
+        )
+        # The sale ended between paying and landing on the success page
+        Product.objects.filter(pk=self.oil.pk).update(sale_price=None)
+        self.client.get(reverse('successpayment'))
+        self.assertEqual(Order.objects.get(payment=payment).total, Decimal('81.67'))
+
+    def test_zone_change_is_priced_without_reloading(self):
+        data = self.client.get(reverse('checkout_totals'), {'delivery_zone': self.zone.id}).json()
+        self.assertEqual((data['subtotal'], data['vat'], data['shipping'], data['total']), (75.97, 5.7, 5.0, 86.67))
+        self.assertEqual(self.client.get(reverse('checkout_totals')).json()['total'], 81.67)
+        response = self.client.get(reverse('checkout'))
+        self.assertContains(response, 'onchange="updateCheckoutTotals(this.value)"')
+        self.assertNotContains(response, 'window.location.search')
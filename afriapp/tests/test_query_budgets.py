@@ -0,0 +1,110 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from afriapp.models import Customer, Product, Category, Service, ShopCart
+from afriapp.instrumentation import QueryBudgetMixin, fingerprint, record_queries
+from decimal import Decimal
+import json
+
+
+class QueryBudgetTestCase(QueryBudgetMixin, TestCase):
+    """Query budgets for the hot storefront and logistics views.
+
+    The catalog has several services and categories so that any per-row
+    query (N+1) pushes a view over its budget.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='budget@example.com', password='pass12345')
+        Customer.objects.create(user=self.user, email='budget@example.com')
+
+        for s in range(3):
+            service = Service.objects.create(name=f'Service {s}')
+            for c in range(4):
+                category = Category.objects.create(name=f'Category {s}-{c}', service=service)
+                for p in range(3):
+                    product = Product.objects.create(
+                        name=f'Product {s}-{c}-{p}', price=Decimal('5.00'),
+                        description='Budget product', category=category, stock_quantity=10
+                    )
+                    if p == 0:
+                        ShopCart.objects.create(user=self.user, product=product, quantity=1)
+        self.service = Service.objects.first()
+        self.client.login(username='budget@example.com', password='pass12345')
+
+    # Every authenticated request costs two queries (session + user) before the view runs.
+
+    def test_shop_view_budget(self):
+        with self.assertQueryBudget(6, max_duplicates=0):
+            response = self.client.get(reverse('shop'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_service_detail_budget(self):
+        with self.assertQueryBudget(6, max_duplicates=0):
+            response = self.client.get(reverse('service', args=[self.service.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_cart_view_budget(self):
+        with self.assertQueryBudget(10, max_duplicates=0):
+            response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_checkout_view_budget(self):
+        with self.assertQueryBudget(6, max_duplicates=0):
+            response = self.client.get(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_and_load_more_budget(self):
+        with self.assertQueryBudget(3, max_duplicates=0):
+            self.client.get(reverse('api_search_products'), {'search': 'Product'})
+        with self.assertQueryBudget(4, max_duplicates=0):
+            self.client.get(reverse('load_more_products'))
+        with self.assertQueryBudget(4, max_duplicates=0):
+            self.client.get(reverse('get_cart_items'))
+
+    def test_logistics_dashboard_budget(self):
+        with self.assertQueryBudget(6):
+            response = self.client.get(reverse('logistics:dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_budget_failure_reports_queries(self):
+        """Test that exceeding a budget fails with the offending SQL"""
+        with self.assertRaises(AssertionError) as ctx:
+            with self.assertQueryBudget(1):
+                for product in Product.objects.all()[:3]:
+                    product.category.name
+        self.assertIn('budget is 1', str(ctx.exception))
+        self.assertIn('afriapp_category', str(ctx.exception))
+
+
+class QueryInstrumentationTestCase(TestCase):
+    """Test the query recorder and the instrumentation middleware"""
+
+    def test_fingerprint_strips_literals(self):
+        a = fingerprint("SELECT * FROM product WHERE id = 1 AND name = 'rice'")
+        b = fingerprint("SELECT * FROM product WHERE id = 42 AND name = 'palm oil'")
+        self.assertEqual(a, b)
+        self.assertEqual(fingerprint('SELECT 1 FROM t WHERE id IN (%s, %s, %s)'), 'SELECT ? FROM t WHERE id IN (...)')
+
+    def test_record_queries_counts_duplicates(self):
+        Service.objects.create(name='Groceries')
+        with record_queries() as stats:
+            for _ in range(3):
+                list(Service.objects.filter(name='Groceries'))
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(stats.as_dict()['duplicates'], 2)
+
+    @override_settings(QUERY_INSTRUMENTATION=True)
+    def test_middleware_emits_server_timing_and_log(self):
+        client = Client()
+        with self.assertLogs('afriapp.queries', level='INFO') as logs:
+            response = client.get(reverse('shop'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('app;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'shop')
+        self.assertGreater(record['queries'], 0)
+
+    def test_middleware_disabled_by_default(self):
+        response = Client().get(reverse('shop'))
+        self.assertFalse(response.has_header('Server-Timing'))
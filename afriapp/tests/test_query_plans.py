@@ -0,0 +1,59 @@
+from django.db import connection
+from django.test import TestCase
+from afriapp.datasets import DatasetGenerator
+from afriapp.instrumentation import QueryPlanMixin, sequential_scans
+from afriapp.models import Customer, Order, PaymentInfo, Product, ShopCart
+from logistics.models import Shipment
+
+
+class QueryPlanTestCase(QueryPlanMixin, TestCase):
+    """Test that the hot storefront filters are served by indexes, not table scans"""
+
+    @classmethod
+    def setUpTestData(cls):
+        DatasetGenerator(scale=1, seed=11).generate()
+        cls.customer = Customer.objects.filter(user__isnull=False).first()
+        cls.user = cls.customer.user
+        with connection.cursor() as cursor:
+            # Give the planner real statistics, as a production database would have
+            cursor.execute('ANALYZE')
+
+    def test_open_cart_for_user(self):
+        self.assertIndexed(ShopCart.objects.filter(user=self.user, paid_order=False))
+
+    def test_open_cart_for_guest_session(self):
+        self.assertIndexed(ShopCart.objects.filter(
+            session_key='abc123', user=None, paid_order=False, quantity__gt=0
+        ))
+
+    def test_shop_listing(self):
+        products = Product.objects.filter(available=True).with_pricing().select_related('category')
+        self.assertIndexed(products.order_by('-date_created')[:12], tables=['product', 'afriapp_category'])
+
+    def test_webhook_payment_lookup(self):
+        self.assertIndexed(PaymentInfo.objects.filter(stripe_payment_intent_id='cs_test_123'))
+
+    def test_latest_payment_for_basket(self):
+        self.assertIndexed(PaymentInfo.objects.filter(basket_no='b' * 32).order_by('-created_at')[:1])
+
+    def test_order_history(self):
+        self.assertIndexed(Order.objects.filter(customer__user=self.user).order_by('-created_at'))
+
+    def test_shipments_by_status(self):
+        self.assertIndexed(Shipment.objects.filter(status='in_transit'))
+
+
+class SequentialScanParserTestCase(TestCase):
+    """Test detection of sequential scans in EXPLAIN output"""
+
+    def test_sqlite_plans(self):
+        plan = '2 0 0 SCAN shopcart\n5 0 0 SEARCH product USING INTEGER PRIMARY KEY (rowid=?)'
+        self.assertEqual(sequential_scans(plan, 'sqlite'), {'shopcart'})
+        plan = '3 0 0 SCAN product USING INDEX product_avail_created_idx'
+        self.assertEqual(sequential_scans(plan, 'sqlite'), set())
+
+    def test_postgres_plans(self):
+        plan = 'Limit\n  ->  Seq Scan on shipment  (cost=0.00..1.10 rows=1 width=8)'
+        self.assertEqual(sequential_scans(plan, 'postgresql'), {'shipment'})
+        plan = 'Index Scan using shipment_status_idx on shipment'
+        self.assertEqual(sequential_scans(plan, 'postgresql'), set())
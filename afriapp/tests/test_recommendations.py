@@ -0,0 +1,127 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from afriapp import recommendations
+from afriapp.models import (
+    ArchivedOrder, ArchivedOrderItem, Category, Customer, Order, OrderItem, PaymentInfo, Product,
+    ProductAssociation, Service, ShopCart,
+)
+from afriapp.recommendations import bought_together, bought_with_cart, build_associations, co_purchase_counts, record_order
+
+
+class RecommendationTestCase(TestCase):
+    """Test the co-purchase job, incremental updates and the product/cart widgets"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='recs@example.com', password='pass12345', email='recs@example.com')
+        self.customer = Customer.objects.create(user=self.user, email='recs@example.com')
+        service = Service.objects.create(name='Groceries')
+        category = Category.objects.create(name='Soup', service=service)
+        names = ['Egusi', 'Palm Oil', 'Stockfish', 'Crayfish', 'Ogbono']
+        self.egusi, self.palm_oil, self.stockfish, self.crayfish, self.ogbono = [
+            Product.objects.create(name=name, price=Decimal('5.00'), description=name, category=category, stock_quantity=20)
+            for name in names
+        ]
+
+    def order(self, *products, paid=True):
+        order = Order.objects.create(customer=self.customer, total=Decimal('10.00'), is_paid=paid)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.price)
+        return order
+
+    def pairs(self, product):
+        return dict(ProductAssociation.objects.filter(product=product).values_list('related__name', 'orders'))
+
+    def test_counts_orders_containing_both(self):
+        counts = co_purchase_counts([{1, 2, 3}, {1, 2}, {3}, set(range(100, 200))])
+        self.assertEqual(counts[1], {2: 2, 3: 1})
+        self.assertNotIn(100, counts)
+
+    def test_build_uses_paid_live_and_archived_orders(self):
+        self.order(self.egusi, self.palm_oil, self.stockfish)
+        self.order(self.egusi, self.palm_oil)
+        self.order(self.egusi, self.ogbono, paid=False)
+        archived = ArchivedOrder.objects.create(
+            id=10_000, order_no='6b7a1c9e-0000-4000-8000-000000000001', customer=self.customer,
+            total=Decimal('10.00'), is_paid=True, status='delivered', created_at=timezone.now(), updated_at=timezone.now(),
+        )
+        for n, product in enumerate((self.egusi, self.crayfish)):
+            ArchivedOrderItem.objects.create(id=10_000 + n, order=archived, product=product, quantity=1, price=Decimal('5.00'))
+
+        metrics = build_associations()
+        self.assertEqual(metrics['orders'], 3)
+        self.assertEqual(self.pairs(self.egusi), {'Palm Oil': 2, 'Stockfish': 1, 'Crayfish': 1})
+        self.assertEqual(self.pairs(self.stockfish), {'Egusi': 1, 'Palm Oil': 1})
+        self.assertEqual(self.pairs(self.ogbono), {})
+
+        # A rebuild replaces rather than adds
+        build_associations()
+        self.assertEqual(self.pairs(self.egusi)['Palm Oil'], 2)
+
+    def test_incremental_update_matches_rebuild(self):
+        build_associations()
+        for basket in [(self.egusi, self.palm_oil), (self.egusi, self.palm_oil, self.crayfish), (self.ogbono,)]:
+            record_order(self.order(*basket).pk)
+        incremental = set(ProductAssociation.objects.values_list('product_id', 'related_id', 'orders'))
+        build_associations()
+        self.assertEqual(set(ProductAssociation.objects.values_list('product_id', 'related_id', 'orders')), incremental)
+
+    def test_incremental_update_trims_each_product(self):
+        original = recommendations.STORED_PER_PRODUCT
+        try:
+            recommendations.STORED_PER_PRODUCT = 2
+            record_order(self.order(self.egusi, self.palm_oil, self.stockfish).pk)
+            record_order(self.order(self.egusi, self.palm_oil).pk)
+            record_order(self.order(self.egusi, self.crayfish, self.ogbono).pk)
+        finally:
+            recommendations.STORED_PER_PRODUCT = original
+        # Palm oil (two orders) stays; the weakest newcomers are dropped
+        self.assertEqual(ProductAssociation.objects.filter(product=self.egusi).count(), 2)
+        self.assertEqual(self.pairs(self.egusi)['Palm Oil'], 2)
+
+    def test_widgets_read_precomputed_pairs(self):
+        self.order(self.egusi, self.palm_oil, self.stockfish)
+        self.order(self.egusi, self.palm_oil)
+        self.order(self.crayfish, self.stockfish)
+        self.order(self.crayfish, self.stockfish)
+        build_associations()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(bought_together(self.egusi.id), [self.palm_oil, self.stockfish])
+        with self.assertNumQueries(1):
+            # Stockfish pairs with both cart items; products in the cart are never suggested
+            self.assertEqual(bought_with_cart([self.egusi.id, self.crayfish.id]), [self.stockfish, self.palm_oil])
+        self.assertEqual(bought_with_cart([]), [])
+
+        response = self.client.get(reverse('product', args=[self.egusi.id]))
+        self.assertEqual(response.context['bought_together'], [self.palm_oil, self.stockfish])
+        self.assertContains(response, 'Frequently bought together')
+
+        self.client.login(username='recs@example.com', password='pass12345')
+        ShopCart.objects.create(user=self.user, product=self.egusi, quantity=1)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['bought_together'], [self.palm_oil, self.stockfish])
+        self.assertContains(response, 'Customers also bought')
+
+    def test_completed_payment_records_the_basket(self):
+        self.client.login(username='recs@example.com', password='pass12345')
+        for product in (self.egusi, self.palm_oil):
+            ShopCart.objects.create(user=self.user, product=product, quantity=1)
+        PaymentInfo.objects.create(
+            user=self.user, amount=Decimal('10.75'), basket_no='REC-1', first_name='Ada', last_name='Obi',
+            email='recs@example.com', phone='5550100', address='1 Market Street', city='Lagos', state='LA',
+            postal_code='100001', country='NG',
+        )
+        self.client.get(reverse('successpayment'))
+        self.assertEqual(self.pairs(self.egusi), {'Palm Oil': 1})
+
+    def test_command(self):
+        self.order(self.egusi, self.palm_oil)
+        out = StringIO()
+        call_command('build_recommendations', stdout=out)
+        self.assertIn('Stored 2 pairs for 2 products from 1 orders', out.getvalue())
@@ -0,0 +1,123 @@
+from django.test import TestCase, Client, override_settings
+from django.contrib.auth.models import User
+from django.urls import reverse
+from afriapp.profiling import StackSampler, ProfileStore, collapse_stack
+from afriapp.views import ShopView
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+import time
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+class StackSamplerTestCase(TestCase):
+    """Test stack sampling and collapsed-stack aggregation"""
+
+    def test_sampler_captures_running_function(self):
+        with StackSampler(interval=0.001) as sampler:
+            busy_loop(0.1)
+        self.assertTrue(sampler.samples)
+        self.assertTrue(any('busy_loop' in stack for stack in sampler.samples))
+
+    def test_cpu_mode_skips_idle_thread(self):
+        if not hasattr(time, 'pthread_getcpuclockid'):
+            self.skipTest('per-thread CPU clock not available')
+        with StackSampler(interval=0.001, mode='cpu') as sampler:
+            time.sleep(0.05)
+        with StackSampler(interval=0.001, mode='cpu') as busy:
+            busy_loop(0.05)
+        self.assertLess(sum(sampler.samples.values()), sum(busy.samples.values()))
+
+    def test_collapse_stack_is_root_first(self):
+        stack = collapse_stack(sys._getframe(), root='GET shop')
+        parts = stack.split(';')
+        self.assertEqual(parts[0], 'GET shop')
+        self.assertIn('test_collapse_stack_is_root_first', parts[-1])
+
+    def test_store_merges_identical_stacks(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ProfileStore(os.path.join(tmp, 'profile.collapsed'))
+            store.append({'a;b': 2, 'a;c': 1})
+            store.append({'a;b': 3})
+            self.assertEqual(store.render(), 'a;b 5\na;c 1\n')
+            store.clear()
+            self.assertEqual(store.render(), '')
+
+    def test_store_compacts_past_max_bytes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = ProfileStore(os.path.join(tmp, 'profile.collapsed'), max_bytes=40)
+            for _ in range(10):
+                store.append({'a;b': 2, 'a;c': 1})
+            self.assertEqual(store.render(), 'a;b 20\na;c 10\n')
+            store.append({'x;' + 'y' * 30: 1})
+            self.assertLessEqual(os.path.getsize(store.path), 40)
+            self.assertEqual(store.render(), 'a;b 20\na;c 10\n')
+
+
+class SamplingProfilerMiddlewareTestCase(TestCase):
+    """Test request selection and the staff-only profile download"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.output = os.path.join(self.tmp.name, 'requests.collapsed')
+        self.staff = User.objects.create_user(username='staff@example.com', password='pass12345', is_staff=True)
+        self.shopper = User.objects.create_user(username='shopper@example.com', password='pass12345')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def profiler_settings(self, **overrides):
+        options = dict(PROFILER_ENABLED=True, PROFILER_SAMPLE_RATE=0.0, PROFILER_INTERVAL=0.001, PROFILER_OUTPUT=self.output)
+        options.update(overrides)
+        return override_settings(**options)
+
+    def test_unsampled_requests_are_untouched(self):
+        with self.profiler_settings():
+            response = Client().get(reverse('shop'))
+        self.assertFalse(response.has_header('X-Profile-Samples'))
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_header_ignored_for_non_staff(self):
+        client = Client()
+        client.login(username='shopper@example.com', password='pass12345')
+        with self.profiler_settings():
+            response = client.get(reverse('shop'), HTTP_X_PROFILE_REQUEST='wall')
+        self.assertFalse(response.has_header('X-Profile-Samples'))
+
+    def test_staff_header_profiles_request(self):
+        client = Client()
+        client.login(username='staff@example.com', password='pass12345')
+        shop_get = ShopView.get
+
+        def slow_get(view, request, *args, **kwargs):
+            # Long enough for the sampler to tick however fast the page renders
+            busy_loop(0.05)
+            return shop_get(view, request, *args, **kwargs)
+
+        with self.profiler_settings(), patch.object(ShopView, 'get', slow_get):
+            response = client.get(reverse('shop'), HTTP_X_PROFILE_REQUEST='wall')
+            self.assertGreater(int(response['X-Profile-Samples']), 0)
+
+            download = client.get(reverse('admin_download_profile'))
+            self.assertEqual(download.status_code, 200)
+            profile = download.content.decode()
+            self.assertTrue(profile.startswith('GET shop;'))
+            self.assertIn('busy_loop', profile)
+
+    def test_sample_rate_profiles_anonymous_requests(self):
+        with self.profiler_settings(PROFILER_SAMPLE_RATE=1.0):
+            response = Client().get(reverse('shop'))
+        self.assertTrue(response.has_header('X-Profile-Samples'))
+
+    def test_download_requires_staff(self):
+        client = Client()
+        client.login(username='shopper@example.com', password='pass12345')
+        with self.profiler_settings():
+            response = client.get(reverse('admin_download_profile'))
+        self.assertEqual(response.status_code, 302)
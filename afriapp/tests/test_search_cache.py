@@ -0,0 +1,112 @@
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from afriapp import autocomplete, search_cache
+from afriapp.models import Category, Product, Service
+from afriapp.views import cached_search_results, search_catalog_queryset
+
+
+class SearchCacheTestCase(TestCase):
+    """Test the search result cache, its invalidation and stampede protection"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            AUTOCOMPLETE_SNAPSHOT_PATH=os.path.join(self.tmp.name, 'autocomplete.json')
+        )
+        self.settings_override.enable()
+        autocomplete.reset()
+        cache.clear()
+        search_cache._counter.reset()
+
+        service = Service.objects.create(name='Groceries')
+        self.grains = Category.objects.create(name='Grains', service=service)
+        self.oils = Category.objects.create(name='Oils', service=service)
+        self.rice = Product.objects.create(name='Ofada Rice', price=Decimal('9.00'), description='Local rice', category=self.grains)
+        self.oil = Product.objects.create(name='Red Palm Oil', price=Decimal('6.00'), description='Oil', category=self.oils)
+
+    def tearDown(self):
+        autocomplete.reset()
+        self.settings_override.disable()
+        self.tmp.cleanup()
+
+    def ids(self, results):
+        return [result['id'] for result in results]
+
+    def test_repeat_search_skips_the_database(self):
+        self.assertEqual(self.ids(cached_search_results('rice')), [self.rice.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.ids(cached_search_results('  RICE ')), [self.rice.id])
+        self.assertEqual(search_cache.stats(), {'hits': 1, 'misses': 1, 'waits': 0, 'hit_rate': 0.5})
+
+        response = self.client.get(reverse('api_search_products'), {'search': 'Rice'})
+        self.assertEqual(self.ids(response.json()['products']), [self.rice.id])
+        self.assertEqual(search_cache.stats()['hits'], 2)
+
+    def test_category_is_part_of_the_key(self):
+        self.assertEqual(self.ids(cached_search_results('oil', self.oils.id)), [self.oil.id])
+        self.assertEqual(cached_search_results('oil', self.grains.id), [])
+        self.assertEqual(search_cache.stats()['misses'], 2)
+
+    def test_catalog_changes_invalidate(self):
+        cached_search_results('rice')
+        self.oil.name = 'Rice Bran Oil'
+        self.oil.save()
+        self.assertEqual(set(self.ids(cached_search_results('rice'))), {self.rice.id, self.oil.id})
+        self.rice.delete()
+        self.assertEqual(self.ids(cached_search_results('rice')), [self.oil.id])
+
+    def test_another_workers_edit_invalidates_via_the_snapshot(self):
+        autocomplete.suggest('ri')  # publishes the snapshot
+        cached_search_results('rice')
+        # Another worker renames the oil: its version bump lands in its own cache,
+        # but its snapshot rewrite is visible here
+        Product.objects.filter(pk=self.oil.pk).update(name='Rice Bran Oil')
+        path = settings.AUTOCOMPLETE_SNAPSHOT_PATH
+        os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns + 1_000_000_000))
+        self.assertEqual(set(self.ids(cached_search_results('rice'))), {self.rice.id, self.oil.id})
+
+    def test_concurrent_identical_searches_compute_once(self):
+        calls = []
+
+        def slow(query, category):
+            calls.append(query)
+            time.sleep(0.2)
+            return ['result']
+
+        # Publish the snapshot here: the test database is not shared with other threads
+        autocomplete.get_index()
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(search_cache.cached('test', slow, 'plantain')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(calls, ['plantain'])
+        self.assertEqual(results, [['result']] * 5)
+        self.assertEqual(search_cache.stats()['waits'], 4)
+
+    def test_abandoned_lock_does_not_block(self):
+        cache.add(search_cache.cache_key('test', 'yam') + ':lock', 1, 60)
+        original = search_cache.WAIT_SECONDS
+        try:
+            search_cache.WAIT_SECONDS = 0.1
+            self.assertEqual(search_cache.cached('test', lambda query, category: [query], 'Yam'), ['yam'])
+        finally:
+            search_cache.WAIT_SECONDS = original
+
+    def test_shop_search_reuses_matching_ids(self):
+        response = self.client.get(reverse('shop'), {'search': 'rice'})
+        self.assertEqual([p.id for p in response.context['products']], [self.rice.id])
+        with self.assertNumQueries(1):
+            self.assertEqual(list(search_catalog_queryset('Rice').values_list('id', flat=True)), [self.rice.id])
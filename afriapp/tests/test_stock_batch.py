@@ -0,0 +1,104 @@
+import json
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+from afriapp import async_views
+from afriapp.models import Category, PaymentInfo, Product, Service, ShopCart
+from afriapp.views import check_stock_lines, parse_stock_lines
+
+
+class StockBatchTestCase(TestCase):
+    """Test the batch stock endpoint and the checkout-time stock validation"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='stock@example.com', password='pass12345', email='stock@example.com')
+        service = Service.objects.create(name='Groceries')
+        category = Category.objects.create(name='Spices', service=service)
+        self.products = [
+            Product.objects.create(
+                name=f'Suya Spice {n}', price=Decimal('4.00'), description='Spice', category=category,
+                stock_quantity=10, min_purchase=1, max_purchase=5,
+            )
+            for n in range(20)
+        ]
+        self.client.login(username='stock@example.com', password='pass12345')
+
+    def post_lines(self, lines):
+        return self.client.post(reverse('check_stock_batch'), json.dumps({'lines': lines}), content_type='application/json')
+
+    def test_twenty_lines_in_one_query(self):
+        lines = [(product.id, 2) for product in self.products]
+        with self.assertNumQueries(1):
+            report = check_stock_lines(lines)
+        self.assertTrue(report['available'])
+        self.assertEqual(len(report['lines']), 20)
+
+    def test_endpoint_reports_each_line(self):
+        short, limited, fine = self.products[:3]
+        Product.objects.filter(id=short.id).update(stock_quantity=1)
+        # Session and user lookups, then the single product query
+        with self.assertNumQueries(3):
+            response = self.post_lines([
+                {'product_id': short.id, 'quantity': 2},
+                {'product_id': limited.id, 'quantity': 6},
+                {'product_id': fine.id, 'quantity': 3},
+                {'product_id': 999999, 'quantity': 1},
+            ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data['available'])
+        self.assertEqual([line['available'] for line in data['lines']], [False, False, True, False])
+        self.assertEqual(data['lines'][0]['message'], 'Only 1 items left in stock')
+        self.assertEqual(data['lines'][1]['message'], 'Maximum 5 items allowed per order')
+        self.assertEqual(data['lines'][3]['error'], 'Product not found')
+
+    def test_malformed_requests(self):
+        self.assertEqual(self.post_lines([]).status_code, 400)
+        self.assertEqual(self.post_lines([{'product_id': 'rice'}]).status_code, 400)
+        response = self.client.post(reverse('check_stock_batch'), 'not json', content_type='application/json')
+        self.assertEqual(response.json()['error'], 'Invalid JSON body')
+        self.assertEqual(self.client.get(reverse('check_stock_batch')).status_code, 405)
+        self.assertEqual(parse_stock_lines([[1, '2']]), [(1, '2')])
+
+    def test_invalid_quantity_line_is_unavailable(self):
+        data = self.post_lines([[self.products[0].id, 'two']]).json()
+        self.assertFalse(data['lines'][0]['available'])
+        self.assertEqual(data['lines'][0]['error'], 'Invalid quantity')
+
+    def test_duplicate_lines_are_checked_together(self):
+        product, other = self.products[:2]
+        # Two lines of 3 are within the limit one at a time, not together
+        data = self.post_lines([[product.id, 3], [other.id, 1], [product.id, '3']]).json()
+        self.assertFalse(data['available'])
+        self.assertEqual([(line['product_id'], line['requested_quantity']) for line in data['lines']], [(product.id, 6), (other.id, 1)])
+        self.assertEqual(data['lines'][0]['message'], 'Maximum 5 items allowed per order')
+
+        data = self.post_lines([[product.id, 2], [product.id, 'two']]).json()
+        self.assertEqual(data['lines'][0]['error'], 'Invalid quantity')
+
+    def test_checkout_redirects_when_stock_ran_out(self):
+        ShopCart.objects.create(user=self.user, product=self.products[0], quantity=3)
+        Product.objects.filter(id=self.products[0].id).update(stock_quantity=2)
+        response = self.client.get(reverse('checkout'))
+        self.assertRedirects(response, reverse('cart'), fetch_redirect_response=False)
+        messages = [str(m) for m in response.wsgi_request._messages]
+        self.assertEqual(messages, ['Suya Spice 0: Only 2 items left in stock'])
+
+    @override_settings(STRIPE_SECRET_KEY='sk_test_stock')
+    def test_payment_pipeline_rechecks_stock(self):
+        ShopCart.objects.create(user=self.user, product=self.products[0], quantity=3)
+        Product.objects.filter(id=self.products[0].id).update(stock_quantity=0)
+        response = self.client.post(reverse('payment_pipeline'), {'basket_no': 'b1'})
+        self.assertRedirects(response, reverse('cart'), fetch_redirect_response=False)
+        self.assertFalse(PaymentInfo.objects.filter(user=self.user).exists())
+
+    async def test_async_view_matches_sync(self):
+        lines = [[self.products[0].id, 2], [self.products[1].id, 9]]
+        request = AsyncRequestFactory().post('/check-stock/batch/', json.dumps({'lines': lines}), content_type='application/json')
+        request.user = self.user
+        response = await async_views.check_stock_batch(request)
+        expected = await sync_to_async(check_stock_lines)([tuple(line) for line in lines])
+        self.assertEqual(json.loads(response.content), expected)
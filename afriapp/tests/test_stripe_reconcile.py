@@ -0,0 +1,112 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from afriapp.checkout_sessions import LocalStripeGateway, open_checkout
+from afriapp.models import Category, Customer, Order, OrderItem, PaymentInfo, Product, Service, ShopCart
+from afriapp.pricing import price_cart
+from afriapp.stripe_reconcile import reconcile_stripe
+
+
+@override_settings(STRIPE_CHECKOUT_GATEWAY='afriapp.checkout_sessions.LocalStripeGateway')
+class StripeReconcileTestCase(TestCase):
+    """Test matching Stripe sessions to payments and orders against the local stand-in"""
+
+    def setUp(self):
+        cache.clear()
+        LocalStripeGateway.sessions = {}
+        LocalStripeGateway.outage = False
+        category = Category.objects.create(name='Grains', service=Service.objects.create(name='Groceries'))
+        self.rice = Product.objects.create(
+            name='Rice', price=Decimal('19.99'), description='Rice', category=category, stock_quantity=500
+        )
+        self.until = timezone.now() + timedelta(minutes=1)
+
+    def checkout(self, n, quantity=2):
+        """A user with a cart and an open Checkout Session; returns the PaymentInfo."""
+        user = User.objects.create_user(username=f'shopper{n}@example.com', email=f'shopper{n}@example.com')
+        Customer.objects.create(user=user, email=user.email)
+        ShopCart.objects.create(user=user, product=self.rice, quantity=quantity, basket_no=f'REC-{n}')
+        pricing = price_cart(ShopCart.objects.filter(user=user).select_related('product'))
+        details = {'first_name': 'Ada', 'last_name': 'Obi', 'phone': '5550100', 'address': '1 Market Street',
+                   'city': 'Lagos', 'state': 'LA', 'postal_code': '100001', 'country': 'NG', 'email': user.email}
+        return open_checkout(user, pricing, details, f'REC-{n}', 'http://testserver')
+
+    def reconcile(self, **kwargs):
+        return reconcile_stripe(until=self.until, **kwargs)
+
+    def test_creates_missing_order_from_the_cart(self):
+        payment = self.checkout(1)
+        session = LocalStripeGateway.complete(payment.stripe_payment_intent_id)
+        self.checkout(2)  # Never paid: nothing to do
+
+        metrics = self.reconcile()
+        self.assertEqual((metrics['sessions'], metrics['paid'], metrics['orders_created']), (2, 1, 1))
+        order = Order.objects.get(payment=payment)
+        self.assertEqual((order.total, order.stripe_payment_intent_id, order.is_paid), (Decimal('42.98'), session.payment_intent, True))
+        self.assertEqual(list(OrderItem.objects.filter(order=order).values_list('quantity', 'price')), [(2, Decimal('19.99'))])
+        self.assertFalse(ShopCart.objects.filter(user=payment.user).exists())
+        payment.refresh_from_db()
+        self.assertTrue(payment.paid_order)
+
+        # A second run finds nothing left to do
+        self.assertEqual(self.reconcile()['orders_created'], 0)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_flags_what_it_cannot_fix(self):
+        gone, changed, unpaid = self.checkout(1), self.checkout(2), self.checkout(3)
+        for payment in (gone, changed):
+            LocalStripeGateway.complete(payment.stripe_payment_intent_id)
+        ShopCart.objects.filter(user=gone.user).delete()
+        ShopCart.objects.filter(user=changed.user).update(quantity=5)
+        LocalStripeGateway.expire(unpaid.stripe_payment_intent_id)
+        Order.objects.create(customer=unpaid.user.customer_profile, payment=unpaid, total=Decimal('42.98'), is_paid=True)
+        orphan = self.checkout(4)
+        LocalStripeGateway.complete(orphan.stripe_payment_intent_id)
+        orphan.delete()
+
+        metrics = self.reconcile()
+        self.assertEqual(metrics['flagged'], {'missing_payment': 1, 'cart_gone': 1, 'cart_changed': 1, 'unpaid_order': 1})
+        self.assertEqual(
+            dict(PaymentInfo.objects.exclude(reconcile_issue='').values_list('pk', 'reconcile_issue')),
+            {gone.pk: 'cart_gone', changed.pk: 'cart_changed', unpaid.pk: 'unpaid_order'},
+        )
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_marks_paid_when_the_order_exists(self):
+        payment = self.checkout(1)
+        session = LocalStripeGateway.complete(payment.stripe_payment_intent_id)
+        # The webhook stored the intent id, created the order, then failed to mark the payment
+        PaymentInfo.objects.filter(pk=payment.pk).update(stripe_payment_intent_id=session.payment_intent)
+        Order.objects.create(customer=payment.user.customer_profile, payment=payment, total=Decimal('42.98'), is_paid=True)
+
+        self.assertEqual(self.reconcile()['marked_paid'], 1)
+        payment.refresh_from_db()
+        self.assertTrue(payment.paid_order)
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        def queries(first, count):
+            for n in range(first, first + count):
+                LocalStripeGateway.complete(self.checkout(n).stripe_payment_intent_id)
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.reconcile()['orders_created'], count)
+            return len(captured)
+
+        self.assertEqual(queries(1, 2), queries(10, 6))
+
+    def test_command(self):
+        LocalStripeGateway.complete(self.checkout(1).stripe_payment_intent_id)
+        out = StringIO()
+        call_command('reconcile_stripe', '--dry-run', '--until', self.until.isoformat(), stdout=out)
+        self.assertIn('Checked 1 sessions (1 paid): would create 1 orders', out.getvalue())
+        self.assertFalse(Order.objects.exists())
+
+        call_command('reconcile_stripe', '--until', self.until.isoformat(), stdout=out)
+        self.assertEqual(Order.objects.count(), 1)
@@ -1,10 +1,14 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 from .views import *
 from .admininterface import *
 # Import the integration views
 from .views_integration import AgroLinkerDashboardView, MarketPriceView
 
+# Under ASGI the I/O-bound JSON endpoints are served by their async variants
+json_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
     path('populatedb/', populate_db, name='populate_db'),
     # Home URL
@@ -55,15 +59,16 @@ urlpatterns = [
     path('restaurant/', ServiceDetailView.as_view(), {'service_type': 'restaurant'}, name='restaurant'),
     path('add_to_cart/<int:product_id>/', add_to_cart, name='add_to_cart'),
     path('buy_now/<int:product_id>/', buy_now, name='buy_now'),
-    path('api/load-more-products/', load_more_products, name='load_more_products'),  # AJAX endpoint for loading more products
+    path('api/load-more-products/', json_views.load_more_products, name='load_more_products'),  # AJAX endpoint for loading more products
 
     # Cart and Checkout
     path('cart/', CartView.as_view(), name='cart'),
     path('cart/remove/<int:cart_item_id>/', views.remove_from_cart, name='remove_from_cart'),
-    path('get-cart-items/', views.get_cart_items, name='get_cart_items'),
+    path('get-cart-items/', json_views.get_cart_items, name='get_cart_items'),
 
     # Payment and Checkout
     path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('checkout/totals/', views.checkout_totals, name='checkout_totals'),
     path('payment_pipeline/', PaymentPipelineView.as_view(), name='payment_pipeline'),
     path('stripe/webhook/', views.stripe_webhook, name='stripe_webhook'),
     path('successpayment/', CompletedPaymentView.as_view(), name='successpayment'),
@@ -89,7 +94,8 @@ urlpatterns = [
     # API Views
     path('cart/increase/<int:item_id>/', increase_quantity, name='increase_quantity'),
     path('cart/decrease/<int:item_id>/', decrease_quantity, name='decrease_quantity'),
-    path('api/search/', api_search_products, name='api_search_products'),
+    path('api/search/', json_views.api_search_products, name='api_search_products'),
+    path('api/autocomplete/', api_autocomplete, name='api_autocomplete'),
 
     # Admin Dashboard URLs
     path('africanfoodadmin/', AdminDashboardView.as_view(), name='admin_dashboard'),
@@ -115,6 +121,9 @@ urlpatterns = [
     # Admin: Account Settings
     path('admin/account-settings/', admin_account_settings, name='admin_account_settings'),
 
+    # Admin: Aggregated request profile (staff only)
+    path('admin/profile/', admin_download_profile, name='admin_download_profile'),
+
 
     path('account_update/', views.account_update, name='account_update'),
 
@@ -137,8 +146,10 @@ urlpatterns = [
     # Email Collection URLs
     path('collect-email/', views.collect_email, name='collect_email'),
     path('check-email-status/', views.check_email_status, name='check_email_status'),
+    path('newsletter/unsubscribe/<str:token>/', views.newsletter_unsubscribe, name='newsletter_unsubscribe'),
 
     # Cart-related URLs
-    path('check-stock/<int:product_id>/', views.check_stock_availability, name='check_stock_availability'),
+    path('check-stock/batch/', json_views.check_stock_batch, name='check_stock_batch'),
+    path('check-stock/<int:product_id>/', json_views.check_stock_availability, name='check_stock_availability'),
     path('add-to-cart/<int:id>/', views.add_to_cart, name='add_to_cart'),
 ]
@@ -23,14 +23,23 @@ from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.urls import reverse
 from django.utils.http import url_has_allowed_host_and_scheme
-from urllib.parse import quote
+from urllib.parse import quote, urlencode
 
 from .forms import AccountUpdateForm  # Ensure you create a form class for handling user input
 
 # Local Application Imports
 from .models import *
+from . import autocomplete
+from .autocomplete import MAX_SUGGESTIONS
+from .facets import FacetSelection, catalog_queryset, facet_counts, filter_products
+from .popularity import best_sellers, record_cart_add, record_view, trending_products
+from .recommendations import bought_together, bought_with_cart, record_order_safely
+from . import checkout_sessions, search_cache
+from .customers import customer_for_user, get_customer
+from .pricing import delivery_zones, price_cart, to_cents, zone_shipping_cents
 from .forms import *
 from .serializers import *
 from django.http import JsonResponse
@@ -43,6 +52,7 @@ from django.shortcuts import render
 from django.urls import reverse
 from django.template.loader import render_to_string
 from django.core.mail import send_mail, EmailMessage
+from django.core import signing
 
 # Logging configuration
 logger = logging.getLogger(__name__)
@@ -61,6 +71,7 @@ import stripe
 from django.views.decorators.csrf import csrf_exempt
 from django.http import HttpResponse
 from .models import Payment, ShopCart
+from .newsletter import unsubscribe_email
 from django.conf import settings
 # Views List
 # -------------------
@@ -100,13 +111,63 @@ def african_groceries(request):
 def local_delivery(request):
     return render(request, 'local_delivery.html')
 
+# Sort choices for the deals and clearance pages: ?sort= key -> (label, ordering)
+SALE_SORTS = {
+    'discount': ('Best Discount', ('-discount_pct', 'display_price')),
+    'price_asc': ('Price: Low to High', ('display_price', '-discount_pct')),
+    'price_desc': ('Price: High to Low', ('-display_price', '-discount_pct')),
+    'newest': ('Newest', ('-date_created',)),
+}
+SALE_PAGE_SIZE = 24
+
+
+def sale_listing(request, products, default_sort):
+    """
+    Context for a page of sale products: sorted by `?sort=` (a SALE_SORTS
+    key), narrowed by `?category_id=` and paginated by `?page=`. Sort and
+    category links keep each other and start again at page one.
+    """
+    sort = request.GET.get('sort')
+    if sort not in SALE_SORTS:
+        sort = default_sort
+    # Only categories that have something on sale are offered
+    categories = list(Category.objects.filter(id__in=products.values('category_id')).order_by('name'))
+    category = next((c for c in categories if str(c.id) == request.GET.get('category_id')), None)
+    if category is not None:
+        products = products.filter(category=category)
+    page_obj = Paginator(
+        products.select_related('category').order_by(*SALE_SORTS[sort][1], 'id'), SALE_PAGE_SIZE
+    ).get_page(request.GET.get('page'))
+
+    def url(**changes):
+        params = {'sort': sort, 'category_id': category.id if category else None, **changes}
+        return '?' + urlencode({key: value for key, value in params.items() if value is not None})
+
+    return {
+        'products': page_obj,
+        'page_obj': page_obj,
+        'sort_label': SALE_SORTS[sort][0],
+        'sort_links': [(label, url(sort=key)) for key, (label, _) in SALE_SORTS.items()],
+        'category': category,
+        'category_links': [('All Categories', url(category_id=None))] + [(c.name, url(category_id=c.id)) for c in categories],
+        'page_links': [(number, url(page=number)) for number in page_obj.paginator.page_range],
+        'previous_page_url': url(page=page_obj.previous_page_number()) if page_obj.has_previous() else None,
+        'next_page_url': url(page=page_obj.next_page_number()) if page_obj.has_next() else None,
+    }
+
+
 # Today's deals page view
 def deals(request):
-    return render(request, 'deals.html')
+    # Discount and effective price are computed in SQL so sorting happens in the database
+    return render(request, 'deals.html', {
+        **sale_listing(request, Product.objects.deals(), 'discount'),
+        'trending': trending_products(Product.objects.filter(sale_price_condition())),
+        'best_sellers': best_sellers(Product.objects.filter(sale_price_condition())),
+    })
 
 # Clearance page view
 def clearance(request):
-    return render(request, 'clearance.html')
+    return render(request, 'clearance.html', sale_listing(request, Product.objects.clearance(), 'price_asc'))
 
 # File a claim page view
 def file_claim(request):
@@ -574,49 +635,98 @@ class PasswordChangeView(View):
             return redirect('password')
 
 # API endpoint for JavaScript search
+def search_category_filter(category_id=None):
+    """Typeahead category restriction (by id or name); empty for "All Categories"."""
+    if not category_id or category_id == "All Categories":
+        return Q()
+    try:
+        # Try to convert to integer for ID-based lookup
+        return Q(category__id=int(category_id))
+    except (ValueError, TypeError):
+        # If not an integer, try to match by name
+        return Q(category__name=category_id)
+
+
+def product_search_queryset(search_term, category_id=None):
+    """Products matching a typeahead term, optionally within a category (by id or name)."""
+    # Use __icontains for case-insensitive search on product name and description
+    searched_items = Q(name__icontains=search_term) | Q(description__icontains=search_term)
+    products = Product.objects.filter(searched_items, search_category_filter(category_id))
+
+    # Limit results to improve performance
+    return products.select_related('category')[:12]
+
+
+# Below this many exact matches, search falls back to typo-tolerant matching
+FUZZY_MIN_RESULTS = 3
+
+
+def fuzzy_search_products(search_term, category_id=None, exclude=(), limit=12):
+    """
+    Typo-tolerant fallback: products whose names or aliases are trigram-similar
+    to the term (from the in-memory index), best match first, skipping `exclude`.
+    """
+    ids = [pk for pk in autocomplete.fuzzy_product_ids(search_term, limit + len(exclude)) if pk not in exclude][:limit]
+    if not ids:
+        return []
+    products = Product.objects.filter(search_category_filter(category_id)).select_related('category').in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
+
+
+def product_search_result(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'image_url': product.image.url if product.image else '',
+        'category': product.category.name if product.category else '',
+        'url': reverse('product', args=[product.id]),
+    }
+
+
+def search_results(search_term, category_id=None):
+    """Serialised typeahead results: exact matches, topped up with typo-tolerant ones."""
+    results = [product_search_result(product) for product in product_search_queryset(search_term, category_id)]
+    if len(results) < FUZZY_MIN_RESULTS:
+        seen = {result['id'] for result in results}
+        results += [
+            product_search_result(product)
+            for product in fuzzy_search_products(search_term, category_id, seen, 12 - len(results))
+        ]
+    return results
+
+
+def cached_search_results(search_term, category_id=None):
+    """search_results() through the search cache, so repeat searches skip the database."""
+    return search_cache.cached('api', search_results, search_term, category_id)
+
+
 def api_search_products(request):
     """
     API endpoint for JavaScript-based search.
     Returns JSON response with search results.
+    (Served by async_views.api_search_products under ASGI.)
     """
     search_term = request.GET.get("search", "")
-    category_id = request.GET.get("category", None)
 
     # Skip search if term is too short
     if len(search_term) < 2:
         return JsonResponse({"products": []})
 
-    # Use __icontains for case-insensitive search on product name and description
-    searched_items = Q(name__icontains=search_term) | Q(description__icontains=search_term)
-
-    # If a category is selected, filter by that category as well
-    if category_id and category_id != "All Categories":
-        try:
-            # Try to convert to integer for ID-based lookup
-            category_id = int(category_id)
-            products = Product.objects.filter(searched_items, category__id=category_id)
-        except (ValueError, TypeError):
-            # If not an integer, try to match by name
-            products = Product.objects.filter(searched_items, category__name=category_id)
-    else:
-        products = Product.objects.filter(searched_items)
-
-    # Limit results to improve performance
-    products = products[:12]
-
-    # Prepare product data for JSON response
-    product_data = []
-    for product in products:
-        product_data.append({
-            'id': product.id,
-            'name': product.name,
-            'price': float(product.price),
-            'image_url': product.image.url if product.image else '',
-            'category': product.category.name if product.category else '',
-            'url': reverse('product', args=[product.id]),
-        })
+    category_id = request.GET.get("category", None)
+    return JsonResponse({"products": cached_search_results(search_term, category_id)})
 
-    return JsonResponse({"products": product_data})
+def api_autocomplete(request):
+    """
+    Typeahead suggestions (products and categories) for `q`, served from the
+    in-memory prefix index without touching the database.
+    """
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 8)), MAX_SUGGESTIONS))
+    except ValueError:
+        limit = 8
+    query = request.GET.get('q', '')
+    return JsonResponse({'query': query, 'suggestions': autocomplete.suggest(query, limit)})
 
 def search_products(request):
     """Compatibility wrapper for `search_products` URL that delegates to `api_search_products`.
@@ -639,10 +749,15 @@ class IndexView(TemplateView):
             # Fetch the last 10 products based on date_created
             latest_products = Product.objects.order_by('-date_created')[:10]
 
+            # Popularity listings (precomputed scores, see afriapp/popularity.py)
+            trending = list(trending_products())
+            top_sellers = list(best_sellers())
+
         except (Product.DoesNotExist, Exception) as e:
             # Handle any database-related errors, including missing tables
             logger.error(f"Error loading products: {str(e)}")
             featured, latest, services, latest_products = [], [], [], []
+            trending, top_sellers = [], []
             messages.error(request, 'Products could not be loaded. The site is still being set up.')
 
         context = {
@@ -651,6 +766,8 @@ class IndexView(TemplateView):
             'services': services if 'services' in locals() else [],
             'service_id': service_id,
             'latest_products': latest_products if 'latest_products' in locals() else [],  # Pass latest products to context
+            'trending': trending,
+            'best_sellers': top_sellers,
         }
 
         template = 'shop.html' if service_id else 'index.html'
@@ -680,17 +797,20 @@ class ServiceDetailView(TemplateView):
         categories = service.services.all()  # Use 'services' since it's the related name
 
         categories_with_products = {}
-        total_products = 0
 
-        # Iterate through categories and get products
+        # Fetch the service's available products once and group them by category
+        products_by_category = {}
+        service_products = Product.objects.filter(category__service=service, available=True).select_related('category')
+        for product in service_products:
+            products_by_category.setdefault(product.category_id, []).append(product)
+
+        # Counts come from the maintained counter columns rather than an aggregate
         for category in categories:
-            products = category.products.filter(available=True)
-            product_count = products.count()
             categories_with_products[category] = {
-                'products': products,
-                'product_count': product_count
+                'products': products_by_category.get(category.id, []),
+                'product_count': category.available_product_count
             }
-            total_products += product_count
+        total_products = service.available_product_count
 
         # Calculate the percentage for each category
         for category, data in categories_with_products.items():
@@ -742,6 +862,42 @@ class ServiceDetailView(TemplateView):
 
 
 
+# Searches matching more products than this are not cached as id lists
+SEARCH_CACHE_MAX_IDS = 500
+
+
+def search_match_ids(search):
+    """
+    Ids of the available products matching a shop search, including the
+    typo-tolerant fallback when there are too few exact matches; None when
+    the search is too broad to be worth caching as a list of ids.
+    """
+    ids = list(catalog_queryset(search).values_list('id', flat=True)[:SEARCH_CACHE_MAX_IDS + 1])
+    if len(ids) > SEARCH_CACHE_MAX_IDS:
+        return None
+    if len(ids) < FUZZY_MIN_RESULTS:
+        # Too few exact matches: add products whose names are close to the (misspelt) search
+        fuzzy_ids = autocomplete.fuzzy_product_ids(search)
+        if fuzzy_ids:
+            ids = list(catalog_queryset(search, fuzzy_ids).values_list('id', flat=True))
+    return ids
+
+
+def search_catalog_queryset(search):
+    """
+    The shop's search results as a queryset. The matching ids come from the
+    search cache, so a repeat search is a primary-key lookup instead of a
+    text scan over names and descriptions.
+    """
+    if not search:
+        return catalog_queryset()
+    # Cached as a one-item list so a broad search (None) is cached too
+    ids, = search_cache.cached('shop', lambda query, category: [search_match_ids(query)], search)
+    if ids is None:
+        return catalog_queryset(search_cache.normalize_query(search))
+    return catalog_queryset().filter(id__in=ids)
+
+
 # 7. Shop View
 class ShopView(TemplateView):
     template_name = 'shop.html'
@@ -751,40 +907,29 @@ class ShopView(TemplateView):
         category_id = request.GET.get('category_id')
         search_query = request.GET.get('search')
 
-        # Start with all products
-        products_query = Product.objects.filter(available=True)
-
-        # Apply category filter if provided
-        if category_id:
-            try:
-                category_id = int(category_id)
-                products_query = products_query.filter(category__id=category_id)
-            except (ValueError, TypeError):
-                # If not a valid integer, try to match by slug
-                products_query = products_query.filter(category__slug=category_id)
-
-        # Apply search filter if provided
-        if search_query:
-            products_query = products_query.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
+        # Facet filters (category, price bucket, on sale, in stock, rating) over the search results
+        selection = FacetSelection(request.GET)
+        base_query = search_catalog_queryset(selection.search)
+        products_query = filter_products(base_query, selection)
 
         # Get all services (main categories)
-        services = Service.objects.all().prefetch_related('services')
+        services = list(Service.objects.all())
 
-        # Get all categories with their products count
-        categories = Category.objects.all().annotate(
-            product_count=Count('products')
-        )
+        # Per-value counts for every facet in one grouped query
+        facets = facet_counts(selection, base_query)
+
+        # Category counts come from the facets, so no COUNT join over products is needed
+        categories = list(Category.objects.all())
+        for category in categories:
+            category.product_count = facets['category'].get(category.id, 0)
 
-        # Organize categories by service
+        # Organize categories by service (grouped in Python to avoid a query per service)
         service_categories = {}
         for service in services:
-            service_categories[service] = categories.filter(service=service)
+            service_categories[service] = [c for c in categories if c.service_id == service.id]
 
         # Only load a limited number of products initially for better performance
-        products = products_query.order_by('-date_created')[:12]
+        products = products_query.with_pricing().select_related('category').order_by('-date_created')[:12]
 
         # Retrieve the cart count from the session
         cart_count = request.session.get('cart_count', 0)
@@ -797,73 +942,68 @@ class ShopView(TemplateView):
             'selected_category_id': category_id,
             'cart_count': cart_count,
             'search_query': search_query,
+            'facets': facets,
+            'active_facets': selection.active,
             'is_ajax': False,  # Flag to indicate this is not an AJAX request
         }
 
         return render(request, self.template_name, context)
 
 # AJAX Product Loading View
-def load_more_products(request):
+def load_more_queryset(params):
     """
-    AJAX view to load more products dynamically
+    Parse load-more paging/filter parameters.
+    Returns (filtered queryset, page, per_page, offset); the caller counts and slices.
     """
-    page = int(request.GET.get('page', 1))
-    per_page = int(request.GET.get('per_page', 12))
-    category_id = request.GET.get('category_id')
-    search_query = request.GET.get('search')
+    page = int(params.get('page', 1))
+    per_page = int(params.get('per_page', 12))
 
     # Calculate offset
     offset = (page - 1) * per_page
 
-    # Query products with pagination
-    products_query = Product.objects.filter(available=True)
+    # Same category, search and facet filters as the shop page
+    selection = FacetSelection(params)
+    products_query = filter_products(search_catalog_queryset(selection.search), selection)
+    return products_query, page, per_page, offset
+
+
+def load_more_page(products_query, offset, per_page):
+    return products_query.with_pricing().select_related('category').order_by('-date_created')[offset:offset + per_page]
+
+
+def load_more_result(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': float(product.price),
+        'image_url': product.image.url if product.image else '',
+        'category': product.category.name if product.category else '',
+        'category_id': product.category.id if product.category else None,
+        'is_on_sale': product.is_on_sale(),
+        'regular_price': float(product.price) if product.is_on_sale() else None,
+        'sale_price': float(product.sale_price) if product.is_on_sale() else None,
+        'url': reverse('product', args=[product.id]),
+        'description': product.description[:100] + '...' if len(product.description) > 100 else product.description,
+    }
 
-    # Apply category filter if provided
-    if category_id and category_id != 'all':
-        try:
-            category_id = int(category_id)
-            products_query = products_query.filter(category__id=category_id)
-        except (ValueError, TypeError):
-            # If not a valid integer, try to match by slug
-            products_query = products_query.filter(category__slug=category_id)
-
-    # Apply search filter if provided
-    if search_query:
-        products_query = products_query.filter(
-            Q(name__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
+
+def load_more_products(request):
+    """
+    AJAX view to load more products dynamically
+    (Served by async_views.load_more_products under ASGI.)
+    """
+    products_query, page, per_page, offset = load_more_queryset(request.GET)
 
     # Get total count for pagination info
     total_count = products_query.count()
 
     # Apply pagination
-    products = products_query.order_by('-date_created')[offset:offset + per_page]
-
-    # Check if there are more products
-    has_more = (offset + per_page) < total_count
-
-    # Prepare product data for JSON response
-    product_data = []
-    for product in products:
-        product_data.append({
-            'id': product.id,
-            'name': product.name,
-            'price': float(product.price),
-            'image_url': product.image.url if product.image else '',
-            'category': product.category.name if product.category else '',
-            'category_id': product.category.id if product.category else None,
-            'is_on_sale': product.is_on_sale(),
-            'regular_price': float(product.price) if product.is_on_sale() else None,
-            'sale_price': float(product.sale_price) if product.is_on_sale() else None,
-            'url': reverse('product', args=[product.id]),
-            'description': product.description[:100] + '...' if len(product.description) > 100 else product.description,
-        })
+    products = load_more_page(products_query, offset, per_page)
 
     # Return JSON response
     return JsonResponse({
-        'products': product_data,
-        'has_more': has_more,
+        'products': [load_more_result(product) for product in products],
+        'has_more': (offset + per_page) < total_count,
         'total_count': total_count,
         'current_page': page,
     })
@@ -873,7 +1013,12 @@ def load_more_products(request):
 class ProductDetailView(View):
     def get(self, request, id):
         product = get_object_or_404(Product, pk=id)
-        return render(request, 'product.html', {'product': product})
+        # Counted in memory and written in batches, never here
+        record_view(product.id)
+        return render(request, 'product.html', {
+            'product': product,
+            'bought_together': bought_together(product.id),
+        })
 
 # 9. Add to Wishlist
 def add_to_wishlist(request):
@@ -950,10 +1095,7 @@ def add_to_cart(request, id=None, product_id=None):
 
         if not created:
             # Already in cart: do not increase quantity, just inform user
-            cart_count = ShopCart.objects.filter(user=request.user, paid_order=False).aggregate(
-                total_items=Sum('quantity'),
-                total_amount=Sum(F('quantity') * F('product__price'), output_field=FloatField())
-            )
+            cart_count = ShopCart.objects.filter(user=request.user, paid_order=False).totals()
             return JsonResponse({
                 'success': True,
                 'message': f'{product.name} is already in your cart',
@@ -971,10 +1113,8 @@ def add_to_cart(request, id=None, product_id=None):
             return JsonResponse({'success': False, 'error': f'Sorry, only {product.stock_quantity} items available in stock'})
         cart_item.quantity = new_quantity
         cart_item.save()
-        cart_count = ShopCart.objects.filter(user=request.user, paid_order=False).aggregate(
-            total_items=Sum('quantity'),
-            total_amount=Sum(F('quantity') * F('product__price'), output_field=FloatField())
-        )
+        record_cart_add(product.id)
+        cart_count = ShopCart.objects.filter(user=request.user, paid_order=False).totals()
         return JsonResponse({
             'success': True,
             'message': f'{product.name} added to cart successfully',
@@ -1031,6 +1171,7 @@ def buy_now(request, product_id=None, id=None):
         )
         cart_item.quantity = qty
         cart_item.save()
+        record_cart_add(product.id)
 
         request.session['buy_now_product_id'] = product.id
         request.session['buy_now_quantity'] = qty
@@ -1069,33 +1210,23 @@ class CartView(View):
 
             # After any merge, fetch cart items for display
             if request.user.is_authenticated:
-                cart = ShopCart.objects.filter(user=request.user, paid_order=False)
+                cart = ShopCart.objects.filter(user=request.user, paid_order=False).select_related('product')
             else:
-                cart = ShopCart.objects.filter(session_key=session_key, paid_order=False)
+                cart = ShopCart.objects.filter(session_key=session_key, paid_order=False).select_related('product')
 
-            # Calculate totals for display
-            for item in cart:
-                try:
-                    item.total_price = item.calculate_total_price()
-                except Exception:
-                    # fallback if method missing
-                    item.total_price = (getattr(item.product, 'price', 0) or 0) * (item.quantity or 0)
-
-            cartreader = sum(item.quantity for item in cart)
-            subtotal = sum(getattr(item, 'total_price', 0) for item in cart)
-            from decimal import Decimal
-            if not isinstance(subtotal, Decimal):
-                subtotal = Decimal(str(subtotal))
-            vat = Decimal('0.075') * subtotal
-            total = subtotal + vat
+            # Totals for display from the shared pricing engine (integer cents)
+            pricing = price_cart(cart)
+            cartreader = pricing.item_count
             request.session['cart_count'] = cartreader
             request.session.modified = True
             context = {
                 'cart': cart,
+                'bought_together': bought_with_cart(item.product_id for item in cart),
                 'cartreader': cartreader,
-                'subtotal': round(float(subtotal), 2),
-                'vat': round(float(vat), 2),
-                'total': round(float(total), 2),
+                'pricing': pricing,
+                'subtotal': pricing.subtotal,
+                'vat': pricing.vat,
+                'total': pricing.total,
             }
             return render(request, 'cart.html', context)
         except Exception as e:
@@ -1111,20 +1242,14 @@ def increase_quantity(request, item_id):
             cart_item = get_object_or_404(ShopCart, id=item_id, user=request.user)
             cart_item.quantity += 1
             cart_item.save()
-            subtotal, vat, total = calculate_cart_summary(request)
-            cart_count = ShopCart.objects.filter(user=request.user, paid_order=False).aggregate(
-                total_items=Sum('quantity'),
-                total_amount=Sum(F('quantity') * F('product__price'), output_field=FloatField())
-            )
+            pricing = calculate_cart_summary(request)
             return JsonResponse({
                 'success': True,
                 'new_quantity': cart_item.quantity,
                 'new_total_price': round(cart_item.calculate_total_price(), 2),
-                'subtotal': round(float(subtotal), 2),
-                'vat': round(float(vat), 2),
-                'total': round(float(total), 2),
-                'cart_count': cart_count['total_items'] or 0,
-                'cart_total': "{:.2f}".format(cart_count['total_amount'] or 0),
+                **pricing.as_json(),
+                'cart_count': pricing.item_count,
+                'cart_total': "{:.2f}".format(pricing.subtotal),
             })
         except Exception as e:
             logger.error(f"Error increasing quantity: {str(e)}")
@@ -1139,20 +1264,14 @@ def decrease_quantity(request, item_id):
             if cart_item.quantity > 1:
                 cart_item.quantity -= 1
                 cart_item.save()
-            subtotal, vat, total = calculate_cart_summary(request)
-            cart_count = ShopCart.objects.filter(user=request.user, paid_order=False).aggregate(
-                total_items=Sum('quantity'),
-                total_amount=Sum(F('quantity') * F('product__price'), output_field=FloatField())
-            )
+            pricing = calculate_cart_summary(request)
             return JsonResponse({
                 'success': True,
                 'new_quantity': cart_item.quantity,
                 'new_total_price': round(cart_item.calculate_total_price(), 2),
-                'subtotal': round(float(subtotal), 2),
-                'vat': round(float(vat), 2),
-                'total': round(float(total), 2),
-                'cart_count': cart_count['total_items'] or 0,
-                'cart_total': "{:.2f}".format(cart_count['total_amount'] or 0),
+                **pricing.as_json(),
+                'cart_count': pricing.item_count,
+                'cart_total': "{:.2f}".format(pricing.subtotal),
             })
         except Exception as e:
             logger.error(f"Error decreasing quantity: {str(e)}")
@@ -1166,20 +1285,13 @@ def remove_from_cart(request, cart_item_id):
             cart_item = get_object_or_404(ShopCart, id=cart_item_id, user=request.user)
             cart_item.delete()
             if request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest':
-                subtotal, vat, total = calculate_cart_summary(request)
-                cart_empty = not ShopCart.objects.filter(user=request.user, paid_order=False).exists()
-                cart_count = ShopCart.objects.filter(user=request.user, paid_order=False).aggregate(
-                    total_items=Sum('quantity'),
-                    total_amount=Sum(F('quantity') * F('product__price'), output_field=FloatField())
-                )
+                pricing = calculate_cart_summary(request)
                 return JsonResponse({
                     'success': True,
-                    'subtotal': subtotal,
-                    'vat': vat,
-                    'total': total,
-                    'cart_empty': cart_empty,
-                    'cart_count': cart_count['total_items'] or 0,
-                    'cart_total': "{:.2f}".format(cart_count['total_amount'] or 0),
+                    **pricing.as_json(),
+                    'cart_empty': not pricing.lines,
+                    'cart_count': pricing.item_count,
+                    'cart_total': "{:.2f}".format(pricing.subtotal),
                 })
             return redirect(request.META.get('HTTP_REFERER', 'cart'))
         except ShopCart.DoesNotExist:
@@ -1196,147 +1308,102 @@ def remove_from_wishlist(request, product_id):
 
 # Cart summary for authenticated user only
 def calculate_cart_summary(request):
+    """Pricing breakdown (see afriapp/pricing.py) of the user's open cart."""
+    return price_cart(ShopCart.objects.filter(user=request.user, paid_order=False).select_related('product'))
+
+
+def checkout_cart_items(request):
+    """The rows being checked out: the buy-now product when one is pending, else the open cart."""
     cart_items = ShopCart.objects.filter(user=request.user, paid_order=False)
-    subtotal = cart_items.aggregate(subtotal=Sum(F('product__price') * F('quantity')))['subtotal'] or Decimal('0.0')
-    vat = subtotal * Decimal('0.075')
-    total = subtotal + vat
-    return float(subtotal), float(vat), float(total)
+    buy_now_product_id = request.session.get('buy_now_product_id')
+    if buy_now_product_id:
+        cart_items = cart_items.filter(product_id=buy_now_product_id)
+    return cart_items
 
 # Checkout view (user only)
 @method_decorator(login_required, name='dispatch')
 class CheckoutView(TemplateView):
     def get(self, request):
         buy_now_product_id = request.session.get('buy_now_product_id')
-        if buy_now_product_id:
-            cart = ShopCart.objects.filter(user=request.user, paid_order=False, product_id=buy_now_product_id)
-        else:
-            cart = ShopCart.objects.filter(user=request.user, paid_order=False)
-        customer = Customer.objects.filter(user=request.user).first()
+        cart = checkout_cart_items(request).select_related('product')
+        customer = get_customer(request)
         if not cart.exists():
             messages.error(request, 'No items in the cart.')
             return redirect('cart')
-        total_price = sum(item.calculate_total_price() for item in cart)
+        if not validate_cart_stock(request, cart, products={item.product_id: item.product for item in cart}):
+            return redirect('cart')
+        # The shipping shown is the chosen delivery zone's (re-priced on ?delivery_zone=)
+        zone_id = request.GET.get('delivery_zone')
+        pricing = price_cart(cart, zone_shipping_cents(zone_id))
         basket_no = cart.first().basket_no if cart.exists() else None
         context = {
             "STRIPE_PUBLIC_KEY": settings.STRIPE_PUBLIC_KEY,
             'cart': cart,
             'customer': customer,
-            'total_price': total_price,
+            'pricing': pricing,
+            'subtotal': pricing.subtotal,
+            'shipping_cost': pricing.shipping,
+            'tax_amount': pricing.vat,
+            'total_price': pricing.total,
+            'delivery_zones': delivery_zones(),
+            'selected_zone': zone_id,
             'basket_no': basket_no,
             'is_guest': False,
             'buy_now_only': bool(buy_now_product_id),
         }
         return render(request, 'checkout.html', context)
 
+@login_required
+def checkout_totals(request):
+    """Priced breakdown of the checkout rows for `?delivery_zone=`, so the page can
+    update its totals without reloading (and losing the typed billing details)."""
+    pricing = price_cart(checkout_cart_items(request).select_related('product'), zone_shipping_cents(request.GET.get('delivery_zone')))
+    return JsonResponse({'success': True, **pricing.as_json()})
+
 # Payment pipeline (user only)
 @method_decorator(login_required, name='dispatch')
 class PaymentPipelineView(View):
     def post(self, request, *args, **kwargs):
         try:
-            stripe_secret = getattr(settings, 'STRIPE_SECRET_KEY', None)
-            if not stripe_secret or 'your_key_here' in str(stripe_secret):
+            if not checkout_sessions.get_gateway().configured:
                 messages.error(request, 'Stripe is not configured. Please set STRIPE_SECRET_KEY in your environment.')
                 return redirect('checkout')
 
-            # Ensure Stripe is initialized for this request
-            stripe.api_key = stripe_secret
-            # Temporary debug log to confirm Stripe key is loaded in runtime
-            logger.info("Stripe key prefix: %s", stripe_secret[:8])
-
             basket_no = request.POST.get('basket_no')
-            shipping_option = request.POST.get('shipping_option')
-            first_name = request.POST.get('first_name')
-            last_name = request.POST.get('last_name')
-            phone = request.POST.get('phone')
-            address = request.POST.get('address')
-            city = request.POST.get('city')
-            state = request.POST.get('state')
-            postal_code = request.POST.get('postal_code')
-            country = request.POST.get('country')
-            payment_method = 'credit_card'
             user = request.user
+            details = {
+                'first_name': request.POST.get('first_name'),
+                'last_name': request.POST.get('last_name'),
+                'phone': request.POST.get('phone'),
+                'address': request.POST.get('address'),
+                'city': request.POST.get('city'),
+                'state': request.POST.get('state'),
+                'postal_code': request.POST.get('postal_code'),
+                'country': request.POST.get('country'),
+                'email': user.email if user and user.email else (request.POST.get('email') or ''),
+            }
 
-            buy_now_product_id = request.session.get('buy_now_product_id')
-            if buy_now_product_id:
-                cart_items = ShopCart.objects.filter(user=user, paid_order=False, product_id=buy_now_product_id)
-            else:
-                cart_items = ShopCart.objects.filter(user=user, paid_order=False)
+            cart_items = checkout_cart_items(request).select_related('product')
             if not cart_items.exists():
                 messages.error(request, 'No items in the cart.')
                 return redirect('cart')
+            if not validate_cart_stock(request, cart_items):
+                return redirect('cart')
 
-            # Calculate total amount in cents
-            total_price_with_shipping = sum(item.product.price * item.quantity for item in cart_items)
-            total_amount = int(float(total_price_with_shipping) * 100)
-
-            from django.utils.crypto import get_random_string
-            pay_code = get_random_string(12)
-            transaction_id = get_random_string(20)
-
-            # Create a PaymentInfo record to track this attempt
-            payment = PaymentInfo.objects.create(
-                user=user,
-                amount=total_amount,
-                stripe_payment_intent_id=None,
-                basket_no=basket_no,
-                pay_code=pay_code,
-                first_name=first_name,
-                last_name=last_name,
-                phone=phone,
-                address=address,
-                city=city,
-                state=state,
-                postal_code=postal_code,
-                country=country,
-                payment_method=payment_method,
-                transaction_id=transaction_id,
-                created_at=timezone.now(),
-                email=user.email if user and user.email else (request.POST.get('email') or ''),
-            )
+            # Sale-aware subtotal, VAT and the chosen zone's shipping, in integer cents
+            pricing = price_cart(cart_items, zone_shipping_cents(request.POST.get('delivery_zone')))
 
-            # Build Stripe line items from cart
+            # Reuses the open Stripe Checkout Session when the same basket is submitted again
             YOUR_DOMAIN = request.build_absolute_uri('/')[:-1]  # e.g. http://localhost:8000
-            line_items = []
-            for item in cart_items:
-                try:
-                    unit_amount = int(float(item.product.price) * 100)
-                except Exception:
-                    unit_amount = 0
-                line_items.append({
-                    'price_data': {
-                        'currency': 'usd',
-                        'product_data': {
-                            'name': item.product.name,
-                        },
-                        'unit_amount': unit_amount,
-                    },
-                    'quantity': int(item.quantity),
-                })
-
-            # Pass customer name and email to Stripe so the Checkout form is prefilled
-            customer_email = payment.email if payment.email else None
-            customer_name = ' '.join(filter(None, [payment.first_name, payment.last_name])) or None
-
-            # Create a Stripe Checkout Session and redirect the browser to it
-            checkout_session = stripe.checkout.Session.create(
-                payment_method_types=['card'],
-                line_items=line_items,
-                metadata={"payment_id": str(payment.id), "basket_no": basket_no},
-                mode='payment',
-                success_url=f'{YOUR_DOMAIN}/successpayment/',
-                cancel_url=f'{YOUR_DOMAIN}/cancelpayment/',
-                customer_email=customer_email,
-            )
-
-            # Associate the session id with our payment record for later verification
             try:
-                payment.stripe_payment_intent_id = checkout_session.id
-                payment.save()
-            except Exception:
-                logger.exception("Failed to save stripe_session_id on payment record")
+                payment = checkout_sessions.open_checkout(user, pricing, details, basket_no, YOUR_DOMAIN)
+            except checkout_sessions.GatewayUnavailable as e:
+                logger.warning("Stripe unavailable for checkout: %s", e)
+                messages.error(request, 'Card payments are temporarily unavailable. Please try again in a minute.')
+                return redirect('checkout')
 
             # Redirect the browser to the Stripe Checkout URL (hosted by Stripe)
-            return redirect(checkout_session.url)
+            return redirect(payment.checkout_url)
 
         except Exception as e:
             logger.error(f"Payment pipeline error: {str(e)}")
@@ -1347,8 +1414,17 @@ class PaymentPipelineView(View):
 class CompletedPaymentView(View):
     def get(self, request):
         try:
-            # Only authenticated users supported now
-            payment = PaymentInfo.objects.filter(user=request.user, paid_order=False).order_by('-created_at').first()
+            # Only authenticated users supported now. Sessions opened by checkout_sessions
+            # return with their id; attempts are reused, so "latest" is not the one paid
+            session_id = request.GET.get('session_id')
+            if session_id:
+                payment = PaymentInfo.objects.filter(user=request.user, stripe_payment_intent_id=session_id).first()
+                if payment is None:
+                    # The webhook got there first and stored the payment intent id instead
+                    messages.info(request, "Payment already processed.")
+                    return redirect('order_history')
+            else:
+                payment = PaymentInfo.objects.filter(user=request.user, paid_order=False).order_by('-created_at').first()
 
             if not payment:
                 messages.error(request, "No payment record found.")
@@ -1359,30 +1435,27 @@ class CompletedPaymentView(View):
                 messages.info(request, "Payment already processed.")
                 return redirect('order_history')
 
-            buy_now_product_id = request.session.get('buy_now_product_id')
-            if buy_now_product_id:
-                cart_items = ShopCart.objects.filter(user=request.user, paid_order=False, product_id=buy_now_product_id)
-            else:
-                cart_items = ShopCart.objects.filter(user=request.user, paid_order=False)
+            cart_items = checkout_cart_items(request).select_related('product')
 
             if not cart_items.exists():
                 messages.error(request, "No paid items found in cart.")
                 return redirect("cart")
 
-            # Calculate cart summary
-            subtotal, vat, total = calculate_cart_summary(request)
+            # Same breakdown the payment was taken for (shipping as charged);
+            # the total is what Stripe charged, as in the webhooks
+            pricing = price_cart(cart_items, to_cents(payment.shipping_cost))
 
-            # Create customer profile if it doesn't exist
-            customer = Customer.objects.filter(user=request.user).first()
+            customer = get_customer(request)
 
             # Create a new order and link it to the payment record
             order = Order.objects.create(
                 order_no=uuid.uuid4(),
                 customer=customer,
                 payment=payment,
-                subtotal=subtotal,
-                tax=vat,
-                total=total,
+                subtotal=pricing.subtotal,
+                shipping_cost=pricing.shipping,
+                tax=pricing.vat,
+                total=payment.amount or 0,
                 stripe_payment_intent_id=request.GET.get("payment_intent"),
                 is_paid=True,
                 paid_at=timezone.now(),
@@ -1397,11 +1470,14 @@ class CompletedPaymentView(View):
                         order=order,
                         product=item.product,
                         quantity=item.quantity,
-                        price=item.product.price
+                        price=item.product.get_display_price()
                     )
             except Exception as e:
                 logger.error(f"Error creating order items: {str(e)}")
 
+            # Fold the basket into the "frequently bought together" pairs
+            record_order_safely(order)
+
             # Mark the payment as associated with an order
             payment.paid_order = True
             payment.save()
@@ -1423,17 +1499,50 @@ class CompletedPaymentView(View):
 
 from django.core.paginator import Paginator
 
+class OrderTimeline:
+    """
+    A shopper's live orders followed by their archived ones, newest first, in
+    the shape Paginator expects. The archive table is counted once and only
+    read for pages past the last live order.
+    """
+
+    def __init__(self, live, archived):
+        self.live = live
+        self.archived = archived
+
+    @cached_property
+    def live_count(self):
+        return self.live.count()
+
+    def count(self):
+        return self.live_count + self.archived.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        results = list(self.live[start:stop]) if start < self.live_count else []
+        if stop is None or stop > self.live_count:
+            archived_stop = None if stop is None else stop - self.live_count
+            results.extend(self.archived[max(start - self.live_count, 0):archived_stop])
+        return results
+
+
 class OrderHistory(View):
     def get(self, request):
         user = request.user
         try:
-            orders = Order.objects.filter(customer__user=user).order_by('-created_at')  # Filter by user and sort by latest orders
+            # Latest orders first; finished orders moved by archive_orders follow the live ones
+            orders = OrderTimeline(
+                Order.objects.filter(customer__user=user).order_by('-created_at'),
+                ArchivedOrder.objects.filter(customer__user=user).order_by('-created_at'),
+            )
 
             paginator = Paginator(orders, 3)  # Show 3 orders per page
             page_number = request.GET.get('page')  # Get the current page number from query parameters
             page_obj = paginator.get_page(page_number)  # Get the paginated objects
 
-            if not orders.exists():
+            if not paginator.count:
                 messages.info(request, "No order history found.")
 
             return render(request, 'account/account-orders.html', {"page_obj": page_obj})
@@ -1446,7 +1555,8 @@ class OrderDetail(View):
     def get(self, request, order_id):
         user = request.user
         try:
-            order = get_object_or_404(Order, id=order_id)
+            # Archived orders keep their id, so old order links keep working
+            order = Order.objects.filter(id=order_id).first() or get_object_or_404(ArchivedOrder, id=order_id)
             order_items = order.order_items.all()  # Fetch related OrderItems
 
             if not order:
@@ -1508,6 +1618,19 @@ def save_guest_email(request):
     }, status=403)
 
 
+@csrf_exempt
+def newsletter_unsubscribe(request, token):
+    """Deactivate the subscription a newsletter unsubscribe link was issued for.
+    POST is accepted for mail clients' one-click List-Unsubscribe."""
+    try:
+        email = unsubscribe_email(token)
+    except signing.BadSignature:
+        return render(request, 'newsletter_unsubscribed.html', {'email': None}, status=400)
+    Newsletter.objects.filter(email=email).update(is_active=False)
+    GuestProfile.objects.filter(email=email).update(newsletter_subscribed=False)
+    return render(request, 'newsletter_unsubscribed.html', {'email': email})
+
+
 def check_email_status(request):
     """Email status endpoint for backward compatibility; always requires login now."""
     if request.method != 'GET':
@@ -1520,6 +1643,141 @@ def check_email_status(request):
     }, status=403)
 
 
+def stock_availability(product, quantity):
+    """Return (payload, status) describing whether `quantity` of `product` can be bought."""
+    # parse quantity from query params, default to 1
+    try:
+        qty = int(quantity)
+    except (ValueError, TypeError):
+        return {'success': False, 'error': 'Invalid quantity'}, 400
+
+    if qty < 1:
+        qty = 1
+
+    stock_qty = getattr(product, 'stock_quantity', None)
+    max_purchase = getattr(product, 'max_purchase', None)
+    min_purchase = getattr(product, 'min_purchase', None)
+
+    available = True
+    reasons = []
+    if stock_qty is not None and qty > stock_qty:
+        available = False
+        reasons.append(f'Only {stock_qty} items left in stock')
+    if max_purchase is not None and qty > max_purchase:
+        available = False
+        reasons.append(f'Maximum {max_purchase} items allowed per order')
+    if min_purchase is not None and qty < min_purchase:
+        available = False
+        reasons.append(f'Minimum {min_purchase} items required')
+
+    message = 'Available' if available else '; '.join(reasons) or 'Unavailable'
+
+    return {
+        'success': True,
+        'available': available,
+        'requested_quantity': qty,
+        'stock_quantity': stock_qty,
+        'max_purchase': max_purchase,
+        'min_purchase': min_purchase,
+        'message': message,
+    }, 200
+
+
+# Upper bound on lines accepted by the batch stock endpoint
+MAX_STOCK_CHECK_LINES = 100
+
+
+def parse_stock_lines(data):
+    """Normalise `[{"product_id": 1, "quantity": 2}, ...]` (or `[[1, 2], ...]`) into
+    (product_id, quantity) pairs. Raises ValueError on malformed input."""
+    if not isinstance(data, list) or not data:
+        raise ValueError('Expected a non-empty list of lines')
+    if len(data) > MAX_STOCK_CHECK_LINES:
+        raise ValueError(f'At most {MAX_STOCK_CHECK_LINES} lines per request')
+    lines = []
+    for line in data:
+        if isinstance(line, dict):
+            product_id, quantity = line.get('product_id'), line.get('quantity', 1)
+        elif isinstance(line, (list, tuple)) and len(line) == 2:
+            product_id, quantity = line
+        else:
+            raise ValueError('Each line needs a product_id and a quantity')
+        try:
+            lines.append((int(product_id), quantity))
+        except (TypeError, ValueError):
+            raise ValueError('Invalid product identifier')
+    return lines
+
+
+def stock_batch_payload(body):
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        raise ValueError('Invalid JSON body')
+    return data.get('lines') if isinstance(data, dict) else data
+
+
+def stock_products(lines):
+    """One query for every product referenced by `lines`, limited to the stock fields."""
+    return Product.objects.filter(id__in={product_id for product_id, _ in lines}).only(
+        'id', 'name', 'stock_quantity', 'min_purchase', 'max_purchase'
+    )
+
+
+def merge_stock_lines(lines):
+    """Sum the quantities of lines for the same product (first-seen order); an
+    invalid quantity is kept as is so the product is reported as invalid."""
+    totals = {}
+    for product_id, quantity in lines:
+        try:
+            quantity = max(int(quantity), 1)
+        except (TypeError, ValueError):
+            totals[product_id] = quantity
+            continue
+        total = totals.get(product_id, 0)
+        totals[product_id] = total + quantity if isinstance(total, int) else total
+    return list(totals.items())
+
+
+def stock_lines_availability(lines, products):
+    """Validate (product_id, quantity) pairs against `products` ({id: Product}) already in memory.
+    Lines for the same product are checked once, against their summed quantity."""
+    results = []
+    for product_id, quantity in merge_stock_lines(lines):
+        product = products.get(product_id)
+        if product is None:
+            payload = {'success': False, 'available': False, 'error': 'Product not found'}
+        else:
+            payload, _ = stock_availability(product, quantity)
+            payload = {'name': product.name, 'available': False, **payload}
+        results.append({'product_id': product_id, **payload})
+    return {
+        'success': True,
+        'available': all(line['available'] for line in results),
+        'lines': results,
+    }
+
+
+def check_stock_lines(lines):
+    """Validate (product_id, quantity) pairs with a single product query."""
+    return stock_lines_availability(lines, stock_products(lines).in_bulk())
+
+
+def validate_cart_stock(request, cart_items, products=None):
+    """Checkout-time stock check: add an error message for each cart line that cannot
+    be bought and return whether the whole cart is available. Pass `products`
+    ({id: Product}) when the cart's products are already loaded to skip the query."""
+    lines = [(item.product_id, item.quantity) for item in cart_items]
+    if products is None:
+        report = check_stock_lines(lines)
+    else:
+        report = stock_lines_availability(lines, products)
+    for line in report['lines']:
+        if not line['available']:
+            messages.error(request, f"{line.get('name', 'A product in your cart')}: {line.get('message') or line.get('error')}")
+    return report['available']
+
+
 @login_required
 def check_stock_availability(request, product_id):
     """Return JSON indicating whether the requested quantity of a product is available.
@@ -1527,45 +1785,12 @@ def check_stock_availability(request, product_id):
     - Requires authenticated users (login_required decorator).
     - Accepts optional `quantity` GET param (defaults to 1).
     - Returns stock_quantity, min/max purchase limits and a message.
+    (Served by async_views.check_stock_availability under ASGI.)
     """
     try:
-        product = get_object_or_404(Product, id=product_id)
-        # parse quantity from query params, default to 1
-        try:
-            qty = int(request.GET.get('quantity', 1))
-        except (ValueError, TypeError):
-            return JsonResponse({'success': False, 'error': 'Invalid quantity'}, status=400)
-
-        if qty < 1:
-            qty = 1
-
-        stock_qty = getattr(product, 'stock_quantity', None)
-        max_purchase = getattr(product, 'max_purchase', None)
-        min_purchase = getattr(product, 'min_purchase', None)
-
-        available = True
-        reasons = []
-        if stock_qty is not None and qty > stock_qty:
-            available = False
-            reasons.append(f'Only {stock_qty} items left in stock')
-        if max_purchase is not None and qty > max_purchase:
-            available = False
-            reasons.append(f'Maximum {max_purchase} items allowed per order')
-        if min_purchase is not None and qty < min_purchase:
-            available = False
-            reasons.append(f'Minimum {min_purchase} items required')
-
-        message = 'Available' if available else '; '.join(reasons) or 'Unavailable'
-
-        return JsonResponse({
-            'success': True,
-            'available': available,
-            'requested_quantity': qty,
-            'stock_quantity': stock_qty,
-            'max_purchase': max_purchase,
-            'min_purchase': min_purchase,
-            'message': message,
-        })
+        product = Product.objects.get(id=product_id)
+        payload, status = stock_availability(product, request.GET.get('quantity', 1))
+        return JsonResponse(payload, status=status)
 
     except Product.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Product not found'}, status=404)
@@ -1573,6 +1798,25 @@ def check_stock_availability(request, product_id):
         logger.error(f"check_stock_availability error: {e}")
         return JsonResponse({'success': False, 'error': 'Error checking stock'}, status=500)
 
+
+@require_POST
+@login_required
+def check_stock_batch(request):
+    """Return JSON stock availability for many cart lines in one request (and one query).
+
+    - Requires authenticated users.
+    - Body: `{"lines": [{"product_id": 1, "quantity": 2}, ...]}`; `[[1, 2], ...]` also works.
+    - Returns per-line results in the same shape as check_stock_availability,
+      plus an overall `available` flag.
+    (Served by async_views.check_stock_batch under ASGI.)
+    """
+    try:
+        lines = parse_stock_lines(stock_batch_payload(request.body))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse(check_stock_lines(lines))
+
+
 @login_required
 def populate_db(request):
     """
@@ -1599,40 +1843,44 @@ def populate_db(request):
         logger.error(f"populate_db error: {e}")
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
+def open_cart_items(user):
+    return ShopCart.objects.filter(user=user, paid_order=False, quantity__gt=0)
+
+
+def cart_item_result(ci, line):
+    """One cart row for the cart drawer; `line` is its pricing Line (see afriapp/pricing.py)."""
+    product = ci.product
+    return {
+        'cart_item_id': ci.id,
+        'product_id': product.id if product else None,
+        'name': product.name if product else '',
+        'quantity': ci.quantity,
+        'unit_price': float(line.unit_price),
+        'total_price': float(line.total),
+        'image_url': product.image.url if product and getattr(product, 'image', None) else '',
+        'url': reverse('product', args=[product.id]) if product else '',
+    }
+
+
+def cart_items_payload(items, pricing):
+    return {
+        'success': True,
+        'items': items,
+        **pricing.as_json(),
+        'count': pricing.item_count,
+    }
+
+
 @login_required
 def get_cart_items(request):
-    """Return JSON list of current user's cart items and cart summary."""
+    """Return JSON list of current user's cart items and cart summary.
+    (Served by async_views.get_cart_items under ASGI.)
+    """
     try:
-        cart_items = ShopCart.objects.filter(user=request.user, paid_order=False, quantity__gt=0)
-        items = []
-        for ci in cart_items.select_related('product'):
-            product = ci.product
-            items.append({
-                'cart_item_id': ci.id,
-                'product_id': product.id if product else None,
-                'name': product.name if product else '',
-                'quantity': ci.quantity,
-                'unit_price': float(product.price) if product and product.price is not None else 0.0,
-                'total_price': float((product.price * ci.quantity) if product and product.price is not None else 0.0),
-                'image_url': product.image.url if product and getattr(product, 'image', None) else '',
-                'url': reverse('product', args=[product.id]) if product else '',
-            })
-
-        subtotal = sum((ci.product.price * ci.quantity) for ci in cart_items) if cart_items.exists() else Decimal('0.0')
-        if not isinstance(subtotal, Decimal):
-            subtotal = Decimal(str(subtotal))
-        vat = subtotal * Decimal('0.075')
-        total = subtotal + vat
-        count = cart_items.aggregate(total_items=Sum('quantity'))['total_items'] or 0
-
-        return JsonResponse({
-            'success': True,
-            'items': items,
-            'subtotal': round(float(subtotal), 2),
-            'vat': round(float(vat), 2),
-            'total': round(float(total), 2),
-            'count': count,
-        })
+        rows = list(open_cart_items(request.user).select_related('product'))
+        pricing = price_cart(rows)
+        items = [cart_item_result(ci, line) for ci, line in zip(rows, pricing.lines)]
+        return JsonResponse(cart_items_payload(items, pricing))
     except Exception as e:
         logger.error(f"get_cart_items error: {e}")
         return JsonResponse({'success': False, 'message': 'Failed to retrieve cart items.'}, status=500)
@@ -1728,17 +1976,20 @@ def stripe_webhook(request):
                     # Build customer
                     customer = None
                     if payment.user:
-                        customer = Customer.objects.filter(user=payment.user).first()
+                        customer = customer_for_user(payment.user)
                     else:
                         customer, _ = Customer.objects.get_or_create(email=payment.email, defaults={'first_name': payment.first_name or '', 'last_name': payment.last_name or '', 'is_guest': True})
 
-                    # Create order
+                    # Create order; the breakdown comes from the shared pricing engine,
+                    # the total is what the payment was taken for
+                    cart_items = ShopCart.objects.filter(user=payment.user, paid_order=False).select_related('product')
+                    pricing = price_cart(cart_items, to_cents(payment.shipping_cost))
                     order = Order.objects.create(
                         customer=customer,
                         payment=payment,
-                        subtotal=0,
-                        shipping_cost=0,
-                        tax=0,
+                        subtotal=pricing.subtotal,
+                        shipping_cost=pricing.shipping,
+                        tax=pricing.vat,
                         discount=0,
                         total=payment.amount or 0,
                         stripe_payment_intent_id=payment.stripe_payment_intent_id,
@@ -1748,12 +1999,12 @@ def stripe_webhook(request):
                     )
 
                     # Move cart items into order items
-                    cart_items = ShopCart.objects.filter(user=payment.user, paid_order=False)
                     for item in cart_items:
                         try:
-                            OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, price=item.product.price)
+                            OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, price=item.product.get_display_price())
                         except Exception:
                             logger.exception('Failed to create order item')
+                    record_order_safely(order)
 
                     # Mark carts as paid and delete them
                     cart_items.delete()
@@ -1789,19 +2040,24 @@ def stripe_webhook(request):
                     # create order if needed (similar to above)
                     existing_order = Order.objects.filter(payment=payment).first()
                     if not existing_order:
-                        customer = Customer.objects.filter(user=payment.user).first() if payment.user else Customer.objects.filter(email=payment.email).first()
+                        customer = customer_for_user(payment.user) if payment.user else Customer.objects.filter(email=payment.email).first()
+                        cart_items = ShopCart.objects.filter(user=payment.user, paid_order=False).select_related('product')
+                        pricing = price_cart(cart_items, to_cents(payment.shipping_cost))
                         order = Order.objects.create(
                             customer=customer,
                             payment=payment,
+                            subtotal=pricing.subtotal,
+                            shipping_cost=pricing.shipping,
+                            tax=pricing.vat,
                             total=payment.amount or 0,
                             stripe_payment_intent_id=intent_id,
                             is_paid=True,
                             paid_at=timezone.now(),
                             status='processing'
                         )
-                        cart_items = ShopCart.objects.filter(user=payment.user, paid_order=False)
                         for item in cart_items:
-                            OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, price=item.product.price)
+                            OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity, price=item.product.get_display_price())
+                        record_order_safely(order)
                         cart_items.delete()
                     send_receipt_email(payment, existing_order if existing_order else order)
                 except Exception:
@@ -27,6 +27,20 @@ WEB_CONCURRENCY="${WEB_CONCURRENCY:-2}"
 GUNICORN_TIMEOUT="${GUNICORN_TIMEOUT:-120}"
 GUNICORN_KEEPALIVE="${GUNICORN_KEEPALIVE:-5}"
 
+SERVER_MODE="${SERVER_MODE:-wsgi}"
+
+if [ "${SERVER_MODE}" = "asgi" ]; then
+  # ASGI profile: uvicorn workers under gunicorn; the JSON endpoints run as async views
+  exec gunicorn project.asgi:application \
+    --worker-class uvicorn.workers.UvicornWorker \
+    --bind "0.0.0.0:${PORT}" \
+    --workers "${WEB_CONCURRENCY}" \
+    --timeout "${GUNICORN_TIMEOUT}" \
+    --keep-alive "${GUNICORN_KEEPALIVE}" \
+    --access-logfile - \
+    --error-logfile -
+fi
+
 exec gunicorn project.wsgi:application \
   --bind "0.0.0.0:${PORT}" \
   --workers "${WEB_CONCURRENCY}" \
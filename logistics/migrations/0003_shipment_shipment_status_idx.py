@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-19 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['status'], name='shipment_status_idx'),
+        ),
+    ]
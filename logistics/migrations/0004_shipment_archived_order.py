@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-19 18:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('afriapp', '0006_order_archive'),
+        ('logistics', '0003_shipment_shipment_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipment',
+            name='archived_order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to='afriapp.archivedorder'),
+        ),
+        migrations.AlterField(
+            model_name='shipment',
+            name='order',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shipments', to='afriapp.order'),
+        ),
+    ]
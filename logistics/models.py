@@ -1,7 +1,7 @@
 from django.db import models
 from django.utils import timezone
 from django.contrib.auth.models import User
-from afriapp.models import Order, Customer
+from afriapp.models import ArchivedOrder, Order, Customer
 
 class DeliveryZone(models.Model):
     name = models.CharField(max_length=100)
@@ -44,7 +44,9 @@ class Shipment(models.Model):
         ('returned', 'Returned'),
     )
     
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='shipments')
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='shipments', null=True, blank=True)
+    # Set instead of `order` once the order has been moved to the archive
+    archived_order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='shipments', null=True, blank=True)
     tracking_number = models.CharField(max_length=50, unique=True)
     delivery_partner = models.ForeignKey(DeliveryPartner, on_delete=models.SET_NULL, null=True, blank=True)
     delivery_zone = models.ForeignKey(DeliveryZone, on_delete=models.SET_NULL, null=True, blank=True)
@@ -57,12 +59,21 @@ class Shipment(models.Model):
     
     def __str__(self):
         return f"Shipment {self.tracking_number} - {self.status}"
+
+    @property
+    def order_record(self):
+        """The shipped order, whether it is still live or archived."""
+        return self.order if self.order_id else self.archived_order
     
     class Meta:
         db_table = 'shipment'
         managed = True
         verbose_name = 'shipment'
         verbose_name_plural = 'shipments'
+        indexes = [
+            # Dispatch dashboard and tracking queues filter by status
+            models.Index(fields=['status'], name='shipment_status_idx'),
+        ]
 
 class ShipmentUpdate(models.Model):
     shipment = models.ForeignKey(Shipment, on_delete=models.CASCADE, related_name='updates')
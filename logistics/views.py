@@ -9,6 +9,7 @@ from django.db.models import Q
 from django.core.paginator import Paginator
 
 from .models import DeliveryZone, DeliveryPartner, Shipment, ShipmentUpdate
+from afriapp.db_router import read_from_replica
 from afriapp.models import Order, Customer
 
 # Dashboard view for logistics
@@ -21,10 +22,12 @@ class LogisticsDashboardView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['pending_shipments'] = Shipment.objects.filter(status='pending').count()
-        context['in_transit_shipments'] = Shipment.objects.filter(status='in_transit').count()
-        context['delivered_shipments'] = Shipment.objects.filter(status='delivered').count()
-        context['total_shipments'] = Shipment.objects.all().count()
+        # Dashboard counts tolerate replica lag
+        with read_from_replica():
+            context['pending_shipments'] = Shipment.objects.filter(status='pending').count()
+            context['in_transit_shipments'] = Shipment.objects.filter(status='in_transit').count()
+            context['delivered_shipments'] = Shipment.objects.filter(status='delivered').count()
+            context['total_shipments'] = Shipment.objects.all().count()
         return context
 
 # Shipment list view
@@ -39,7 +42,7 @@ class ShipmentListView(ListView):
         return super().dispatch(*args, **kwargs)
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('order', 'archived_order')
         status_filter = self.request.GET.get('status', '')
         search_query = self.request.GET.get('search', '')
 
@@ -50,6 +53,7 @@ class ShipmentListView(ListView):
             queryset = queryset.filter(
                 Q(tracking_number__icontains=search_query) |
                 Q(order__order_no__icontains=search_query) |
+                Q(archived_order__order_no__icontains=search_query) |
                 Q(delivery_partner__name__icontains=search_query)
             )
 
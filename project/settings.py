@@ -50,9 +50,37 @@ LOGGING = {
             'handlers': ['console'],
             'level': 'ERROR',
         },
+        # Per-request query metrics from QueryInstrumentationMiddleware (one JSON line per request)
+        'afriapp.queries': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        # Rows removed by housekeeping jobs such as purge_stale_data (one JSON line per run)
+        'afriapp.maintenance': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
 
+# Per-request query count / DB time instrumentation (Server-Timing header + log line).
+# Opt in with QUERY_INSTRUMENTATION=true (cheap enough to leave on in production).
+QUERY_INSTRUMENTATION = os.getenv('QUERY_INSTRUMENTATION', 'False').lower() == 'true'
+
+# Sampling request profiler. Staff can profile a single request with the
+# `X-Profile-Request: wall|cpu` header; PROFILER_SAMPLE_RATE (0.0-1.0) samples
+# a fraction of all traffic. Stacks are appended to PROFILER_OUTPUT and can be
+# downloaded from /admin/profile/. The file is compacted (identical stacks
+# merged, lightest stacks dropped) whenever it grows past PROFILER_MAX_BYTES.
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'False').lower() == 'true'
+PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', '0'))
+PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', '0.005'))
+PROFILER_MODE = os.getenv('PROFILER_MODE', 'wall')
+PROFILER_OUTPUT = os.getenv('PROFILER_OUTPUT', str(BASE_DIR / 'profiles' / 'requests.collapsed'))
+PROFILER_MAX_BYTES = int(os.getenv('PROFILER_MAX_BYTES', str(8 * 1024 * 1024)))
+
 
 RAILWAY_PUBLIC_DOMAIN = os.getenv("RAILWAY_PUBLIC_DOMAIN")
 YOUR_DOMAIN = os.getenv("YOUR_DOMAIN", "http://127.0.0.1:8000")
@@ -82,6 +110,14 @@ if RAILWAY_PUBLIC_DOMAIN:
 STRIPE_PUBLIC_KEY = os.getenv("STRIPE_PUBLIC_KEY", "")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY", "")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+# Checkout Session creation (see afriapp/checkout_sessions.py): LocalStripeGateway
+# is an in-memory stand-in for local runs. Calls give up after STRIPE_TIMEOUT_SECONDS;
+# after STRIPE_BREAKER_FAILURES failures in a row checkout fails fast for
+# STRIPE_BREAKER_RESET_SECONDS.
+STRIPE_CHECKOUT_GATEWAY = os.getenv("STRIPE_CHECKOUT_GATEWAY", "afriapp.checkout_sessions.StripeGateway")
+STRIPE_TIMEOUT_SECONDS = float(os.getenv("STRIPE_TIMEOUT_SECONDS", "10"))
+STRIPE_BREAKER_FAILURES = int(os.getenv("STRIPE_BREAKER_FAILURES", "5"))
+STRIPE_BREAKER_RESET_SECONDS = float(os.getenv("STRIPE_BREAKER_RESET_SECONDS", "30"))
 
 # Optionally initialize the stripe library with the secret key so other modules
 # can use `import stripe` and have api_key already set. Wrap in try/except so
@@ -123,12 +159,16 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    'afriapp.middleware.QueryInstrumentationMiddleware',  # Outermost so it sees every query of the request
+    'afriapp.middleware.ReplicaStickinessMiddleware',  # Pins readers to the primary after their own writes
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files on Render
+    'afriapp.middleware.StaticFilesMiddleware',  # WhiteNoise for static files on Render (async-capable subclass)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'afriapp.middleware.CustomerMiddleware',  # Lazy request.customer, needs request.user
+    'afriapp.middleware.SamplingProfilerMiddleware',  # Needs request.user for the staff-only header
     'allauth.account.middleware.AccountMiddleware',  # Required by django-allauth
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -136,6 +176,11 @@ MIDDLEWARE = [
 ]
 ROOT_URLCONF = 'project.urls'
 
+# "wsgi" (gunicorn sync workers) or "asgi" (gunicorn + uvicorn workers, see entrypoint.sh).
+# Under ASGI the search, load-more, stock-check and cart-items endpoints use async views.
+SERVER_MODE = os.getenv("SERVER_MODE", "wsgi").strip().lower()
+ASYNC_VIEWS = SERVER_MODE == "asgi"
+
 # Authentication backends (django-allauth + Django default)
 AUTHENTICATION_BACKENDS = (
     "django.contrib.auth.backends.ModelBackend",
@@ -276,6 +321,29 @@ if DATABASES["default"].get("ENGINE") == "django.db.backends.postgresql":
     db_options.setdefault("connect_timeout", int(os.getenv("DB_CONNECT_TIMEOUT", "10")))
     DATABASES["default"]["OPTIONS"] = db_options
 
+# Optional read replica for catalog browsing and reports (see afriapp/db_router.py).
+# Without DATABASE_REPLICA_URL every query stays on "default".
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL")
+REPLICA_DATABASE_ALIAS = "replica"
+if DATABASE_REPLICA_URL:
+    DATABASES[REPLICA_DATABASE_ALIAS] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=600,
+        conn_health_checks=True,
+    )
+    DATABASES[REPLICA_DATABASE_ALIAS]["OPTIONS"] = {"connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "10"))}
+    # Tests read the replica through the default connection
+    DATABASES[REPLICA_DATABASE_ALIAS]["TEST"] = {"MIRROR": "default"}
+DATABASE_ROUTERS = ["afriapp.db_router.ReplicaRouter"]
+# Seconds a shopper keeps reading from the primary after their own write
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "15"))
+
+# Django advises against persistent connections under ASGI (connections are per
+# thread and the async workers would accumulate idle ones); rely on a pooler instead
+if SERVER_MODE == "asgi":
+    for db in DATABASES.values():
+        db["CONN_MAX_AGE"] = 0
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -333,6 +401,41 @@ else:
 
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER or 'webmaster@localhost')
 
+# Outbound WhatsApp messages are queued and sent by `manage.py run_outbound_worker`
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "")
+TWILIO_WHATSAPP_NUMBER = os.getenv("TWILIO_WHATSAPP_NUMBER", "")
+OUTBOUND_MESSAGE_PROVIDER = os.getenv(
+    "OUTBOUND_MESSAGE_PROVIDER",
+    "afriapp.outbound.TwilioProvider" if TWILIO_ACCOUNT_SID else "afriapp.outbound.StubProvider",
+)
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "5"))
+OUTBOUND_RETRY_BASE_SECONDS = float(os.getenv("OUTBOUND_RETRY_BASE_SECONDS", "30"))
+
+# Search-box autocomplete index, shared between workers through this snapshot
+# file (see afriapp/autocomplete.py). Empty keeps the index per process.
+AUTOCOMPLETE_SNAPSHOT_PATH = os.getenv("AUTOCOMPLETE_SNAPSHOT_PATH", str(BASE_DIR / "var" / "autocomplete.json"))
+
+# Product view / add-to-cart counters are buffered per worker and written at
+# most this often; trending scores halve every POPULARITY_HALF_LIFE_HOURS.
+POPULARITY_FLUSH_SECONDS = float(os.getenv("POPULARITY_FLUSH_SECONDS", "30"))
+POPULARITY_HALF_LIFE_HOURS = float(os.getenv("POPULARITY_HALF_LIFE_HOURS", "24"))
+
+# Shared cache for search results, checkout locks and customer profiles. The
+# default per-process cache does not share them between workers, so set
+# REDIS_URL (needs the `redis` package) when running more than one.
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_URL}}
+
+# Typeahead and shop search results are cached this long (see afriapp/search_cache.py);
+# catalog edits invalidate them sooner. Uses the default cache (CACHES).
+SEARCH_CACHE_SECONDS = int(os.getenv("SEARCH_CACHE_SECONDS", "300"))
+
+# Keep each user's Customer profile in the default cache this long (see
+# afriapp/customers.py); 0 looks it up once per request instead.
+CUSTOMER_CACHE_SECONDS = int(os.getenv("CUSTOMER_CACHE_SECONDS", "0"))
+
 # Railway / reverse-proxy compatibility.
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 USE_X_FORWARDED_HOST = True